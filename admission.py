@@ -0,0 +1,248 @@
+"""
+DREAMLENS AI - Admission Control
+Keeps bursts within the Groq account's request limits. Each client (API key
+or IP) has a token bucket, kept in SQLite so every worker on the host draws
+from the same one. A concurrency gate caps Groq calls in flight across all
+workers using lock files, one per slot. A call that finds every slot busy
+waits in a bounded per-worker priority queue, where interactive requests go
+ahead of batch work.
+"""
+
+import asyncio
+import hashlib
+import heapq
+import itertools
+import os
+import sqlite3
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: the slot cap applies per worker only
+    fcntl = None
+
+INTERACTIVE = 0
+BATCH = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rate_limit (
+    client TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL
+);
+"""
+
+
+def client_key(api_key: str = None, address: str = None) -> str:
+    """Bucket key for a caller: a hash of its API key when it sent one, else its address."""
+    if api_key:
+        return "key:" + hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+    return "ip:" + (address or "unknown")
+
+
+class ClientBuckets:
+    """Per-client token buckets shared by every process using the same SQLite file.
+
+    Each client may make `burst` requests at once and `per_minute` on average.
+    """
+
+    PRUNE_EVERY = 1000
+
+    def __init__(self, path: str, per_minute: float, burst: int):
+        self.path = path
+        self.rate = per_minute / 60.0
+        self.burst = burst
+        self._local = threading.local()
+        self._schema_ready = False
+        self._schema_lock = threading.Lock()
+        self._takes = itertools.count(1)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # Autocommit mode, so take() can hold a write lock across its read and update.
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with self._schema_lock:
+                if not self._schema_ready:
+                    conn.executescript(SCHEMA)
+                    self._schema_ready = True
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def take(self, client: str, now: float = None) -> float:
+        """Take a token for `client`. Returns 0.0 if there was one, else the seconds until there will be."""
+        now = time.time() if now is None else now
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated FROM rate_limit WHERE client = ?", (client,)).fetchone()
+            tokens = self.burst if row is None else min(self.burst, row[0] + max(0.0, now - row[1]) * self.rate)
+            if tokens < 1:
+                conn.execute("COMMIT")
+                return (1 - tokens) / self.rate
+            conn.execute(
+                "INSERT INTO rate_limit (client, tokens, updated) VALUES (?, ?, ?) "
+                "ON CONFLICT(client) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated",
+                (client, tokens - 1, now),
+            )
+            if next(self._takes) % self.PRUNE_EVERY == 0:
+                # A bucket that has refilled completely is the same as no row.
+                conn.execute("DELETE FROM rate_limit WHERE updated < ?", (now - self.burst / self.rate,))
+            conn.execute("COMMIT")
+            return 0.0
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            conn.close()
+        self._local = threading.local()
+
+
+class Slot:
+    __slots__ = ("index", "fd")
+
+    def __init__(self, index=None, fd=None):
+        self.index = index
+        self.fd = fd
+
+
+class ConcurrencyGate:
+    """At most `slots` holders across every process sharing `lock_dir`.
+
+    Slot i is an exclusive lock on `lock_dir/slot-i.lock`, so a worker that
+    dies frees its slots. Callers that find every slot taken queue in this
+    worker by (priority, arrival), up to `queue_max` of them; only the head
+    of the queue tries for a slot. Ordering holds within a worker, and across
+    workers the slot locks are claimed by whichever head asks first. Without
+    fcntl or a lock_dir the cap is per worker. `slots` <= 0 admits everyone.
+    """
+
+    def __init__(self, slots: int, lock_dir: str = None, queue_max: int = 64, poll: float = 0.02):
+        self.slots = slots
+        self.lock_dir = lock_dir if fcntl is not None else None
+        self.queue_max = queue_max
+        self.poll = poll
+        self._lock = threading.Lock()
+        self._held = set()      # slot indexes held in this process
+        self._waiters = []      # heap of (priority, seq)
+        self._seq = itertools.count()
+        self._counters = {"admitted": 0, "queued": 0, "queue_full": 0, "timed_out": 0}
+
+    def _claim(self):
+        """A free slot, or None. Caller holds self._lock."""
+        for index in range(self.slots):
+            if index in self._held:
+                continue
+            fd = None
+            if self.lock_dir:
+                try:
+                    os.makedirs(self.lock_dir, exist_ok=True)
+                    fd = os.open(os.path.join(self.lock_dir, f"slot-{index}.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+                except OSError:
+                    # Read-only or missing data dir: cap within this worker only.
+                    self.lock_dir = None
+                else:
+                    try:
+                        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        os.close(fd)
+                        continue
+            self._held.add(index)
+            return Slot(index, fd)
+        return None
+
+    def _enter(self, priority: int):
+        """(slot, None) when admitted at once, (None, ticket) when queued, (None, None) when shed."""
+        if self.slots <= 0:
+            return Slot(), None
+        with self._lock:
+            if not self._waiters:
+                slot = self._claim()
+                if slot is not None:
+                    self._counters["admitted"] += 1
+                    return slot, None
+            if len(self._waiters) >= self.queue_max:
+                self._counters["queue_full"] += 1
+                return None, None
+            ticket = (priority, next(self._seq))
+            heapq.heappush(self._waiters, ticket)
+            self._counters["queued"] += 1
+            return None, ticket
+
+    def _try(self, ticket):
+        """A slot for `ticket` if it is first in line and one is free."""
+        with self._lock:
+            if self._waiters[0] != ticket:
+                return None
+            slot = self._claim()
+            if slot is not None:
+                heapq.heappop(self._waiters)
+                self._counters["admitted"] += 1
+            return slot
+
+    def _give_up(self, ticket):
+        with self._lock:
+            self._waiters.remove(ticket)
+            heapq.heapify(self._waiters)
+            self._counters["timed_out"] += 1
+
+    def acquire(self, priority: int = INTERACTIVE, timeout: float = 0.0):
+        """A Slot to pass to `release()`, or None if the queue is full or `timeout` passes first."""
+        slot, ticket = self._enter(priority)
+        if ticket is None:
+            return slot
+        deadline = time.monotonic() + timeout
+        while True:
+            slot = self._try(ticket)
+            if slot is not None:
+                return slot
+            if time.monotonic() >= deadline:
+                self._give_up(ticket)
+                return None
+            time.sleep(self.poll)
+
+    async def acquire_async(self, priority: int = INTERACTIVE, timeout: float = 0.0):
+        """`acquire()` that waits on the event loop."""
+        slot, ticket = self._enter(priority)
+        if ticket is None:
+            return slot
+        deadline = time.monotonic() + timeout
+        try:
+            while True:
+                slot = self._try(ticket)
+                if slot is not None:
+                    return slot
+                if time.monotonic() >= deadline:
+                    self._give_up(ticket)
+                    return None
+                await asyncio.sleep(self.poll)
+        except asyncio.CancelledError:
+            self._give_up(ticket)
+            raise
+
+    def release(self, slot: Slot):
+        if slot.index is None:
+            return
+        with self._lock:
+            self._held.discard(slot.index)
+            if slot.fd is not None:
+                fcntl.flock(slot.fd, fcntl.LOCK_UN)
+                os.close(slot.fd)
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+            counters["in_use"] = len(self._held)
+            counters["waiting"] = len(self._waiters)
+        counters["slots"] = self.slots
+        return counters
@@ -0,0 +1,184 @@
+"""
+DREAMLENS AI - Annotation Store
+SQLite storage for dream annotations collected on the /annotate page.
+Every query reads a bounded, indexed slice: the newest annotations by id,
+or the newest with a given label through the (label, annotation_id) index.
+Rows from the legacy annotations.csv are imported once.
+"""
+
+import csv
+import io
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS annotations (
+    id INTEGER PRIMARY KEY,
+    ts TEXT NOT NULL,
+    dream TEXT NOT NULL,
+    labels TEXT NOT NULL DEFAULT '',
+    note TEXT NOT NULL DEFAULT ''
+);
+CREATE TABLE IF NOT EXISTS annotation_labels (
+    label TEXT NOT NULL,
+    annotation_id INTEGER NOT NULL REFERENCES annotations (id) ON DELETE CASCADE,
+    PRIMARY KEY (label, annotation_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS annotation_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+EXPORT_COLUMNS = ("ts", "dream", "labels", "note")
+
+
+def _clean_labels(labels) -> list:
+    seen = []
+    for label in labels or []:
+        label = str(label).strip()
+        if label and label not in seen:
+            seen.append(label)
+    return seen
+
+
+def _row(r) -> dict:
+    return {"id": r[0], "ts": r[1], "dream": r[2], "labels": r[3].split("|") if r[3] else [], "note": r[4]}
+
+
+class AnnotationStore:
+    """Indexed annotations table shared by every worker on the host."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._schema_ready = False
+        self._schema_lock = threading.Lock()
+
+    def _conn(self) -> sqlite3.Connection:
+        # One connection per thread and process; sqlite connections can't cross a fork.
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            with self._schema_lock:
+                if not self._schema_ready:
+                    conn.executescript(SCHEMA)
+                    self._schema_ready = True
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _insert(self, conn, ts: str, dream: str, labels: list, note: str) -> int:
+        annotation_id = conn.execute(
+            "INSERT INTO annotations (ts, dream, labels, note) VALUES (?, ?, ?, ?)",
+            (ts, dream, "|".join(labels), note),
+        ).lastrowid
+        conn.executemany(
+            "INSERT OR IGNORE INTO annotation_labels (label, annotation_id) VALUES (?, ?)",
+            [(label, annotation_id) for label in labels],
+        )
+        return annotation_id
+
+    def add(self, dream: str, labels=(), note: str = "", ts: str = None) -> int:
+        """Store one annotation and return its id."""
+        conn = self._conn()
+        with conn:
+            return self._insert(conn, ts or datetime.utcnow().isoformat(), dream, _clean_labels(labels), note or "")
+
+    def import_csv(self, csv_path: str) -> int:
+        """Import a legacy annotations.csv once; returns the number of rows imported.
+
+        The import runs in one write transaction and is recorded in
+        annotation_meta, so concurrent workers and later restarts skip it.
+        The CSV itself is left in place.
+        """
+        if not os.path.exists(csv_path):
+            return 0
+        key = "imported:" + os.path.abspath(csv_path)
+        conn = self._conn()
+        if conn.execute("SELECT 1 FROM annotation_meta WHERE key = ?", (key,)).fetchone():
+            return 0
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute("SELECT 1 FROM annotation_meta WHERE key = ?", (key,)).fetchone():
+                conn.rollback()
+                return 0
+            count = 0
+            with open(csv_path, "r", newline="", encoding="utf-8") as f:
+                for row in csv.reader(f):
+                    if len(row) < 2 or not row[1].strip():
+                        continue
+                    row = (row + ["", ""])[:4]
+                    ts, dream, labels, note = row
+                    self._insert(conn, ts, dream, _clean_labels(labels.split("|")), note)
+                    count += 1
+            conn.execute("INSERT INTO annotation_meta (key, value) VALUES (?, ?)",
+                         (key, f"{count} rows at {datetime.utcnow().isoformat()}"))
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        return count
+
+    def recent(self, limit: int = 20, label: str = None, before: int = None) -> list:
+        """Newest annotations first, optionally only those tagged `label` or older than id `before`."""
+        if label:
+            sql = ("SELECT a.id, a.ts, a.dream, a.labels, a.note FROM annotation_labels l "
+                   "JOIN annotations a ON a.id = l.annotation_id WHERE l.label = ?")
+            params = [label]
+            if before is not None:
+                sql += " AND l.annotation_id < ?"
+                params.append(before)
+            sql += " ORDER BY l.annotation_id DESC LIMIT ?"
+        else:
+            sql = "SELECT id, ts, dream, labels, note FROM annotations"
+            params = []
+            if before is not None:
+                sql += " WHERE id < ?"
+                params.append(before)
+            sql += " ORDER BY id DESC LIMIT ?"
+        return [_row(r) for r in self._conn().execute(sql, params + [limit]).fetchall()]
+
+    def export_rows(self, label: str = None, chunk: int = 1000):
+        """Yield every annotation (oldest first) as a dict, reading `chunk` rows at a time."""
+        conn = self._conn()
+        last = 0
+        while True:
+            if label:
+                rows = conn.execute(
+                    "SELECT a.id, a.ts, a.dream, a.labels, a.note FROM annotation_labels l "
+                    "JOIN annotations a ON a.id = l.annotation_id "
+                    "WHERE l.label = ? AND l.annotation_id > ? ORDER BY l.annotation_id LIMIT ?",
+                    (label, last, chunk),
+                ).fetchall()
+            else:
+                rows = conn.execute(
+                    "SELECT id, ts, dream, labels, note FROM annotations WHERE id > ? ORDER BY id LIMIT ?",
+                    (last, chunk),
+                ).fetchall()
+            if not rows:
+                return
+            for r in rows:
+                yield _row(r)
+            last = rows[-1][0]
+
+    def export_csv(self, label: str = None):
+        """Yield CSV text (header first) in the legacy annotations.csv column layout."""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_COLUMNS)
+        for n, item in enumerate(self.export_rows(label), 1):
+            writer.writerow([item["ts"], item["dream"], "|".join(item["labels"]), item["note"]])
+            if n % 500 == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
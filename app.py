@@ -1,20 +1,65 @@
-from flask import Flask, render_template, request, jsonify
-import pandas as pd
+from flask import Flask, Response, render_template, request, jsonify, stream_with_context
+import csv
+import json
+import math
 import os
 import random
 from functools import lru_cache
 import sys
 import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
-
-# Groq Llama integration
-from groq_client import interpret_dream as groq_interpret, check_groq_health
+import time
+from types import SimpleNamespace
+
+# Groq Llama integration (the SDK itself is imported on first API call)
+from groq_client import interpret_dream as groq_interpret, interpret_dream_stream as groq_interpret_stream
+from groq_client import check_groq_health, cache_stats, cached_interpretation, single_flight_stats
+from groq_client import admission_stats, request_deadline, resilience_stats, routing_stats
+from admission import BATCH, INTERACTIVE, client_key
+from routing import DEEP
+import metrics
+import tracing
+from health import HealthMonitor
+from structured_log import format_line, get_writer, log_event, tail_lines
 
 # Runtime configuration
 IS_VERCEL = bool(os.environ.get("VERCEL"))
 TMP_DIR = tempfile.gettempdir()
 LOG_DIR = os.environ.get("LOG_DIR", os.path.join(TMP_DIR, "dreamlens-logs") if IS_VERCEL else "logs")
 DATA_DIR = os.environ.get("DATA_DIR", os.path.join(TMP_DIR, "dreamlens-data") if IS_VERCEL else "data")
+NEAR_DUPLICATES = os.environ.get("NEAR_DUPLICATES", "on").strip().lower() not in ("0", "off", "false", "no")
+NEAR_DUP_THRESHOLD = float(os.environ.get("NEAR_DUP_THRESHOLD", "0.8"))
+# Dataset retrieval: "tfidf" matches symbol names only; "bm25" (retrieval.py) scores
+# dreams against symbol names and interpretation bodies. BM25 stays opt-in until it
+# beats TF-IDF on labels not written alongside it.
+RETRIEVAL = os.environ.get("RETRIEVAL", "tfidf").strip().lower()
+BM25_MIN_SCORE = float(os.environ.get("BM25_MIN_SCORE", "0.1"))
+TFIDF_MIN_SCORE = 0.35
+# A multi-word symbol named in the dream replaces the top match only if its own
+# score passes the threshold and is at least this share of the top score.
+PHRASE_MARGIN = 0.8
+CONTEXT_LIMIT = 3
+# Groq status is checked in the background this often; pages serve the cached result.
+HEALTH_REFRESH_INTERVAL = float(os.environ.get("HEALTH_REFRESH_INTERVAL", "60"))
+STARTED_AT = time.time()
+# History rows are queued and committed in batches by a background writer.
+HISTORY_BATCH_SIZE = int(os.environ.get("HISTORY_BATCH_SIZE", "500"))
+HISTORY_QUEUE_SIZE = int(os.environ.get("HISTORY_QUEUE_SIZE", "10000"))
+HISTORY_PAGE_MAX = 100
+BATCH_MAX = int(os.environ.get("BATCH_MAX", "100"))
+BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", "8"))
+# Requests that need Groq, per client (X-API-Key, else IP) and shared by all
+# workers; over the limit they get 429 + Retry-After. 0 (the default) turns the limit off.
+RATE_LIMIT_PER_MINUTE = float(os.environ.get("RATE_LIMIT_PER_MINUTE", "0"))
+RATE_LIMIT_BURST = int(os.environ.get("RATE_LIMIT_BURST", "10"))
+# Reverse proxies in front of the app that append to X-Forwarded-For (Railway,
+# Vercel, a load balancer). The client IP is read that many entries from the
+# right of the header; 0 trusts no header and uses the peer address.
+TRUSTED_PROXIES = int(os.environ.get("TRUSTED_PROXIES", "0"))
+API_KEY_HEADER = "X-API-Key"
+HISTORY_SEARCH_MAX_OFFSET = 1000
 
 
 def ensure_dir(path: str):
@@ -28,23 +73,22 @@ def ensure_dir(path: str):
 
 ensure_dir(LOG_DIR)
 ensure_dir(DATA_DIR)
+# Each worker snapshots its metrics here; /metrics merges them (see metrics.py).
+metrics.configure(os.path.join(DATA_DIR, "metrics"))
 
 
-def log_model(msg: str):
-    ts = datetime.utcnow().isoformat()
+def log_model(msg: str, level: str = "info", **fields):
+    """Structured, buffered log record in LOG_DIR/model.log (see structured_log.py)."""
     try:
-        with open(os.path.join(LOG_DIR, "model.log"), "a", encoding="utf-8") as f:
-            f.write(f"{ts} {msg}\n")
+        log_event(LOG_DIR, "app", msg, level, **fields)
     except Exception:
         # best-effort logging, don't crash the app
         print(f"LOG FAIL: {msg}")
 
-# NLP libraries for dataset matching (lightweight, no torch needed)
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-
 app = Flask(__name__)
 
+groq_health = HealthMonitor(check_groq_health, interval=HEALTH_REFRESH_INTERVAL, name="Groq status")
+
 # ---------- Fallback responses (used when Groq is unavailable) ----------
 fallback_responses = [
     "Dreams about {topic} can reflect a desire for transformation or escape from daily stress. It might be your mind signaling the need for change.",
@@ -55,10 +99,21 @@ fallback_responses = [
 ]
 
 # ---------- Load structured dataset (optional) ----------
+# pandas, scikit-learn and the dataset indexes are only needed by the
+# interpretation path, so they load on first use (or in warm_up()) rather than
+# at import; pages like /, /about and /_health never pay for them.
+
+DATASET_PATH = "project/cleaned_dream_interpretations.csv"
+
+_dataset = None
+_dataset_lock = threading.Lock()
+
 
 def load_data():
+    import pandas as pd
+
     try:
-        df = pd.read_csv("project/cleaned_dream_interpretations.csv")
+        df = pd.read_csv(DATASET_PATH)
         if "Word" not in df.columns or "Interpretation" not in df.columns:
             return pd.DataFrame(columns=["Word", "Interpretation"])
         return df
@@ -66,55 +121,157 @@ def load_data():
         print("No dataset found or failed to load:", e)
         return pd.DataFrame(columns=["Word", "Interpretation"])
 
-dreams_df = load_data()
-if not dreams_df.empty:
-    vectorizer = TfidfVectorizer()
-    tfidf_matrix = vectorizer.fit_transform(dreams_df["Word"].astype(str))
-else:
-    vectorizer = None
-    tfidf_matrix = None
+
+def _load_dataset():
+    import tfidf_artifact
+    from retrieval import BM25Index
+    from symbol_index import SymbolIndex
+    from symbol_matcher import SymbolMatcher
+
+    df = load_data()
+    if not df.empty:
+        # Memory-map the prebuilt artifact (scripts/build_tfidf_artifact.py); refit only if stale.
+        vectorizer, tfidf_matrix = tfidf_artifact.load_or_fit(df, DATASET_PATH, log=log_model)
+    else:
+        vectorizer = None
+        tfidf_matrix = None
+    return SimpleNamespace(
+        df=df,
+        vectorizer=vectorizer,
+        tfidf_matrix=tfidf_matrix,
+        bm25=BM25Index.from_frame(df) if RETRIEVAL == "bm25" and not df.empty else None,
+        symbol_index=SymbolIndex.from_frame(df),
+        # Only the multi-word symbols of the loaded dataset: the phrases match_phrases() can resolve to a row.
+        symbol_matcher=SymbolMatcher.from_frame(df, min_words=2, source=DATASET_PATH),
+    )
+
+
+def get_dataset():
+    """The dataset and its indexes, loaded once per process on first access."""
+    global _dataset
+    if _dataset is None:
+        with _dataset_lock:
+            if _dataset is None:
+                _dataset = _load_dataset()
+    return _dataset
+
+
+def warm_up():
+    """Load everything the interpret path needs ahead of the first request."""
+    from sklearn.metrics.pairwise import cosine_similarity  # noqa: F401
+
+    groq_health.start()
+    if NEAR_DUPLICATES:
+        # Indexes history.db on a background thread; lookups answer from what's indexed so far.
+        get_near_duplicates().refresh_in_background()
+    return get_dataset()
+
 
 # ---------- Dataset matching ----------
 
+
+def match_phrases(text: str) -> list:
+    """Multi-word dataset symbols that appear verbatim in the text, in order."""
+    return get_dataset().symbol_matcher.symbols(text)
+
+
 @lru_cache(maxsize=512)
 def find_best_match_simple(text: str):
-    """Find best match from the dataset using TF-IDF similarity (if available)."""
-    if vectorizer is None or tfidf_matrix is None or dreams_df.empty:
+    """Find best match from the dataset: BM25 over symbols and interpretations, or TF-IDF on symbols."""
+    ds = get_dataset()
+    if ds.bm25 is not None:
+        return bm25_match(ds, text, ds.bm25.scores([text]))
+    from sklearn.metrics.pairwise import cosine_similarity
+
+    if ds.vectorizer is None or ds.tfidf_matrix is None or ds.df.empty:
         return None
-    user_vector = vectorizer.transform([text])
-    sims = cosine_similarity(user_vector, tfidf_matrix).flatten()
+    user_vector = ds.vectorizer.transform([text])
+    sims = cosine_similarity(user_vector, ds.tfidf_matrix).flatten()
+    return best_match(ds, text, sims)
+
+
+def prefer_phrase(ds, text: str, idx: int, score_of, min_score: float) -> int:
+    """Prefer a whole multi-word symbol ("childhood home") over the single
+    word ("home") it contains; it is the more specific interpretation.
+
+    Only a phrase row that scores above `min_score` itself and within
+    PHRASE_MARGIN of the top row `idx` qualifies; otherwise `idx` stands.
+    """
+    floor = max(min_score, PHRASE_MARGIN * score_of(idx))
+    phrase_rows = [row for row in (ds.symbol_index.rows_for_symbol(p)[0] for p in match_phrases(text))
+                   if score_of(row) > floor]
+    return max(phrase_rows, key=score_of) if phrase_rows else idx
+
+
+def dataset_row(ds, idx: int, score: float) -> dict:
+    return {
+        "interpretation": ds.df.iloc[idx]["Interpretation"],
+        "score": float(score),
+        "symbol": str(ds.df.iloc[idx]["Word"]),
+    }
+
+
+def best_match(ds, text: str, sims):
+    """The match for `text` given its similarity to every dataset row, or None below the threshold."""
     idx = sims.argmax()
-    score = sims[idx]
-    if score > 0.35:
-        return {
-            "interpretation": dreams_df.iloc[idx]["Interpretation"],
-            "score": float(score)
-        }
+    if sims[idx] > TFIDF_MIN_SCORE:
+        idx = prefer_phrase(ds, text, idx, lambda row: sims[row], TFIDF_MIN_SCORE)
+        return dataset_row(ds, idx, sims[idx])
     return None
 
 
+def bm25_match(ds, text: str, scores, i: int = 0):
+    """The match for `text` from row `i` of BM25Index.scores(), or None below BM25_MIN_SCORE.
+
+    Only the rows sharing a term with the dream are looked at.
+    """
+    start, end = scores.indptr[i], scores.indptr[i + 1]
+    rows, data = scores.indices[start:end], scores.data[start:end]
+    if not len(data):
+        return None
+    best = data.argmax()
+    if data[best] <= BM25_MIN_SCORE:
+        return None
+
+    def score_of(row):
+        hit = data[rows == row]
+        return hit[0] if len(hit) else 0.0
+
+    idx = prefer_phrase(ds, text, rows[best], score_of, BM25_MIN_SCORE)
+    return dataset_row(ds, idx, score_of(idx))
+
+
+def find_best_matches(texts: list) -> list:
+    """find_best_match_simple() for many texts with one transform and one sparse product.
+
+    TF-IDF rows are L2-normalized, so the product is the cosine similarity.
+    BM25 scores come from the same kind of product (see retrieval.py).
+    """
+    ds = get_dataset()
+    if not texts:
+        return []
+    if ds.bm25 is not None:
+        scores = ds.bm25.scores(texts)
+        return [bm25_match(ds, text, scores, i) for i, text in enumerate(texts)]
+    if ds.vectorizer is None or ds.tfidf_matrix is None or ds.df.empty:
+        return [None] * len(texts)
+    sims = (ds.vectorizer.transform(texts) @ ds.tfidf_matrix.T).tocsr()
+    return [best_match(ds, text, sims.getrow(i).toarray().ravel()) for i, text in enumerate(texts)]
+
+
 def search_database_context(dream_text: str) -> str:
     """Search the dream database for related symbols to provide context to the model."""
-    if dreams_df.empty:
-        return ""
-    dream_words = dream_text.lower().split()
-    results = []
-    for _, row in dreams_df.iterrows():
-        word = str(row["Word"]).lower()
-        matches = sum(1 for w in dream_words if w in word or word in w)
-        if matches > 0:
-            results.append({
-                "word": row["Word"],
-                "interpretation": str(row["Interpretation"])[:150],
-                "relevance": matches
-            })
-    results.sort(key=lambda x: x["relevance"], reverse=True)
-    if not results:
+    ds = get_dataset()
+    if ds.df.empty:
         return ""
-    context_parts = []
-    for r in results[:3]:
-        context_parts.append(f"- {r['word']}: {r['interpretation']}...")
-    return "\n".join(context_parts)
+    phrases = match_phrases(dream_text)
+    if ds.bm25 is None:
+        return ds.symbol_index.context(dream_text, CONTEXT_LIMIT, priority=phrases)
+    rows, _ = ds.bm25.top_k([dream_text], CONTEXT_LIMIT)[0]
+    # Phrase hits go first, as in SymbolIndex.search().
+    pinned = list(dict.fromkeys(row for p in phrases for row in ds.symbol_index.rows_for_symbol(p)))
+    ranked = pinned + [row for row in rows.tolist() if row not in pinned]
+    return ds.symbol_index.context_for_rows(ranked[:CONTEXT_LIMIT])
 
 
 def synthesize_fallback(dream: str) -> str:
@@ -141,10 +298,34 @@ def chat():
 def annotate_ui():
     return render_template("annotate.html")
 
-# Simple annotation storage (append CSV)
-import csv
 
+# Annotation storage (SQLite, see annotation_store.py)
+ANNOTATION_DB = os.path.join(DATA_DIR, 'annotations.db')
+# Legacy CSV store, imported into ANNOTATION_DB on first use
 ANNOTATION_FILE = os.path.join(DATA_DIR, 'annotations.csv')
+ANNOTATION_PAGE_MAX = 200
+
+_annotations = None
+_annotations_lock = threading.Lock()
+
+
+def get_annotations():
+    """The annotation store, created (and the legacy CSV imported) on first use."""
+    global _annotations
+    if _annotations is None or _annotations.path != ANNOTATION_DB:
+        with _annotations_lock:
+            if _annotations is None or _annotations.path != ANNOTATION_DB:
+                from annotation_store import AnnotationStore
+                store = AnnotationStore(ANNOTATION_DB)
+                try:
+                    imported = store.import_csv(ANNOTATION_FILE)
+                    if imported:
+                        log_model(f"Imported {imported} annotations from {ANNOTATION_FILE}")
+                except Exception as e:
+                    log_model(f"Annotation CSV import failed: {e}")
+                _annotations = store
+    return _annotations
+
 
 @app.route('/annotations', methods=['POST'])
 def save_annotation():
@@ -154,29 +335,235 @@ def save_annotation():
     note = payload.get('note') or ''
     if not dream:
         return jsonify({'success': False, 'message': 'No dream provided'}), 400
-    # ensure folder
-    ensure_dir(os.path.dirname(ANNOTATION_FILE))
-    with open(ANNOTATION_FILE, 'a', newline='', encoding='utf-8') as f:
-        writer = csv.writer(f)
-        writer.writerow([datetime.utcnow().isoformat(), dream, '|'.join(labels), note])
-    return jsonify({'success': True})
+    if not isinstance(labels, list):
+        labels = [labels]
+    annotation_id = get_annotations().add(dream, labels, note)
+    return jsonify({'success': True, 'id': annotation_id})
 
 @app.route('/annotations/recent')
 def recent_annotations():
-    recent = []
-    try:
-        with open(ANNOTATION_FILE, 'r', encoding='utf-8') as f:
-            rows = list(csv.reader(f))[-20:]
-            for r in reversed(rows):
-                ts, dream, labs, note = r
-                recent.append({'ts': ts, 'dream': dream, 'labels': labs.split('|') if labs else [], 'note': note})
-    except FileNotFoundError:
-        recent = []
+    """Newest annotations, optionally filtered by `label` and paged with `before=<id>`."""
+    limit = min(max(request.args.get('limit', 20, type=int), 1), ANNOTATION_PAGE_MAX)
+    label = (request.args.get('label') or '').strip() or None
+    before = request.args.get('before', type=int)
+    recent = get_annotations().recent(limit, label=label, before=before)
     return jsonify({'recent': recent})
 
 
+@app.route('/annotations/export')
+def export_annotations():
+    """All annotations (or those with `label`) as CSV, streamed in chunks."""
+    label = (request.args.get('label') or '').strip() or None
+    return Response(
+        stream_with_context(get_annotations().export_csv(label)),
+        mimetype='text/csv',
+        headers={'Content-Disposition': 'attachment; filename=annotations.csv'},
+    )
+
+
 # ---------- Main Interpret Endpoint ----------
 
+def dataset_match(dream: str, force_model: bool):
+    """Dataset match for the dream, skipped when the caller forces the model."""
+    if force_model:
+        return None
+    return find_best_match_simple(dream.lower())
+
+
+def dataset_matches(dreams: list, force_model: bool) -> list:
+    """dataset_match() for a batch of dreams."""
+    if force_model:
+        return [None] * len(dreams)
+    return find_best_matches([dream.lower() for dream in dreams])
+
+
+def resolve_groq_result(dream: str, groq_result: dict):
+    """Turn a Groq result into (interpretation_text, meta), falling back when it failed."""
+    if groq_result["success"]:
+        meta = {"method": "groq", "model": groq_result["model"]}
+        if groq_result.get("tier"):
+            meta["tier"] = groq_result["tier"]
+        if groq_result.get("cached"):
+            meta["cached"] = True
+        return groq_result["interpretation"], meta
+    # 3) Fallback if Groq is unavailable
+    log_model(f"Groq failed: {groq_result['error']}")
+    return synthesize_fallback(dream), {
+        "method": "fallback",
+        "groq_error": groq_result["error"],
+        "note": "Groq is not available. Please ensure GROQ_API_KEY is configured."
+    }
+
+
+_near_duplicates = None
+_near_duplicates_lock = threading.Lock()
+
+
+def get_near_duplicates():
+    """MinHash LSH index over history.db, created on first use."""
+    global _near_duplicates
+    if _near_duplicates is None:
+        with _near_duplicates_lock:
+            if _near_duplicates is None:
+                from near_duplicate import NearDuplicateIndex
+                _near_duplicates = NearDuplicateIndex(
+                    os.path.join(DATA_DIR, 'history.db'), threshold=NEAR_DUP_THRESHOLD)
+    return _near_duplicates
+
+
+def request_mode(data: dict) -> str:
+    """The caller's routing mode: "deep" keeps the large model (see routing.py), anything else is "auto"."""
+    return DEEP if data.get('mode') == DEEP else "auto"
+
+
+def reuse_prior(dream: str, db_context: str, mode: str = "auto"):
+    """An earlier answer for this dream as (interpretation_text, meta), or None.
+
+    Exact repeats come from the interpretation cache; reworded repeats from
+    the near-duplicate index over history, except in deep mode, where the
+    caller asked for a full answer to this exact dream.
+    """
+    cached = cached_interpretation(dream, db_context, mode)
+    if cached:
+        return resolve_groq_result(dream, cached)
+    if NEAR_DUPLICATES and mode != DEEP:
+        try:
+            near = get_near_duplicates().find(dream)
+        except Exception as e:
+            log_model(f"Near-duplicate lookup failed: {e}")
+            near = None
+        if near:
+            return near["interpretation"], {"method": "near_duplicate", "similarity": near["similarity"]}
+    return None
+
+
+_history = None
+_history_lock = threading.Lock()
+
+
+def get_history():
+    """Write-behind store for DATA_DIR/history.db (see history_store.py)."""
+    global _history
+    path = os.path.join(DATA_DIR, 'history.db')
+    if _history is None or _history.path != path:
+        with _history_lock:
+            if _history is None or _history.path != path:
+                from history_store import HistoryStore
+                if _history is not None:
+                    _history.close()
+                _history = HistoryStore(path, batch_size=HISTORY_BATCH_SIZE, max_queue=HISTORY_QUEUE_SIZE)
+    return _history
+
+
+def save_history(dream: str, interpretation_text: str, method: str = None):
+    """Queue the interpretation for the history table; written in the background."""
+    try:
+        get_history().add(dream, interpretation_text, method)
+    except Exception as e:
+        print('Failed to save history:', e)
+
+
+def save_history_many(rows: list):
+    """Queue (dream, interpretation, method) rows to be committed in one transaction."""
+    if not rows:
+        return
+    try:
+        get_history().add_many(rows)
+    except Exception as e:
+        print('Failed to save history:', e)
+
+
+_rate_limiter = None
+_rate_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    """Per-client token buckets in DATA_DIR/rate_limit.db (see admission.py)."""
+    global _rate_limiter
+    path = os.path.join(DATA_DIR, 'rate_limit.db')
+    if _rate_limiter is None or _rate_limiter.path != path:
+        with _rate_limiter_lock:
+            if _rate_limiter is None or _rate_limiter.path != path:
+                from admission import ClientBuckets
+                _rate_limiter = ClientBuckets(path, RATE_LIMIT_PER_MINUTE, RATE_LIMIT_BURST)
+    return _rate_limiter
+
+
+def rate_limit_wait(api_key: str, address: str, route: str) -> float:
+    """Seconds until this client may make another Groq-bound request; 0.0 lets it through now."""
+    if RATE_LIMIT_PER_MINUTE <= 0:
+        return 0.0
+    try:
+        wait = get_rate_limiter().take(client_key(api_key, address))
+    except Exception as e:
+        # The limit protects the Groq quota; a broken store must not refuse every request.
+        log_model(f"Rate limiter failed: {e}", level="error")
+        return 0.0
+    if wait:
+        metrics.inc("dreamlens_rate_limited_total", route=route)
+    return wait
+
+
+def too_many_requests(wait: float):
+    """The 429 payload and headers for a client that must wait `wait` seconds."""
+    seconds = max(1, math.ceil(wait))
+    return {
+        "success": False,
+        "message": f"Too many requests. Please try again in {seconds} s.",
+        "retry_after": seconds
+    }, {"Retry-After": str(seconds)}
+
+
+def client_address(peer: str, forwarded_for: str = None) -> str:
+    """The caller's IP: the X-Forwarded-For entry added by the outermost trusted proxy, else the peer.
+
+    Same rule as werkzeug's ProxyFix(x_for=TRUSTED_PROXIES); entries further
+    left were written by the client and can't be trusted.
+    """
+    if TRUSTED_PROXIES <= 0 or not forwarded_for:
+        return peer
+    hops = [hop.strip() for hop in forwarded_for.split(",")]
+    if len(hops) < TRUSTED_PROXIES or not hops[-TRUSTED_PROXIES]:
+        return peer
+    return hops[-TRUSTED_PROXIES]
+
+
+def request_wait(route: str) -> float:
+    """`rate_limit_wait()` for the current Flask request."""
+    address = client_address(request.remote_addr, request.headers.get("X-Forwarded-For"))
+    return rate_limit_wait(request.headers.get(API_KEY_HEADER), address, route)
+
+
+def record_request(timer, trace: str, route: str, dream: str, interpretation_text: str, meta: dict,
+                   usage: dict = None, total: bool = True):
+    """Hand a finished request's stage timings to /metrics and its spans to the trace file."""
+    timer.finish(meta["method"], total=total)
+    tracing.record(LOG_DIR, trace, timer, route, meta, dream, interpretation_text, usage)
+
+
+def interpret_unmatched(dream: str, use_cache: bool, timer, deadline: float = None, priority: int = INTERACTIVE,
+                        mode: str = "auto"):
+    """The path for a dream with no dataset match: (interpretation_text, meta, usage).
+
+    Context search, then an earlier answer if there is one, then Groq,
+    which gives up at `deadline` (see groq_client.request_deadline()),
+    queues by `priority` when every upstream slot is busy and picks its
+    model by `mode`.
+    """
+    with timer.stage("context_search"):
+        db_context = search_database_context(dream)
+    with timer.stage("reuse_prior"):
+        prior = reuse_prior(dream, db_context, mode) if use_cache else None
+    if prior:
+        return prior + (None,)
+    # 2) Call Groq for AI interpretation
+    with timer.stage("groq"):
+        groq_result = groq_interpret(dream, db_context=db_context, use_cache=False, deadline=deadline,
+                                     priority=priority, mode=mode)
+    interpretation_text, meta = resolve_groq_result(dream, groq_result)
+    return interpretation_text, meta, groq_result.get("usage")
+
+
 @app.route("/interpret", methods=["POST"])
 def interpret():
     data = request.get_json() or {}
@@ -184,38 +571,35 @@ def interpret():
     if not dream:
         return jsonify({"success": False, "message": "Please provide a dream text."}), 400
 
+    timer = metrics.timer()
+    mode = request_mode(data)
+    # The fallback must be served within GROQ_DEADLINE (GROQ_DEEP_DEADLINE) of the request arriving.
+    deadline = request_deadline(mode)
+    trace = tracing.trace_id(request.headers.get(tracing.TRACE_HEADER))
     # Allow caller to force LLM generation (skip dataset match)
     force_model = bool(data.get('force_model', False))
+    # ...and to skip the interpretation cache for a fresh answer
+    use_cache = not bool(data.get('no_cache', False))
 
     # 1) Try dataset match first (fast, no LLM call)
-    if not force_model:
-        structured = find_best_match_simple(dream.lower())
-    else:
-        structured = None
+    with timer.stage("dataset_match"):
+        structured = dataset_match(dream, force_model)
 
+    usage = None
     if structured:
         interpretation_text = structured['interpretation']
         meta = {"method": "dataset", "score": structured['score']}
     else:
-        # 2) Call Groq for AI interpretation
-        db_context = search_database_context(dream)
-        groq_result = groq_interpret(dream, db_context=db_context)
-
-        if groq_result["success"]:
-            interpretation_text = groq_result["interpretation"]
-            meta = {"method": "groq", "model": groq_result["model"]}
-        else:
-            # 3) Fallback if Groq is unavailable
-            log_model(f"Groq failed: {groq_result['error']}")
-            interpretation_text = synthesize_fallback(dream)
-            meta = {
-                "method": "fallback",
-                "groq_error": groq_result["error"],
-                "note": "Groq is not available. Please ensure GROQ_API_KEY is configured."
-            }
+        # Only requests that may need Groq count against the client's limit.
+        wait = request_wait("interpret")
+        if wait:
+            payload, headers = too_many_requests(wait)
+            return jsonify(payload), 429, headers
+        interpretation_text, meta, usage = interpret_unmatched(dream, use_cache, timer, deadline, mode=mode)
 
     # mark whether the client forced model usage
     meta['forced'] = force_model
+    meta['trace_id'] = trace
 
     result = {
         "success": True,
@@ -224,36 +608,233 @@ def interpret():
         "meta": meta
     }
 
-    # Store to history (sqlite) for user reference
-    try:
-        import sqlite3
-        ensure_dir(DATA_DIR)
-        conn = sqlite3.connect(os.path.join(DATA_DIR, 'history.db'))
-        cur = conn.cursor()
-        cur.execute('''CREATE TABLE IF NOT EXISTS history (ts TEXT, dream TEXT, response TEXT)''')
-        cur.execute('INSERT INTO history (ts,dream,response) VALUES (?,?,?)', (datetime.utcnow().isoformat(), dream, interpretation_text))
-        conn.commit()
-        conn.close()
-    except Exception as e:
-        print('Failed to save history:', e)
+    with timer.stage("history_write"):
+        save_history(dream, interpretation_text, meta["method"])
+    record_request(timer, trace, "interpret", dream, interpretation_text, meta, usage)
+
+    response = jsonify(result)
+    response.headers[tracing.TRACE_HEADER] = trace
+    return response
+
+
+def sse_event(event: str, payload: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
 
-    return jsonify(result)
+@app.route("/interpret/stream", methods=["POST"])
+def interpret_stream():
+    """Server-sent events version of /interpret.
+
+    The Groq path relays `token` events as text is generated; every path ends
+    with one `done` event carrying the same payload /interpret would return.
+    """
+    data = request.get_json() or {}
+    dream = (data.get("dream") or "").strip()
+    if not dream:
+        return jsonify({"success": False, "message": "Please provide a dream text."}), 400
+
+    timer = metrics.timer()
+    mode = request_mode(data)
+    deadline = request_deadline(mode)
+    trace = tracing.trace_id(request.headers.get(tracing.TRACE_HEADER))
+    force_model = bool(data.get('force_model', False))
+    use_cache = not bool(data.get('no_cache', False))
+    with timer.stage("dataset_match"):
+        structured = dataset_match(dream, force_model)
+    wait = 0.0 if structured else request_wait("interpret_stream")
+    if wait:
+        payload, headers = too_many_requests(wait)
+        return jsonify(payload), 429, headers
+
+    def generate():
+        usage = None
+        if structured:
+            interpretation_text = structured['interpretation']
+            meta = {"method": "dataset", "score": structured['score']}
+        else:
+            with timer.stage("context_search"):
+                db_context = search_database_context(dream)
+            with timer.stage("reuse_prior"):
+                prior = reuse_prior(dream, db_context, mode) if use_cache else None
+            if prior:
+                interpretation_text, meta = prior
+            else:
+                groq_result = None
+                with timer.stage("groq"):
+                    for event in groq_interpret_stream(dream, db_context=db_context, use_cache=False,
+                                                       deadline=deadline, mode=mode):
+                        if event["event"] == "token":
+                            yield sse_event("token", {"text": event["text"]})
+                        else:
+                            groq_result = event["result"]
+                interpretation_text, meta = resolve_groq_result(dream, groq_result)
+                usage = groq_result.get("usage")
+        meta['forced'] = force_model
+        meta['trace_id'] = trace
+
+        with timer.stage("history_write"):
+            save_history(dream, interpretation_text, meta["method"])
+        # The stream's duration depends on the client reading it, so no "total".
+        record_request(timer, trace, "interpret_stream", dream, interpretation_text, meta, usage, total=False)
+        yield sse_event("done", {
+            "success": True,
+            "dream": dream,
+            "interpretation": interpretation_text,
+            "meta": meta
+        })
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", tracing.TRACE_HEADER: trace},
+    )
+
+
+# ---------- Batch Interpret Endpoint ----------
+
+def parse_batch(data) -> tuple:
+    """Validate a /interpret/batch body: ([(index, id, dream), ...], None) or (None, error message).
+
+    `dreams` holds strings or {"id": ..., "dream": ...} objects; ids are echoed back.
+    """
+    dreams = data.get("dreams") if isinstance(data, dict) else None
+    if not isinstance(dreams, list) or not dreams:
+        return None, "Please provide a list of dreams."
+    if len(dreams) > BATCH_MAX:
+        return None, f"A batch holds at most {BATCH_MAX} dreams."
+    items = []
+    for index, entry in enumerate(dreams):
+        item_id, dream = (entry.get("id"), entry.get("dream")) if isinstance(entry, dict) else (None, entry)
+        items.append((index, item_id, dream.strip() if isinstance(dream, str) else ""))
+    return items, None
+
+
+def batch_line(index: int, item_id, payload: dict) -> str:
+    """One NDJSON line of a batch response."""
+    line = {"index": index}
+    if item_id is not None:
+        line["id"] = item_id
+    line.update(payload)
+    return json.dumps(line) + "\n"
+
+
+def batch_result(rows: list, timer, trace: str, index: int, item_id, dream: str, interpretation_text: str,
+                 meta: dict, usage: dict, force_model: bool) -> str:
+    """Record one finished batch item (metrics, trace, pending history row) and format its line."""
+    meta['forced'] = force_model
+    meta['trace_id'] = f"{trace}.{index}"
+    record_request(timer, meta['trace_id'], "interpret_batch", dream, interpretation_text, meta, usage,
+                   total=False)
+    rows.append((dream, interpretation_text, meta["method"]))
+    return batch_line(index, item_id, {
+        "success": True,
+        "dream": dream,
+        "interpretation": interpretation_text,
+        "meta": meta
+    })
+
+
+BATCH_INVALID = {"success": False, "message": "Please provide a dream text."}
+BATCH_FAILED = {"success": False, "message": "Interpretation failed."}
+
+
+@app.route("/interpret/batch", methods=["POST"])
+def interpret_batch():
+    """Interpret up to BATCH_MAX dreams in one request, streamed back as NDJSON.
+
+    Dataset matches for the whole batch come from one vectorized similarity
+    pass; the remaining dreams go to Groq at most BATCH_CONCURRENCY at a time.
+    Each line is one dream's /interpret payload plus its `index` (and `id`),
+    in completion order; the last line is {"done": true, ...}. History rows
+    are written in one transaction once the batch is finished.
+    """
+    data = request.get_json(silent=True)
+    items, error = parse_batch(data)
+    if error:
+        return jsonify({"success": False, "message": error}), 400
+
+    trace = tracing.trace_id(request.headers.get(tracing.TRACE_HEADER))
+    force_model = bool(data.get('force_model', False))
+    use_cache = not bool(data.get('no_cache', False))
+    mode = request_mode(data)
+    valid = [item for item in items if item[2]]
+    with metrics.span(stage="batch_dataset_match"):
+        matches = dataset_matches([dream for _, _, dream in valid], force_model)
+    # A batch counts once against the client's limit; its Groq calls queue behind interactive ones.
+    wait = request_wait("interpret_batch") if not all(matches) else 0.0
+    if wait:
+        payload, headers = too_many_requests(wait)
+        return jsonify(payload), 429, headers
+
+    def interpret_item(item):
+        timer = metrics.timer()
+        return (item, timer) + interpret_unmatched(item[2], use_cache, timer, priority=BATCH, mode=mode)
+
+    def generate():
+        rows = []
+        try:
+            for index, item_id, dream in items:
+                if not dream:
+                    yield batch_line(index, item_id, BATCH_INVALID)
+            pending = []
+            for (index, item_id, dream), structured in zip(valid, matches):
+                if structured:
+                    meta = {"method": "dataset", "score": structured['score']}
+                    yield batch_result(rows, metrics.timer(), trace, index, item_id, dream,
+                                       structured['interpretation'], meta, None, force_model)
+                else:
+                    pending.append((index, item_id, dream))
+            if pending:
+                with ThreadPoolExecutor(max_workers=min(BATCH_CONCURRENCY, len(pending)),
+                                        thread_name_prefix="batch") as pool:
+                    futures = {pool.submit(interpret_item, item): item for item in pending}
+                    for future in as_completed(futures):
+                        try:
+                            (index, item_id, dream), timer, text, meta, usage = future.result()
+                        except Exception as e:
+                            log_model(f"Batch item failed: {e}", level="error")
+                            index, item_id, _ = futures[future]
+                            yield batch_line(index, item_id, BATCH_FAILED)
+                            continue
+                        yield batch_result(rows, timer, trace, index, item_id, dream, text, meta, usage,
+                                           force_model)
+            yield json.dumps({"done": True, "count": len(items), "trace_id": trace}) + "\n"
+        finally:
+            # Also runs when the client disconnects, so finished results are kept.
+            with metrics.span(stage="batch_history_write"):
+                save_history_many(rows)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", tracing.TRACE_HEADER: trace},
+    )
 
 @app.route('/history/recent')
 def history_recent():
-    items = []
+    """Newest history first; pass `next_before` back as `before` for the next page."""
+    before = request.args.get('before', type=int)
+    limit = min(max(request.args.get('limit', 25, type=int), 1), HISTORY_PAGE_MAX)
     try:
-        import sqlite3
-        conn = sqlite3.connect(os.path.join(DATA_DIR, 'history.db'))
-        cur = conn.cursor()
-        cur.execute('SELECT ts,dream,response FROM history ORDER BY rowid DESC LIMIT 25')
-        rows = cur.fetchall()
-        for r in rows:
-            items.append({'ts': r[0], 'dream': r[1], 'response': r[2]})
-        conn.close()
+        return jsonify(get_history().page(before, limit))
     except Exception as e:
         print('Failed to read history:', e)
-    return jsonify({'items': items})
+        return jsonify({'items': [], 'next_before': None})
+
+
+@app.route('/history/search')
+def history_search():
+    """Full-text search over past dreams and interpretations, best matches first."""
+    q = (request.args.get('q') or '').strip()
+    if not q:
+        return jsonify({'success': False, 'message': 'Please provide a search query.'}), 400
+    limit = min(max(request.args.get('limit', 20, type=int), 1), HISTORY_PAGE_MAX)
+    offset = min(max(request.args.get('offset', 0, type=int), 0), HISTORY_SEARCH_MAX_OFFSET)
+    try:
+        return jsonify(get_history().search(q, limit, offset))
+    except Exception as e:
+        log_model(f"History search failed: {e}")
+        return jsonify({'success': False, 'message': 'Search failed'}), 500
 
 
 # --- UI pages ---
@@ -272,22 +853,21 @@ def history_page():
 # --- Admin UI ---
 @app.route('/admin')
 def admin_page():
-    groq_status = check_groq_health()
-    # read last 200 lines of model.log for quick debugging
-    log_lines = []
+    groq_status = groq_health.snapshot()
+    # last 200 lines of model.log for quick debugging; seeks from the end of the file
+    log_path = os.path.join(LOG_DIR, 'model.log')
     try:
-        with open(os.path.join(LOG_DIR, 'model.log'), 'r', encoding='utf-8') as f:
-            lines = f.read().splitlines()
-            log_lines = lines[-200:]
+        get_writer(log_path).flush()
+        log_lines = [format_line(line) for line in tail_lines(log_path, 200)] or ['No logs yet.']
     except Exception:
         log_lines = ['No logs yet.']
     return render_template('admin.html', groq=groq_status, logs=log_lines)
 
 @app.route('/admin/reload_models', methods=['POST'])
 def admin_reload_models():
-    """Check Groq status and report."""
+    """Re-check Groq status now and report."""
     try:
-        status = check_groq_health()
+        status = groq_health.refresh()
         return jsonify({'success': True, 'status': status})
     except Exception as e:
         log_model(f"admin_reload_models error: {e}")
@@ -295,8 +875,8 @@ def admin_reload_models():
 
 @app.route('/admin/start_worker', methods=['POST'])
 def admin_start_worker():
-    """Groq is hosted externally; this checks API connectivity."""
-    status = check_groq_health()
+    """Groq is hosted externally; this reports API connectivity."""
+    status = groq_health.snapshot()
     return jsonify({'success': True, 'status': status})
 
 @app.route('/contact/submit', methods=['POST'])
@@ -319,20 +899,75 @@ def contact_submit():
 
 @app.route('/_health')
 def health_check():
-    groq = check_groq_health()
+    """Liveness: the process is up and serving. Never touches Groq or the dataset."""
     return jsonify({
         'status': 'ok',
-        'groq': groq
+        'pid': os.getpid(),
+        'uptime_seconds': round(time.time() - STARTED_AT, 1),
+        # In memory: "open" means this worker is serving fallbacks without calling Groq.
+        'groq_breaker': resilience_stats()['breaker']['state'],
     })
 
+
+@app.route('/_ready')
+def readiness_check():
+    """Readiness: the dataset indexes are loaded and the last Groq check succeeded.
+
+    An open circuit breaker is reported but doesn't fail readiness: the
+    worker still answers, with fallbacks.
+    """
+    groq = groq_health.snapshot()
+    checks = {
+        'dataset_loaded': _dataset is not None,
+        'groq_connected': bool(groq.get('connected')) and not groq['stale'],
+    }
+    ready = all(checks.values())
+    return jsonify({
+        'status': 'ready' if ready else 'not_ready',
+        'checks': checks,
+        'groq': groq,
+        'groq_resilience': resilience_stats(),
+    }), 200 if ready else 503
+
 @app.route('/_model_status')
 def model_status():
     try:
-        status = check_groq_health()
+        status = groq_health.snapshot()
         return jsonify(status)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+
+@app.route('/_cache_stats')
+def cache_status():
+    return jsonify(cache_stats())
+
+
+@app.route('/_history_stats')
+def history_status():
+    return jsonify(get_history().stats())
+
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus scrape target: stage latencies, outcome counters and token usage for every worker."""
+    return Response(metrics.REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+
+@app.route('/_single_flight_stats')
+def single_flight_status():
+    return jsonify(single_flight_stats())
+
+
+@app.route('/_admission_stats')
+def admission_status():
+    return jsonify(admission_stats())
+
+
+@app.route('/_routing_stats')
+def routing_status():
+    return jsonify(routing_stats())
+
 @app.route('/_env_check')
 def env_check():
     try:
@@ -347,7 +982,7 @@ def env_check():
             except Exception as e:
                 info[m] = {'installed': False, 'error': str(e)}
         info['python_version'] = sys.version
-        info['groq'] = check_groq_health()
+        info['groq'] = groq_health.snapshot()
         return jsonify(info)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -361,8 +996,8 @@ if __name__ == "__main__":
     print("  DREAMLENS AI -- Powered by Groq")
     print("=" * 60)
 
-    groq = check_groq_health()
-    if groq["connected"]:
+    groq = groq_health.refresh()
+    if groq.get("connected"):
         print("  [OK] Groq API connected")
         print(f"  [MODEL] Active: {groq['active_model']}")
         if groq.get("model_available", True):
@@ -370,10 +1005,10 @@ if __name__ == "__main__":
         else:
             print(f"  [WARN] {groq.get('error')}")
     else:
-        print(f"  [ERROR] Groq is unavailable: {groq['error']}")
+        print(f"  [ERROR] Groq is unavailable: {groq.get('error')}")
         print("  [TIP] Set GROQ_API_KEY in your environment")
 
-    print(f"  [DATA] Dream database: {len(dreams_df)} entries loaded")
+    print(f"  [DATA] Dream database: {len(warm_up().df)} entries loaded")
     print("=" * 60)
     print(f"  [SERVER] Starting on http://127.0.0.1:{port}")
     print("=" * 60)
@@ -0,0 +1,413 @@
+"""
+DREAMLENS AI - ASGI Entrypoint
+Serves POST /interpret and /interpret/batch natively on asyncio, so a
+request waiting on Groq holds no worker thread, and hands every other
+route to the Flask app in app.py through a thread-pool WSGI bridge.
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5000 --workers 4
+"""
+
+import asyncio
+import io
+import json
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import app as web
+import metrics
+import tracing
+from admission import BATCH, INTERACTIVE
+from groq_client import aclose_async_client, interpret_dream_async, request_deadline
+
+# ---------- Native routes ----------
+
+
+async def interpret_unmatched(dream: str, use_cache: bool, timer, deadline: float = None,
+                              priority: int = INTERACTIVE, mode: str = "auto"):
+    """`web.interpret_unmatched()` on the event loop: (interpretation_text, meta, usage)."""
+    with timer.stage("context_search"):
+        db_context = web.search_database_context(dream)
+    with timer.stage("reuse_prior"):
+        prior = await asyncio.to_thread(web.reuse_prior, dream, db_context, mode) if use_cache else None
+    if prior:
+        return prior + (None,)
+    with timer.stage("groq"):
+        groq_result = await interpret_dream_async(dream, db_context=db_context, use_cache=False,
+                                                  deadline=deadline, priority=priority, mode=mode)
+    interpretation_text, meta = web.resolve_groq_result(dream, groq_result)
+    return interpretation_text, meta, groq_result.get("usage")
+
+
+async def rate_limit_wait(headers: dict, client: str, route: str) -> float:
+    client = web.client_address(client, headers.get("x-forwarded-for"))
+    # A SQLite transaction, so it runs off the loop.
+    return await asyncio.to_thread(web.rate_limit_wait, headers.get(web.API_KEY_HEADER.lower()), client, route)
+
+
+async def interpret(body: bytes, headers: dict, client: str = None):
+    """Async /interpret: dataset match -> context search -> AsyncGroq -> history.
+
+    Returns (status, payload, response headers) with exactly what the Flask
+    route returns.
+    """
+    try:
+        data = json.loads(body or b"{}") or {}
+    except ValueError:
+        return 400, {"success": False, "message": "Request body must be valid JSON."}, {}
+    if not isinstance(data, dict):
+        data = {}
+    dream = (data.get("dream") or "").strip()
+    if not dream:
+        return 400, {"success": False, "message": "Please provide a dream text."}, {}
+
+    timer = metrics.timer()
+    mode = web.request_mode(data)
+    deadline = request_deadline(mode)
+    trace = tracing.trace_id(headers.get(tracing.TRACE_HEADER.lower()))
+    force_model = bool(data.get('force_model', False))
+    use_cache = not bool(data.get('no_cache', False))
+
+    # Matching is sub-millisecond CPU work once warm_up() has run, so it stays on the loop.
+    with timer.stage("dataset_match"):
+        structured = web.dataset_match(dream, force_model)
+
+    usage = None
+    if structured:
+        interpretation_text = structured['interpretation']
+        meta = {"method": "dataset", "score": structured['score']}
+    else:
+        wait = await rate_limit_wait(headers, client, "interpret")
+        if wait:
+            payload, limit_headers = web.too_many_requests(wait)
+            return 429, payload, limit_headers
+        interpretation_text, meta, usage = await interpret_unmatched(dream, use_cache, timer, deadline, mode=mode)
+
+    meta['forced'] = force_model
+    meta['trace_id'] = trace
+
+    # Only enqueues; the history writer thread commits in batches.
+    with timer.stage("history_write"):
+        web.save_history(dream, interpretation_text, meta["method"])
+    web.record_request(timer, trace, "interpret", dream, interpretation_text, meta, usage)
+
+    return 200, {
+        "success": True,
+        "dream": dream,
+        "interpretation": interpretation_text,
+        "meta": meta
+    }, {tracing.TRACE_HEADER: trace}
+
+
+async def interpret_batch(body: bytes, headers: dict, client: str = None):
+    """Async /interpret/batch; the body is an async iterator of the same NDJSON lines.
+
+    Groq calls for the batch share a semaphore of BATCH_CONCURRENCY.
+    """
+    try:
+        data = json.loads(body or b"{}")
+    except ValueError:
+        return 400, {"success": False, "message": "Request body must be valid JSON."}, {}
+    items, error = web.parse_batch(data)
+    if error:
+        return 400, {"success": False, "message": error}, {}
+
+    trace = tracing.trace_id(headers.get(tracing.TRACE_HEADER.lower()))
+    force_model = bool(data.get('force_model', False))
+    use_cache = not bool(data.get('no_cache', False))
+    mode = web.request_mode(data)
+    valid = [item for item in items if item[2]]
+    with metrics.span(stage="batch_dataset_match"):
+        matches = web.dataset_matches([dream for _, _, dream in valid], force_model)
+    wait = await rate_limit_wait(headers, client, "interpret_batch") if not all(matches) else 0.0
+    if wait:
+        payload, limit_headers = web.too_many_requests(wait)
+        return 429, payload, limit_headers
+
+    async def lines():
+        rows = []
+        limit = asyncio.Semaphore(web.BATCH_CONCURRENCY)
+
+        async def interpret_item(item):
+            async with limit:
+                timer = metrics.timer()
+                try:
+                    return (item, timer) + await interpret_unmatched(item[2], use_cache, timer, priority=BATCH,
+                                                                     mode=mode)
+                except Exception as e:
+                    web.log_model(f"Batch item failed: {e}", level="error")
+                    return item, None, None, None, None
+
+        tasks = []
+        try:
+            for index, item_id, dream in items:
+                if not dream:
+                    yield web.batch_line(index, item_id, web.BATCH_INVALID)
+            for (index, item_id, dream), structured in zip(valid, matches):
+                if structured:
+                    meta = {"method": "dataset", "score": structured['score']}
+                    yield web.batch_result(rows, metrics.timer(), trace, index, item_id, dream,
+                                           structured['interpretation'], meta, None, force_model)
+                else:
+                    tasks.append(asyncio.ensure_future(interpret_item((index, item_id, dream))))
+            for next_done in asyncio.as_completed(tasks):
+                (index, item_id, dream), timer, text, meta, usage = await next_done
+                if timer is None:
+                    yield web.batch_line(index, item_id, web.BATCH_FAILED)
+                else:
+                    yield web.batch_result(rows, timer, trace, index, item_id, dream, text, meta, usage,
+                                           force_model)
+            yield json.dumps({"done": True, "count": len(items), "trace_id": trace}) + "\n"
+        finally:
+            for task in tasks:
+                task.cancel()
+            with metrics.span(stage="batch_history_write"):
+                web.save_history_many(rows)
+
+    return 200, lines(), {tracing.TRACE_HEADER: trace, "Content-Type": "application/x-ndjson",
+                          "Cache-Control": "no-cache"}
+
+
+NATIVE_ROUTES = {
+    ("POST", "/interpret"): interpret,
+    ("POST", "/interpret/batch"): interpret_batch,
+}
+
+
+# ---------- WSGI bridge ----------
+
+# Threads for routes served through the bridge; an open /interpret/stream holds one.
+BRIDGE_THREADS = int(os.environ.get("WSGI_BRIDGE_THREADS", "32"))
+# Response chunks buffered per bridged request before the WSGI thread waits for the client.
+BRIDGE_QUEUE = 64
+
+
+def wsgi_environ(scope: dict, body: bytes) -> dict:
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", ""),
+        # WSGI carries the raw path as latin-1 decoded bytes.
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": str(server[0]),
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "REMOTE_PORT": str(client[1]),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for raw_name, raw_value in scope.get("headers", []):
+        name = raw_name.decode("latin-1").upper().replace("-", "_")
+        value = raw_value.decode("latin-1")
+        if name == "CONTENT_TYPE":
+            environ["CONTENT_TYPE"] = value
+        elif name == "CONTENT_LENGTH":
+            environ["CONTENT_LENGTH"] = value
+        else:
+            key = "HTTP_" + name
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+_bridge = None
+
+
+def bridge_executor() -> ThreadPoolExecutor:
+    """The bridge's own threads.
+
+    Open streams hold these, never the default executor's threads that the
+    native routes' asyncio.to_thread() calls run on.
+    """
+    global _bridge
+    if _bridge is None:
+        _bridge = ThreadPoolExecutor(max_workers=BRIDGE_THREADS, thread_name_prefix="wsgi-bridge")
+    return _bridge
+
+
+def close_bridge():
+    global _bridge
+    if _bridge is not None:
+        _bridge.shutdown(wait=False)
+        _bridge = None
+
+
+async def watch_disconnect(receive, disconnected: threading.Event):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+    disconnected.set()
+
+
+async def call_wsgi(wsgi_app, scope: dict, body: bytes, send, receive=None):
+    """Run `wsgi_app` on the bridge executor and relay its response.
+
+    Body chunks are forwarded as the WSGI iterable produces them, so
+    streaming routes such as /interpret/stream keep streaming. At most
+    BRIDGE_QUEUE chunks wait to be sent; past that the WSGI thread blocks
+    until the client catches up. If the client disconnects, the thread
+    stops iterating and closes the iterable, which ends an upstream Groq
+    stream along with it.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=BRIDGE_QUEUE)
+    environ = wsgi_environ(scope, body)
+    disconnected = threading.Event()
+    watcher = asyncio.ensure_future(watch_disconnect(receive, disconnected)) if receive else None
+
+    def push(item):
+        asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+
+    def start_response(status, headers, exc_info=None):
+        push(("start", status, headers))
+        return lambda data: push(("body", data))
+
+    def run():
+        try:
+            result = wsgi_app(environ, start_response)
+            try:
+                for chunk in result:
+                    if disconnected.is_set():
+                        break
+                    if chunk:
+                        push(("body", chunk))
+            finally:
+                if hasattr(result, "close"):
+                    result.close()
+        except Exception as e:
+            push(("error", e))
+        finally:
+            push(("end",))
+
+    worker = loop.run_in_executor(bridge_executor(), run)
+    started = failed = False
+    try:
+        while True:
+            item = await queue.get()
+            if item[0] == "end":
+                break
+            if disconnected.is_set():
+                # Keep draining so the WSGI thread is never left blocked on a full queue.
+                continue
+            try:
+                if item[0] == "start":
+                    status = int(item[1].split(" ", 1)[0])
+                    headers = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in item[2]]
+                    await send({"type": "http.response.start", "status": status, "headers": headers})
+                    started = True
+                elif item[0] == "body":
+                    await send({"type": "http.response.body", "body": item[1], "more_body": True})
+                else:
+                    web.log_model(f"WSGI bridge error on {scope['path']}: {item[1]}")
+                    failed = True
+            except OSError:
+                # The server could not write to the client: it is gone.
+                disconnected.set()
+        await worker
+    finally:
+        if watcher is not None:
+            watcher.cancel()
+    if disconnected.is_set():
+        return
+    if started:
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+    elif failed:
+        await send_json(send, 500, {"success": False, "message": "Internal server error"})
+
+
+# ---------- ASGI app ----------
+
+
+async def read_body(receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            break
+    return b"".join(chunks)
+
+
+async def send_json(send, status: int, payload: dict, headers: dict = None):
+    body = json.dumps(payload).encode("utf-8")
+    raw_headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+    raw_headers += [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in (headers or {}).items()]
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": raw_headers,
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def send_lines(send, status: int, lines, headers: dict):
+    """Stream an async iterator of text lines as a chunked response body."""
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers.items()],
+    })
+    try:
+        async for line in lines:
+            await send({"type": "http.response.body", "body": line.encode("utf-8"), "more_body": True})
+    finally:
+        await lines.aclose()
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            try:
+                # Same job as gunicorn's post_worker_init: load the dataset before traffic.
+                await asyncio.to_thread(web.warm_up)
+                # Archives exited workers' metrics, or starts from zero if this is a new server.
+                await asyncio.to_thread(metrics.REGISTRY.start)
+            except Exception as e:
+                await send({"type": "lifespan.startup.failed", "message": str(e)})
+                return
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await aclose_async_client()
+            close_bridge()
+            await asyncio.to_thread(web.get_history().close)
+            await asyncio.to_thread(metrics.REGISTRY.close)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        return
+    body = await read_body(receive)
+    handler = NATIVE_ROUTES.get((scope["method"], scope["path"]))
+    if handler is None:
+        await call_wsgi(web.app, scope, body, send, receive)
+        return
+    headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope.get("headers", [])}
+    try:
+        client = (scope.get("client") or ("",))[0]
+        status, payload, response_headers = await handler(body, headers, client)
+    except Exception as e:
+        web.log_model(f"{scope['path']} failed: {e}")
+        status, payload, response_headers = 500, {"success": False, "message": "Internal server error"}, {}
+    if isinstance(payload, dict):
+        await send_json(send, status, payload, response_headers)
+        return
+    try:
+        await send_lines(send, status, payload, response_headers)
+    except Exception as e:
+        web.log_model(f"{scope['path']} failed while streaming: {e}")
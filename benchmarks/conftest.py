@@ -0,0 +1,114 @@
+import os
+import sys
+import tempfile
+from types import SimpleNamespace
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Same scratch setup as tests/conftest.py: app.py creates its folders at import.
+_SCRATCH = tempfile.mkdtemp(prefix="dreamlens-bench-")
+os.environ.setdefault("DATA_DIR", os.path.join(_SCRATCH, "data"))
+os.environ.setdefault("LOG_DIR", os.path.join(_SCRATCH, "logs"))
+os.chdir(ROOT)
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from benchmarks import harness  # noqa: E402
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("dreamlens benchmarks")
+    group.addoption("--update-baselines", action="store_true",
+                    help="record this run's timings in benchmarks/baselines.json instead of checking them")
+    group.addoption("--bench-threshold", type=float, default=harness.THRESHOLD,
+                    help="allowed slowdown against the baseline before a benchmark fails (0.3 = 30%%)")
+
+
+class Recorder:
+    def __init__(self, config):
+        self.update = config.getoption("--update-baselines")
+        self.threshold = config.getoption("--bench-threshold")
+        self.baselines = harness.load_baselines().get("benchmarks", {})
+        self.results = {}
+        self.rows = []
+
+    def __call__(self, name: str, fn, threshold: float = None, **options) -> float:
+        """Time `fn` (median of rounds) and fail on a slowdown past `threshold` (default: --bench-threshold)."""
+        threshold = max(threshold or 0.0, self.threshold)
+        measured = harness.measure_rounds(fn, **options)
+        status, change = harness.compare(*measured, self.baselines.get(name), threshold)
+        seconds = measured[0]
+        self.results[name] = measured
+        self.rows.append((name, seconds, status, change))
+        if status == "regressed" and not self.update:
+            pytest.fail(f"{name}: {seconds * 1000:.3f} ms is {change:+.0%} against the baseline "
+                        f"(threshold {threshold:.0%}); rerun with --update-baselines if intended",
+                        pytrace=False)
+        return seconds
+
+
+_recorder = None
+
+
+@pytest.fixture(scope="session")
+def bench(request):
+    """bench(name, fn) times fn, records it and fails on a regression against baselines.json."""
+    global _recorder
+    _recorder = Recorder(request.config)
+    yield _recorder
+    if _recorder.update and _recorder.results:
+        harness.save_baselines(_recorder.results)
+
+
+def pytest_terminal_summary(terminalreporter):
+    if _recorder is None or not _recorder.rows:
+        return
+    write = terminalreporter.write_line
+    terminalreporter.section("benchmarks")
+    references = sorted(reference for _, reference in _recorder.results.values())
+    write(f"reference workload {references[len(references) // 2] * 1000:.2f} ms (median); "
+          f"threshold {_recorder.threshold:.0%}"
+          + ("; baselines updated" if _recorder.update else ""))
+    for name, seconds, status, change in sorted(_recorder.rows):
+        delta = f"{change:+7.1%}" if change is not None else "      -"
+        write(f"{name:<48}{seconds * 1000:>12.3f} ms  {delta}  {status}")
+
+
+_frames = {}
+_datasets = {}
+
+
+@pytest.fixture(scope="session")
+def frames():
+    """Synthetic dataset frames by row count, built once per session."""
+    def get(rows):
+        if rows not in _frames:
+            _frames[rows] = harness.synthetic_frame(rows)
+        return _frames[rows]
+    return get
+
+
+@pytest.fixture()
+def dataset(request, frames, monkeypatch):
+    """Install a synthetic dataset of `request.param` rows as app's loaded dataset."""
+    import app
+    import tfidf_artifact
+    from retrieval import BM25Index
+    from symbol_index import SymbolIndex
+    from symbol_matcher import SymbolMatcher
+
+    ds = _datasets.get(request.param)
+    if ds is None:
+        df = frames(request.param)
+        vectorizer, matrix = tfidf_artifact.fit(df)
+        ds = _datasets[request.param] = SimpleNamespace(
+            df=df, vectorizer=vectorizer, tfidf_matrix=matrix,
+            bm25=BM25Index.from_frame(df) if app.RETRIEVAL == "bm25" else None,
+            symbol_index=SymbolIndex.from_frame(df),
+            symbol_matcher=SymbolMatcher.from_frame(df, min_words=2))
+    monkeypatch.setattr(app, "_dataset", ds)
+    app.find_best_match_simple.cache_clear()
+    yield ds
+    app.find_best_match_simple.cache_clear()
@@ -0,0 +1,168 @@
+"""
+DREAMLENS AI - Benchmark Harness
+Timing, synthetic datasets and baseline comparison for the retrieval
+micro-benchmarks in this directory (run them with `python -m pytest benchmarks`).
+
+Timings are stored relative to a fixed reference workload measured just
+before each round of a benchmark, so baselines recorded on one machine still
+flag regressions on a faster or slower one. Each benchmark's relative time
+is the median of several rounds. It regresses when that exceeds the
+baseline by more than its threshold: BENCH_THRESHOLD (default 0.3 = 30%),
+or a wider one the benchmark sets for itself when it does file I/O.
+"""
+
+import json
+import os
+import platform
+import random
+import statistics
+import time
+
+import pandas as pd
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+THRESHOLD = float(os.environ.get("BENCH_THRESHOLD", "0.3"))
+# Rounds per benchmark (the median counts), and the seconds after which no new round starts.
+ROUNDS = int(os.environ.get("BENCH_ROUNDS", "5"))
+ROUND_BUDGET = 10.0
+SIZES = tuple(int(n) for n in os.environ.get("BENCH_SIZES", "2000,10000,100000").split(","))
+DREAM_LENGTHS = {"short": 12, "medium": 60, "long": 300}
+SOURCE_PATH = os.path.join("project", "cleaned_dream_interpretations.csv")
+
+FILLER = ("i", "was", "in", "a", "the", "and", "then", "my", "with", "suddenly", "felt", "saw", "could",
+          "not", "it", "there", "old", "dark", "running", "again", "someone", "behind", "me", "very")
+SYLLABLES = ("ka", "lo", "mir", "sen", "ta", "vor", "el", "qui", "dra", "po", "nix", "ul", "bre", "som", "ar")
+
+
+# --------------- Timing ---------------
+
+def measure(fn, min_time: float = 0.05, repeat: int = 5) -> float:
+    """Best-of-`repeat` seconds per call, looping fast calls until a round takes `min_time`."""
+    started = time.perf_counter()
+    fn()
+    first = time.perf_counter() - started
+    loops = 1 if first >= min_time else max(1, int(min_time / max(first, 1e-7)))
+    best = first if loops == 1 else float("inf")
+    # Startup steps at 100k rows take seconds; a couple of reruns is enough for those.
+    for _ in range(repeat if first < 1.0 else 2):
+        started = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        best = min(best, (time.perf_counter() - started) / loops)
+    return best
+
+
+def reference_workload():
+    # A mix of interpreter, string and sort work, like the code under test.
+    words = [f"{i % 977}-{i}" for i in range(20000)]
+    counts = {}
+    for word in words:
+        counts[word[:3]] = counts.get(word[:3], 0) + 1
+    sorted(words, key=len)
+    return sum(counts.values())
+
+
+def calibrate(repeat: int = 7) -> float:
+    """Seconds per reference_workload() on this machine right now."""
+    return measure(reference_workload, min_time=0.02, repeat=repeat)
+
+
+def measure_rounds(fn, rounds: int = ROUNDS, budget: float = ROUND_BUDGET, **options) -> tuple:
+    """(seconds, reference seconds) from the median of up to `rounds` rounds.
+
+    Each round calibrates right before timing `fn`, so a round's ratio of
+    the two cancels the machine's drift at that moment; the median ratio
+    then drops rounds disturbed by other work. Rounds stop once `budget`
+    seconds have gone by, so the multi-second 100k builds run only once.
+    The reference returned is the one the median ratio implies.
+    """
+    started = time.perf_counter()
+    seconds, ratios = [], []
+    while len(ratios) < rounds:
+        reference = calibrate(repeat=3)
+        elapsed = measure(fn, **options)
+        seconds.append(elapsed)
+        ratios.append(elapsed / reference)
+        if time.perf_counter() - started > budget:
+            break
+    median = statistics.median(seconds)
+    return median, median / statistics.median(ratios)
+
+
+# --------------- Synthetic data ---------------
+
+def source_frame() -> pd.DataFrame:
+    return pd.read_csv(SOURCE_PATH)[["Word", "Interpretation"]].dropna()
+
+
+def synthetic_frame(rows: int, seed: int = 11) -> pd.DataFrame:
+    """`rows` rows: the real symbols first, then generated one- and two-word symbols,
+    each with an interpretation drawn from the real dataset."""
+    rng = random.Random(seed)
+    source = source_frame()
+    words = source["Word"].astype(str).tolist()[:rows]
+    real = list(words)
+    texts = source["Interpretation"].astype(str).tolist()
+    seen = {w.lower() for w in words}
+    while len(words) < rows:
+        word = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+        if rng.random() < 0.3:
+            word = f"{rng.choice(real).lower()} {word}"
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    return pd.DataFrame({"Word": words, "Interpretation": [rng.choice(texts) for _ in words]})
+
+
+def synthetic_dream(df: pd.DataFrame, length: int, seed: int = 5) -> str:
+    """A `length`-word dream, mostly filler with roughly one dataset symbol in eight words."""
+    rng = random.Random(seed)
+    symbols = df["Word"].astype(str).tolist()
+    out = []
+    while len(out) < length:
+        out.extend(rng.choice(symbols).lower().split() if rng.random() < 0.125 else [rng.choice(FILLER)])
+    return " ".join(out[:length])
+
+
+# --------------- Baselines ---------------
+
+def load_baselines(path: str = BASELINE_PATH) -> dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"benchmarks": {}}
+
+
+def save_baselines(results: dict, path: str = BASELINE_PATH):
+    """Write `results` ({name: (seconds, reference_seconds)}) as the new baselines,
+    keeping entries that were not rerun."""
+    current = load_baselines(path).get("benchmarks", {})
+    for name, (seconds, reference) in results.items():
+        current[name] = {"seconds": round(seconds, 9), "relative": round(seconds / reference, 4)}
+    payload = {
+        "recorded_on": f"{platform.python_implementation()} {platform.python_version()}, {platform.machine()}",
+        "threshold": THRESHOLD,
+        "benchmarks": dict(sorted(current.items())),
+    }
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2)
+        f.write("\n")
+    os.replace(tmp, path)
+
+
+def compare(seconds: float, reference: float, baseline: dict, threshold: float = THRESHOLD):
+    """("new" | "ok" | "faster" | "regressed", change) against a stored baseline entry.
+
+    `change` is the fractional change in time relative to the reference
+    workload: +0.5 means 50% slower than the baseline.
+    """
+    if not baseline or not baseline.get("relative"):
+        return "new", None
+    change = (seconds / reference) / baseline["relative"] - 1
+    if change > threshold:
+        return "regressed", change
+    if change < -threshold:
+        return "faster", change
+    return "ok", change
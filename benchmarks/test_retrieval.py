@@ -0,0 +1,74 @@
+import random
+
+import pytest
+
+import app
+import tfidf_artifact
+from benchmarks.harness import DREAM_LENGTHS, SIZES, synthetic_dream
+from retrieval import BM25Index
+from symbol_index import SymbolIndex
+
+CASES = [(rows, length) for rows in SIZES for length in DREAM_LENGTHS]
+
+
+def case_id(case):
+    return f"{case[0] // 1000}k-{case[1]}"
+
+
+@pytest.mark.parametrize("dataset,length", CASES, ids=map(case_id, CASES), indirect=["dataset"])
+def test_find_best_match_simple(bench, dataset, length):
+    dream = synthetic_dream(dataset.df, DREAM_LENGTHS[length])
+    # Uncached: the lru_cache only helps with repeated dreams.
+    match = app.find_best_match_simple.__wrapped__
+    bench(f"find_best_match_simple[{case_id((len(dataset.df), length))}]", lambda: match(dream))
+
+
+@pytest.mark.parametrize("dataset", SIZES, ids=lambda rows: f"{rows // 1000}k", indirect=True)
+def test_find_best_matches_batch(bench, dataset):
+    dreams = [synthetic_dream(dataset.df, DREAM_LENGTHS["medium"], seed=i) for i in range(64)]
+    bench(f"find_best_matches[{len(dataset.df) // 1000}k-batch64]", lambda: app.find_best_matches(dreams))
+
+
+@pytest.mark.parametrize("dataset,length", CASES, ids=map(case_id, CASES), indirect=["dataset"])
+def test_search_database_context(bench, dataset, length):
+    dream = synthetic_dream(dataset.df, DREAM_LENGTHS[length])
+    assert app.search_database_context(dream)
+    bench(f"search_database_context[{case_id((len(dataset.df), length))}]",
+          lambda: app.search_database_context(dream))
+
+
+@pytest.mark.parametrize("length", DREAM_LENGTHS)
+def test_synthesize_fallback(bench, frames, length):
+    dream = synthetic_dream(frames(SIZES[0]), DREAM_LENGTHS[length])
+    random.seed(0)
+    bench(f"synthesize_fallback[{length}]", lambda: app.synthesize_fallback(dream))
+
+
+@pytest.mark.parametrize("rows", SIZES, ids=lambda rows: f"{rows // 1000}k")
+def test_load_data(bench, frames, rows, tmp_path, monkeypatch):
+    path = tmp_path / "dataset.csv"
+    frames(rows).to_csv(path, index=False)
+    monkeypatch.setattr(app, "DATASET_PATH", str(path))
+    assert len(app.load_data()) == rows
+    # Reads a CSV from disk, so page cache and disk load move it more than the CPU-bound cases.
+    bench(f"load_data[{rows // 1000}k]", app.load_data, threshold=0.6, min_time=0.2, repeat=3)
+
+
+@pytest.mark.parametrize("rows", SIZES, ids=lambda rows: f"{rows // 1000}k")
+def test_fit_transform(bench, frames, rows):
+    df = frames(rows)
+    bench(f"fit_transform[{rows // 1000}k]", lambda: tfidf_artifact.fit(df), min_time=0.2, repeat=3)
+
+
+@pytest.mark.parametrize("rows", SIZES, ids=lambda rows: f"{rows // 1000}k")
+def test_symbol_index_build(bench, frames, rows):
+    df = frames(rows)
+    bench(f"symbol_index_build[{rows // 1000}k]", lambda: SymbolIndex.from_frame(df), min_time=0.2, repeat=3)
+
+
+@pytest.mark.parametrize("rows", SIZES, ids=lambda rows: f"{rows // 1000}k")
+def test_bm25_index_build(bench, frames, rows):
+    df = frames(rows)
+    # Builds large sparse matrices, so heap state left by earlier cases moves it more than the lookups.
+    bench(f"bm25_index_build[{rows // 1000}k]", lambda: BM25Index.from_frame(df), threshold=0.6,
+          min_time=0.2, repeat=3)
@@ -3,15 +3,27 @@ DREAMLENS AI - Groq Client
 Provides hosted LLM dream interpretation via the official Groq Python SDK.
 """
 
-from datetime import datetime
+import asyncio
 import os
 import tempfile
-
-from groq import Groq
+import threading
+import time
+import weakref
+from functools import lru_cache
+
+import metrics
+from admission import INTERACTIVE, ConcurrencyGate
+from interpretation_cache import InterpretationCache, make_key
+from prompts import PromptBuilder
+from resilience import CLOSED, CircuitBreaker, RetryBudget, backoff
+from routing import DEEP, FAST, STANDARD, RoutingPolicy, count_symbols
+from single_flight import SingleFlight, worker_lock
+from structured_log import log_event
 
 IS_VERCEL = bool(os.environ.get("VERCEL"))
 TMP_DIR = tempfile.gettempdir()
 LOG_DIR = os.environ.get("LOG_DIR", os.path.join(TMP_DIR, "dreamlens-logs") if IS_VERCEL else "logs")
+DATA_DIR = os.environ.get("DATA_DIR", os.path.join(TMP_DIR, "dreamlens-data") if IS_VERCEL else "data")
 
 # --------------- Configuration ---------------
 
@@ -40,6 +52,67 @@ _load_local_env()
 GROQ_MODEL = os.environ.get("GROQ_MODEL", "llama-3.3-70b-versatile")
 GROQ_API_KEY = os.environ.get("GROQ_API_KEY")
 GROQ_TIMEOUT = int(os.environ.get("GROQ_TIMEOUT", "120"))
+GROQ_BASE_URL = os.environ.get("GROQ_BASE_URL") or None
+
+# Connection pool shared by every call in the process. GROQ_TIMEOUT remains the
+# write/pool timeout; connect and read get their own budgets.
+GROQ_CONNECT_TIMEOUT = float(os.environ.get("GROQ_CONNECT_TIMEOUT", "5"))
+GROQ_READ_TIMEOUT = float(os.environ.get("GROQ_READ_TIMEOUT", str(GROQ_TIMEOUT)))
+GROQ_POOL_SIZE = int(os.environ.get("GROQ_POOL_SIZE", "20"))
+GROQ_KEEPALIVE_EXPIRY = float(os.environ.get("GROQ_KEEPALIVE_EXPIRY", "60"))
+# The async path (asgi.py) parks waiting requests on the event loop instead of
+# threads, so its pool is sized for many more concurrent upstream calls.
+GROQ_ASYNC_POOL_SIZE = int(os.environ.get("GROQ_ASYNC_POOL_SIZE", "1000"))
+
+# Resilience (see resilience.py). GROQ_DEADLINE bounds one interpretation end
+# to end, retries included; past it the caller gets a failed result and serves
+# its fallback. 0 turns the deadline off (connect + read timeout instead).
+GROQ_DEADLINE = float(os.environ.get("GROQ_DEADLINE", "8"))
+# mode="deep" may write GROQ_DEEP_MAX_TOKENS, twice a standard answer, so it gets its own.
+GROQ_DEEP_DEADLINE = float(os.environ.get("GROQ_DEEP_DEADLINE", "20"))
+GROQ_MAX_RETRIES = int(os.environ.get("GROQ_MAX_RETRIES", "2"))
+GROQ_RETRY_BUDGET = float(os.environ.get("GROQ_RETRY_BUDGET", "0.2"))
+GROQ_BREAKER_WINDOW = float(os.environ.get("GROQ_BREAKER_WINDOW", "30"))
+GROQ_BREAKER_MIN_CALLS = int(os.environ.get("GROQ_BREAKER_MIN_CALLS", "10"))
+GROQ_BREAKER_FAILURE_RATIO = float(os.environ.get("GROQ_BREAKER_FAILURE_RATIO", "0.5"))
+GROQ_BREAKER_OPEN_SECONDS = float(os.environ.get("GROQ_BREAKER_OPEN_SECONDS", "15"))
+
+# Model tiering (see routing.py): short, simple dreams go to GROQ_FAST_MODEL
+# with a smaller max_tokens; mode="deep" gets GROQ_DEEP_MODEL with a larger one.
+# While the standard tier averages over GROQ_SLOW_SECONDS per call, medium
+# dreams move to the fast tier as well. GROQ_ROUTING=off sends all to GROQ_MODEL.
+GROQ_ROUTING = os.environ.get("GROQ_ROUTING", "on").strip().lower() not in ("0", "off", "false", "no")
+GROQ_FAST_MODEL = os.environ.get("GROQ_FAST_MODEL", "llama-3.1-8b-instant")
+GROQ_DEEP_MODEL = os.environ.get("GROQ_DEEP_MODEL") or GROQ_MODEL
+GROQ_MAX_TOKENS = int(os.environ.get("GROQ_MAX_TOKENS", "1024"))
+GROQ_FAST_MAX_TOKENS = int(os.environ.get("GROQ_FAST_MAX_TOKENS", "600"))
+GROQ_DEEP_MAX_TOKENS = int(os.environ.get("GROQ_DEEP_MAX_TOKENS", "2048"))
+GROQ_FAST_MAX_WORDS = int(os.environ.get("GROQ_FAST_MAX_WORDS", "30"))
+GROQ_FAST_MAX_SYMBOLS = int(os.environ.get("GROQ_FAST_MAX_SYMBOLS", "1"))
+GROQ_SLOW_SECONDS = float(os.environ.get("GROQ_SLOW_SECONDS", "6"))
+
+# Prompt size (see prompts.py): estimated prompt tokens per call, system prompt
+# included. Matched dataset snippets are cut or dropped to fit; 0 is no limit.
+GROQ_PROMPT_BUDGET = int(os.environ.get("GROQ_PROMPT_BUDGET", "1200"))
+
+# Admission (see admission.py): Groq calls in flight across all workers, sized to
+# the account's rate limits (0 = no cap), and how many calls each worker may
+# queue for a slot. A call that can't get one before its deadline is shed.
+GROQ_CONCURRENCY = int(os.environ.get("GROQ_CONCURRENCY", "16"))
+GROQ_QUEUE_MAX = int(os.environ.get("GROQ_QUEUE_MAX", "64"))
+SLOT_DIR = os.path.join(DATA_DIR, "slots")
+
+# Interpretation cache shared by all workers (see interpretation_cache.py).
+CACHE_ENABLED = os.environ.get("INTERPRETATION_CACHE", "on").strip().lower() not in ("0", "off", "false", "no")
+CACHE_PATH = os.environ.get("INTERPRETATION_CACHE_DB", os.path.join(DATA_DIR, "interpretation_cache.db"))
+CACHE_TTL = float(os.environ.get("INTERPRETATION_CACHE_TTL", str(7 * 86400)))
+CACHE_MAX_ENTRIES = int(os.environ.get("INTERPRETATION_CACHE_MAX_ENTRIES", "5000"))
+
+# Identical concurrent requests share one upstream call (see single_flight.py).
+# Set SINGLE_FLIGHT_CROSS_WORKER=off to coalesce only within each worker.
+SINGLE_FLIGHT_CROSS_WORKER = os.environ.get("SINGLE_FLIGHT_CROSS_WORKER", "on").strip().lower() not in (
+    "0", "off", "false", "no")
+LOCK_DIR = os.path.join(DATA_DIR, "locks") if SINGLE_FLIGHT_CROSS_WORKER else None
 
 # --------------- System Prompt ---------------
 
@@ -181,27 +254,360 @@ WRITING STYLE
 The reader should feel understood.
 
 The interpretation should feel like a meaningful conversation with a wise guide who understands both psychology and symbolism.
-
-Length: 500-800 words.
 """
 
+_prompts = PromptBuilder(DREAM_SYSTEM_PROMPT, budget=GROQ_PROMPT_BUDGET)
+
+
+def length_instruction(max_tokens: int) -> str:
+    """The answer length to ask for, at about 0.6 words per token so the answer ends before max_tokens does."""
+    most = max(100, int(max_tokens * 0.6) // 50 * 50)
+    return f"\nLength: {max(50, most * 2 // 3 // 50 * 50)}-{most} words.\n"
+
+
+@lru_cache(maxsize=16)
+def _budget_prompts(system_prompt: str, budget: int, max_tokens: int) -> PromptBuilder:
+    return PromptBuilder(system_prompt + length_instruction(max_tokens), budget=budget)
+
+
+def prompts_for(route: dict) -> PromptBuilder:
+    """The prompt builder for a route: the system prompt plus a length instruction that fits its max_tokens.
+
+    Its version is part of every cache key, so answers written for a smaller
+    budget (the fast tier, or the standard model while upstream is slow) are
+    never served for a larger one, and editing the prompt invalidates them.
+    """
+    return _budget_prompts(_prompts.system_prompt, _prompts.budget, route["max_tokens"])
 
 
 # --------------- Logging ---------------
 
-def _log(msg: str):
-    """Best-effort logging to model.log."""
-    ts = datetime.utcnow().isoformat()
+def _log(msg: str, level: str = "info", **fields):
+    """Best-effort structured logging to model.log."""
     try:
-        os.makedirs(LOG_DIR, exist_ok=True)
-        with open(os.path.join(LOG_DIR, "model.log"), "a", encoding="utf-8") as f:
-            f.write(f"{ts} [groq] {msg}\n")
+        log_event(LOG_DIR, "groq", msg, level, **fields)
     except Exception:
         print(f"LOG: {msg}")
 
 
-def _client() -> Groq:
-    return Groq(api_key=GROQ_API_KEY, timeout=GROQ_TIMEOUT)
+# --------------- Shared Client ---------------
+
+_shared_client = None
+_shared_pid = None
+_client_lock = threading.Lock()
+
+
+def _new_client():
+    # Imported here so importing this module (and app.py) stays cheap.
+    import httpx
+    from groq import Groq
+
+    timeout = httpx.Timeout(GROQ_TIMEOUT, connect=GROQ_CONNECT_TIMEOUT, read=GROQ_READ_TIMEOUT)
+    limits = httpx.Limits(
+        max_connections=GROQ_POOL_SIZE,
+        max_keepalive_connections=GROQ_POOL_SIZE,
+        keepalive_expiry=GROQ_KEEPALIVE_EXPIRY,
+    )
+    http_client = httpx.Client(timeout=timeout, limits=limits, follow_redirects=True)
+    # Retries are ours (_send_guarded), bounded by the deadline and retry budget.
+    return Groq(api_key=GROQ_API_KEY, base_url=GROQ_BASE_URL, timeout=timeout, http_client=http_client,
+                max_retries=0)
+
+
+def _client():
+    """Process-wide Groq client; connections and TLS sessions are reused across calls.
+
+    The owning pid is checked so a gunicorn worker forked from a process that
+    already built a client never shares the parent's sockets.
+    """
+    global _shared_client, _shared_pid
+    pid = os.getpid()
+    client = _shared_client
+    if client is None or _shared_pid != pid:
+        with _client_lock:
+            if _shared_client is None or _shared_pid != pid:
+                _shared_client = _new_client()
+                _shared_pid = pid
+            client = _shared_client
+    return client
+
+
+def reset_client():
+    """Close the shared client; the next call builds a new one from current settings."""
+    global _shared_client, _shared_pid
+    with _client_lock:
+        client, _shared_client, _shared_pid = _shared_client, None, None
+    if client is not None:
+        try:
+            client.close()
+        except Exception:
+            pass
+
+
+def _after_fork_in_child():
+    # The parent's lock may have been held mid-fork and its sockets are not ours.
+    global _shared_client, _shared_pid, _client_lock
+    _client_lock = threading.Lock()
+    _shared_client = None
+    _shared_pid = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+# --------------- Interpretation Cache ---------------
+
+_interp_cache = None
+
+
+def _cache():
+    global _interp_cache
+    if not CACHE_ENABLED:
+        return None
+    if _interp_cache is None or _interp_cache.path != CACHE_PATH:
+        _interp_cache = InterpretationCache(CACHE_PATH, ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES)
+    return _interp_cache
+
+
+def _cache_get(key: str):
+    try:
+        cache = _cache()
+        return cache.get(key) if cache else None
+    except Exception as e:
+        _log(f"Cache read failed: {e}")
+        return None
+
+
+def _cache_put(key: str, interpretation: str, model: str = GROQ_MODEL):
+    try:
+        cache = _cache()
+        if cache:
+            cache.put(key, model, interpretation)
+    except Exception as e:
+        _log(f"Cache write failed: {e}")
+
+
+def cache_stats() -> dict:
+    """Hit/miss counters and size of the interpretation cache."""
+    try:
+        cache = _cache()
+        return cache.stats() if cache else {"enabled": False}
+    except Exception as e:
+        return {"enabled": True, "error": str(e)}
+
+
+def _cached_result(key: str, use_cache: bool):
+    if not use_cache:
+        return None
+    cached = _cache_get(key)
+    if cached is None:
+        return None
+    _log(f"Cache hit ({len(cached['interpretation'])} chars, age {cached['age']:.0f}s)")
+    return {
+        "success": True,
+        "interpretation": cached["interpretation"],
+        "model": cached["model"],
+        "error": None,
+        "cached": True,
+    }
+
+
+def cached_interpretation(dream_text: str, db_context: str = "", mode: str = "auto"):
+    """The cached result `interpret_dream` would return, or None without calling Groq."""
+    return _cached_result(_route_key(dream_text, db_context, route_request(dream_text, db_context, mode)), True)
+
+
+# --------------- Request Coalescing ---------------
+
+_flights = SingleFlight()
+
+
+def single_flight_stats() -> dict:
+    """How many Groq calls were led vs. coalesced onto an identical in-flight call."""
+    stats = _flights.stats()
+    stats["cross_worker"] = bool(LOCK_DIR)
+    return stats
+
+
+# --------------- Resilience ---------------
+
+def _breaker_changed(old: str, new: str):
+    metrics.inc("dreamlens_groq_breaker_transitions_total", state=new)
+    metrics.set_gauge("dreamlens_groq_breaker_open", 0 if new == CLOSED else 1)
+    _log(f"Groq circuit breaker {old} -> {new}", level="info" if new == CLOSED else "warning")
+
+
+_breaker = CircuitBreaker(window=GROQ_BREAKER_WINDOW, min_calls=GROQ_BREAKER_MIN_CALLS,
+                          failure_ratio=GROQ_BREAKER_FAILURE_RATIO, open_seconds=GROQ_BREAKER_OPEN_SECONDS,
+                          on_change=_breaker_changed)
+_retry_budget = RetryBudget(ratio=GROQ_RETRY_BUDGET)
+
+
+def request_deadline(mode: str = "auto") -> float:
+    """The time.monotonic() by which an interpretation in `mode` starting now must be done."""
+    seconds = GROQ_DEEP_DEADLINE if mode == DEEP else GROQ_DEADLINE
+    if seconds <= 0:
+        seconds = GROQ_CONNECT_TIMEOUT + GROQ_READ_TIMEOUT
+    return time.monotonic() + seconds
+
+
+def _remaining(deadline: float) -> float:
+    return max(0.0, deadline - time.monotonic())
+
+
+def resilience_stats() -> dict:
+    """Circuit breaker and retry budget state for this worker."""
+    return {
+        "breaker": _breaker.snapshot(),
+        "retry_budget": _retry_budget.snapshot(),
+        "deadline_seconds": GROQ_DEADLINE,
+        "deep_deadline_seconds": GROQ_DEEP_DEADLINE,
+        "max_retries": GROQ_MAX_RETRIES,
+    }
+
+
+def _retryable(exc: BaseException) -> bool:
+    """Timeouts, connection errors, 408/409/429 and 5xx: worth retrying, and count against the breaker."""
+    if isinstance(exc, asyncio.TimeoutError):
+        return True
+    from groq import APIConnectionError, APIStatusError
+
+    if isinstance(exc, APIStatusError):
+        return exc.status_code in (408, 409, 429) or exc.status_code >= 500
+    return isinstance(exc, APIConnectionError)
+
+
+def _attempt_timeout(deadline: float):
+    """Per-attempt httpx timeouts, each phase capped at the time left before the deadline."""
+    import httpx
+
+    left = _remaining(deadline)
+    return httpx.Timeout(min(GROQ_TIMEOUT, left), connect=min(GROQ_CONNECT_TIMEOUT, left),
+                         read=min(GROQ_READ_TIMEOUT, left))
+
+
+def _refusal(deadline: float):
+    """Why no attempt should be made now, or None to go ahead."""
+    if time.monotonic() >= deadline:
+        metrics.inc("dreamlens_groq_requests_total", outcome="deadline")
+        return "Groq did not answer before the request deadline."
+    if not _breaker.allow():
+        metrics.inc("dreamlens_groq_requests_total", outcome="short_circuit")
+        return "Groq is unavailable right now (circuit breaker open)."
+    return None
+
+
+def _failure(call: str, started: float, deadline: float, attempt: int, exc: BaseException, route: dict = None):
+    """Count a failed attempt; returns the backoff before retrying, or None to give up."""
+    retryable = _retryable(exc)
+    _breaker.record(not retryable)
+    _record_call(call, started, "error", route=route)
+    if not retryable or attempt >= GROQ_MAX_RETRIES:
+        return None
+    pause = backoff(attempt)
+    if time.monotonic() + pause >= deadline or not _retry_budget.spend():
+        return None
+    metrics.inc("dreamlens_groq_retries_total")
+    _log(f"Retrying Groq {call} call in {pause:.2f}s after: {exc}")
+    return pause
+
+
+# --------------- Model Routing ---------------
+
+_router = RoutingPolicy(
+    models={FAST: GROQ_FAST_MODEL, STANDARD: GROQ_MODEL, DEEP: GROQ_DEEP_MODEL},
+    max_tokens={FAST: GROQ_FAST_MAX_TOKENS, STANDARD: GROQ_MAX_TOKENS, DEEP: GROQ_DEEP_MAX_TOKENS},
+    fast_max_words=GROQ_FAST_MAX_WORDS,
+    fast_max_symbols=GROQ_FAST_MAX_SYMBOLS,
+    slow_seconds=GROQ_SLOW_SECONDS,
+    enabled=GROQ_ROUTING,
+)
+
+
+def route_request(dream_text: str, db_context: str = "", mode: str = "auto") -> dict:
+    """The tier, model and max_tokens a dream would be sent with (see routing.py)."""
+    return _router.route(dream_text, count_symbols(db_context), mode)
+
+
+def routing_stats() -> dict:
+    """Tier models and budgets, and each tier's recent average call duration."""
+    return _router.stats()
+
+
+def _route(dream_text: str, db_context: str, mode: str) -> dict:
+    """route_request(), counted in /metrics and logged."""
+    route = route_request(dream_text, db_context, mode)
+    metrics.inc("dreamlens_groq_routes_total", tier=route["tier"], reason=route["reason"])
+    _log(f"Routed to {route['tier']} tier ({route['reason']})", tier=route["tier"], model=route["model"],
+         max_tokens=route["max_tokens"], reason=route["reason"], words=route["words"], symbols=route["symbols"])
+    return route
+
+
+def _route_key(dream_text: str, db_context: str, route: dict) -> str:
+    # Deep answers come from the standard model too, but are longer, so they are cached apart.
+    model = route["model"] + (":deep" if route["tier"] == DEEP else "")
+    return make_key(dream_text, model, prompts_for(route).version, db_context)
+
+
+# --------------- Admission ---------------
+
+_gate = ConcurrencyGate(GROQ_CONCURRENCY, SLOT_DIR, queue_max=GROQ_QUEUE_MAX)
+
+SHED_ERROR = "Groq is busy right now (too many requests in flight)."
+
+
+def admission_stats() -> dict:
+    """Groq call slots in use and queued in this worker, and how many were shed."""
+    return _gate.stats()
+
+
+def _shed() -> dict:
+    metrics.inc("dreamlens_groq_requests_total", outcome="shed")
+    _log(SHED_ERROR, level="warning")
+    return {"success": False, "interpretation": "", "model": GROQ_MODEL, "error": SHED_ERROR}
+
+
+def _send_guarded(call: str, deadline: float, send, route: dict = None):
+    """Run `send(timeout)` under the breaker, retry budget and deadline.
+
+    Returns (response, started, None) or (None, None, error message). The
+    caller records the breaker success once it has the whole response.
+    """
+    _retry_budget.request()
+    attempt = 0
+    while True:
+        error = _refusal(deadline)
+        if error:
+            return None, None, error
+        started = time.perf_counter()
+        try:
+            return send(_attempt_timeout(deadline)), started, None
+        except Exception as e:
+            pause = _failure(call, started, deadline, attempt, e, route)
+            if pause is None:
+                return None, None, f"Unexpected error calling Groq: {e}"
+        time.sleep(pause)
+        attempt += 1
+
+
+async def _send_guarded_async(call: str, deadline: float, send, route: dict = None):
+    """`_send_guarded()` for coroutines; the attempt is also cancelled at the deadline."""
+    _retry_budget.request()
+    attempt = 0
+    while True:
+        error = _refusal(deadline)
+        if error:
+            return None, None, error
+        started = time.perf_counter()
+        try:
+            return await asyncio.wait_for(send(_attempt_timeout(deadline)), _remaining(deadline)), started, None
+        except Exception as e:
+            pause = _failure(call, started, deadline, attempt, e, route)
+            if pause is None:
+                return None, None, f"Unexpected error calling Groq: {e or type(e).__name__}"
+        await asyncio.sleep(pause)
+        attempt += 1
 
 
 # --------------- Health Check ---------------
@@ -241,65 +647,412 @@ def check_groq_health() -> dict:
 
 # --------------- Dream Interpretation ---------------
 
-def interpret_dream(dream_text: str, db_context: str = "") -> dict:
+def _build_prompt(dream_text: str, db_context: str, route: dict) -> dict:
+    """The messages for one call within GROQ_PROMPT_BUDGET (see prompts.py), counted in /metrics."""
+    prompt = prompts_for(route).build(dream_text, db_context)
+    for outcome, field in (("kept", "snippets"), ("trimmed", "trimmed"), ("dropped", "dropped")):
+        if prompt[field]:
+            metrics.inc("dreamlens_prompt_snippets_total", prompt[field], outcome=outcome)
+    if prompt["trimmed"] or prompt["dropped"]:
+        _log(f"Prompt context cut to fit {_prompts.budget} tokens", prompt_tokens=prompt["tokens"],
+             trimmed=prompt["trimmed"], dropped=prompt["dropped"])
+    return prompt
+
+
+def interpret_dream(dream_text: str, db_context: str = "", use_cache: bool = True, deadline: float = None,
+                    priority: int = INTERACTIVE, mode: str = "auto") -> dict:
     """Send a dream to Groq for interpretation.
 
+    Concurrent calls for the same dream and context share one upstream
+    request (see single_flight.py).
+
     Args:
         dream_text: The user's dream description.
         db_context: Optional context from the dream database (matched symbols).
+        use_cache: Serve a cached interpretation when one exists. Fresh
+            results are cached either way.
+        deadline: time.monotonic() by which to give up (default: GROQ_DEADLINE
+            from now, GROQ_DEEP_DEADLINE in deep mode). Waiting on an
+            identical call counts against it too.
+        priority: admission.INTERACTIVE or admission.BATCH; decides the
+            place in the queue when every GROQ_CONCURRENCY slot is busy.
+        mode: "auto" lets the routing policy pick the model and max_tokens;
+            "deep" always uses GROQ_DEEP_MODEL with GROQ_DEEP_MAX_TOKENS.
 
     Returns a dict with:
       - success (bool)
       - interpretation (str)
       - model (str)
+      - tier (str: fast, standard or deep; fresh answers only)
       - error (str or None)
+      - cached (bool)
+      - usage (dict of prompt_tokens/completion_tokens, fresh answers only)
     """
-    user_prompt = f'Dream: "{dream_text}"'
-    if db_context:
-        user_prompt += f"\n\nRelated dream symbols from our database:\n{db_context}"
-    user_prompt += "\n\nPlease provide a comprehensive, insightful dream interpretation."
-
-    _log(f"Sending dream to {GROQ_MODEL}: {dream_text[:80]}...")
-
+    deadline = deadline or request_deadline(mode)
+    route = _route(dream_text, db_context, mode)
+    key = _route_key(dream_text, db_context, route)
+    with metrics.span(stage="groq_cache"):
+        cached = _cached_result(key, use_cache)
+    if cached:
+        return cached
+    return _flights.do(
+        key, lambda: _request_interpretation(key, dream_text, db_context, deadline, priority, route),
+        timeout=_remaining(deadline))
+
+
+def _reuse_after_wait(key: str):
+    """After waiting on another worker's lock, its answer is usually in the cache."""
+    _flights.count("cross_worker_waits")
+    cached = _cached_result(key, True)
+    if cached:
+        _flights.count("cross_worker_reused")
+    return cached
+
+
+def _request_interpretation(key: str, dream_text: str, db_context: str, deadline: float, priority: int,
+                            route: dict) -> dict:
+    with worker_lock(LOCK_DIR, key, _remaining(deadline)) as waited:
+        if waited:
+            cached = _reuse_after_wait(key)
+            if cached:
+                return cached
+        slot = _gate.acquire(priority, _remaining(deadline))
+        if slot is None:
+            return _shed()
+        try:
+            return _call_groq(key, dream_text, db_context, deadline, route)
+        finally:
+            _gate.release(slot)
+
+
+def _record_call(call: str, started: float, outcome: str, usage=None, route: dict = None, estimate: int = None):
+    """Groq call duration, outcome and reported token usage for /metrics.
+
+    With the call's `route`, also per-tier duration and tokens, and, for
+    non-streamed calls that completed, the tier's running average for the
+    routing policy. Returns the usage as
+    {"prompt_tokens", "completion_tokens"} for the result dict (and the
+    request trace), or None when Groq reported none. With `estimate`, the
+    prompt builder's count goes alongside as "estimated_prompt_tokens".
+    """
+    seconds = time.perf_counter() - started
+    metrics.observe("dreamlens_groq_request_seconds", seconds, call=call)
+    metrics.inc("dreamlens_groq_requests_total", outcome=outcome)
+    if route is not None:
+        metrics.observe("dreamlens_groq_tier_seconds", seconds, tier=route["tier"])
+        if outcome != "error" and call != "stream":
+            # Only completed calls feed the routing average: a refused connection would
+            # drag it down and a cut-off attempt says nothing about the tier's speed.
+            # A failing tier is the circuit breaker's business. A stream's duration
+            # includes how fast the client reads it, so streams are left out too.
+            _router.observe(route["tier"], seconds)
+    if usage is None:
+        return None
+    tokens = {}
+    for kind in ("prompt", "completion"):
+        count = getattr(usage, f"{kind}_tokens", None)
+        if count:
+            metrics.inc("dreamlens_groq_tokens_total", count, kind=kind)
+            if route is not None:
+                metrics.inc("dreamlens_groq_tier_tokens_total", count, tier=route["tier"], kind=kind)
+            tokens[f"{kind}_tokens"] = count
+    if tokens and estimate:
+        # Only beside a reported count, so the two totals stay comparable.
+        metrics.inc("dreamlens_prompt_tokens_estimated_total", estimate)
+        tokens["estimated_prompt_tokens"] = estimate
+    return tokens or None
+
+
+def _failed(model: str, error: str) -> dict:
+    return {"success": False, "interpretation": "", "model": model, "error": error}
+
+
+def _prepare_call(call: str, dream_text: str, db_context: str, route: dict):
+    """(prompt, chat.completions.create() kwargs, None), or (prompt, None, failed result) without an API key."""
+    prompt = _build_prompt(dream_text, db_context, route)
+    model = route["model"]
+    _log(f"Sending dream to {model} ({call}): {dream_text[:80]}...", tier=route["tier"])
     if not GROQ_API_KEY:
         msg = "GROQ_API_KEY is not configured."
         _log(msg)
-        return {"success": False, "interpretation": "", "model": GROQ_MODEL, "error": msg}
+        return prompt, None, _failed(model, msg)
+    request = {
+        "model": model,
+        "messages": prompt["messages"],
+        "temperature": 0.7,
+        "top_p": 0.9,
+        "max_tokens": route["max_tokens"],
+    }
+    return prompt, request, None
+
+
+def _finish_call(call: str, started: float, route: dict, prompt: dict, interpretation: str, usage) -> dict:
+    """The result dict for a call that got its whole answer, with the breaker and /metrics updated.
+
+    Caching a successful answer is left to the caller, which knows whether
+    it may block.
+    """
+    _breaker.record(True)
+    usage = _record_call(call, started, "success" if interpretation else "empty", usage, route, prompt["tokens"])
+    if not interpretation:
+        _log("Groq returned empty response")
+        return _failed(route["model"], "Groq returned an empty response. Try again.")
+    _log(f"Groq {call} call completed ({len(interpretation)} chars)", tier=route["tier"], **(usage or {}))
+    return {
+        "success": True,
+        "interpretation": interpretation,
+        "model": route["model"],
+        "tier": route["tier"],
+        "error": None,
+        "cached": False,
+        "usage": usage,
+    }
+
+
+def _answer(response) -> str:
+    if not response.choices:
+        return ""
+    return (response.choices[0].message.content or "").strip()
+
+
+def _call_groq(key: str, dream_text: str, db_context: str, deadline: float, route: dict) -> dict:
+    prompt, request, failed = _prepare_call("complete", dream_text, db_context, route)
+    if failed:
+        return failed
+
+    def send(timeout):
+        return _client().chat.completions.create(**request, timeout=timeout)
+
+    response, started, error = _send_guarded("complete", deadline, send, route)
+    if error:
+        _log(error)
+        return _failed(route["model"], error)
+    result = _finish_call("complete", started, route, prompt, _answer(response), getattr(response, "usage", None))
+    if result["success"]:
+        _cache_put(key, result["interpretation"], result["model"])
+    return result
+
 
+def interpret_dream_stream(dream_text: str, db_context: str = "", use_cache: bool = True, deadline: float = None,
+                           priority: int = INTERACTIVE, mode: str = "auto"):
+    """Stream a Groq interpretation as it is generated.
+
+    Yields `{"event": "token", "text": str}` for each content delta, then
+    exactly one `{"event": "done", "result": dict}` where `result` has the
+    same shape as `interpret_dream()`'s return value. A cache hit, or joining
+    an identical request already in flight, yields only the `done` event.
+    The deadline applies until the stream opens; once tokens flow, each
+    chunk only has to arrive within the time that was left then.
+    """
+    deadline = deadline or request_deadline(mode)
+    route = _route(dream_text, db_context, mode)
+    key = _route_key(dream_text, db_context, route)
+    cached = _cached_result(key, use_cache)
+    if cached:
+        yield {"event": "done", "result": cached}
+        return
+
+    call, leader = _flights.join(key)
+    if not leader:
+        shared = _flights.wait(call, _remaining(deadline))
+        if shared is not None:
+            yield {"event": "done", "result": shared}
+            return
+
+    result = None
     try:
-        response = _client().chat.completions.create(
-            model=GROQ_MODEL,
-            messages=[
-                {"role": "system", "content": DREAM_SYSTEM_PROMPT},
-                {"role": "user", "content": user_prompt},
-            ],
-            temperature=0.7,
-            top_p=0.9,
-            max_tokens=1024,
-        )
-
-        interpretation = ""
-        if response.choices:
-            interpretation = (response.choices[0].message.content or "").strip()
-
-        if not interpretation:
-            _log("Groq returned empty response")
-            return {
-                "success": False,
-                "interpretation": "",
-                "model": GROQ_MODEL,
-                "error": "Groq returned an empty response. Try again.",
-            }
-
-        _log(f"Groq response received ({len(interpretation)} chars)")
-        return {
-            "success": True,
-            "interpretation": interpretation,
-            "model": GROQ_MODEL,
-            "error": None,
-        }
+        with worker_lock(LOCK_DIR, key, _remaining(deadline)) as waited:
+            if waited:
+                result = _reuse_after_wait(key)
+            slot = None
+            if result is None:
+                slot = _gate.acquire(priority, _remaining(deadline))
+                if slot is None:
+                    result = _shed()
+            if slot is not None:
+                events = _stream_groq(key, dream_text, db_context, deadline, route)
+                try:
+                    for event in events:
+                        if event["event"] == "done":
+                            result = event["result"]
+                        else:
+                            yield event
+                finally:
+                    # Closed here, not whenever it is collected, so the Groq stream ends with ours.
+                    events.close()
+                    _gate.release(slot)
+        yield {"event": "done", "result": result}
+    finally:
+        # If the client went away mid-stream, followers get None and make their own call.
+        if leader:
+            _flights.finish(key, call, result=result)
+
+
+def _stream_groq(key: str, dream_text: str, db_context: str, deadline: float, route: dict):
+    prompt, request, failed = _prepare_call("stream", dream_text, db_context, route)
+    if failed:
+        yield {"event": "done", "result": failed}
+        return
+
+    def send(timeout):
+        return _client().chat.completions.create(**request, stream=True, timeout=timeout)
+
+    stream, started, error = _send_guarded("stream", deadline, send, route)
+    if error:
+        _log(error)
+        yield {"event": "done", "result": _failed(route["model"], error)}
+        return
 
+    parts = []
+    usage = None
+    try:
+        for chunk in stream:
+            # Groq reports usage on the final chunk, under x_groq.
+            usage = getattr(getattr(chunk, "x_groq", None), "usage", None) or usage
+            if not chunk.choices:
+                continue
+            text = chunk.choices[0].delta.content or ""
+            if text:
+                parts.append(text)
+                yield {"event": "token", "text": text}
+    except GeneratorExit:
+        # The client went away mid-answer. Groq was answering, so the breaker counts it
+        # as a success, but the partial answer is neither cached nor a completed call.
+        _breaker.record(True)
+        _record_call("stream", started, "cancelled", route=route)
+        _log(f"Groq stream cancelled by the client after {len(parts)} chunks", tier=route["tier"])
+        raise
     except Exception as e:
+        # Tokens may already be out, so a broken stream is not retried.
+        _breaker.record(not _retryable(e))
+        _record_call("stream", started, "error", route=route)
         msg = f"Unexpected error calling Groq: {e}"
         _log(msg)
-        return {"success": False, "interpretation": "", "model": GROQ_MODEL, "error": msg}
+        yield {"event": "done", "result": _failed(route["model"], msg)}
+        return
+    finally:
+        # Hands the pooled connection back (or drops it) instead of leaving the response open.
+        stream.close()
+
+    result = _finish_call("stream", started, route, prompt, "".join(parts).strip(), usage)
+    if result["success"]:
+        _cache_put(key, result["interpretation"], result["model"])
+    yield {"event": "done", "result": result}
+
+
+# --------------- Async Interpretation ---------------
+
+# One AsyncGroq client per event loop: its connections belong to the loop that
+# opened them. In-flight coalescing for the async path is per loop as well.
+_loop_state = weakref.WeakKeyDictionary()
+
+
+def _new_async_client():
+    import httpx
+    from groq import AsyncGroq
+
+    timeout = httpx.Timeout(GROQ_TIMEOUT, connect=GROQ_CONNECT_TIMEOUT, read=GROQ_READ_TIMEOUT)
+    limits = httpx.Limits(
+        max_connections=GROQ_ASYNC_POOL_SIZE,
+        max_keepalive_connections=GROQ_ASYNC_POOL_SIZE,
+        keepalive_expiry=GROQ_KEEPALIVE_EXPIRY,
+    )
+    http_client = httpx.AsyncClient(timeout=timeout, limits=limits, follow_redirects=True)
+    return AsyncGroq(api_key=GROQ_API_KEY, base_url=GROQ_BASE_URL, timeout=timeout, http_client=http_client,
+                     max_retries=0)
+
+
+def _async_state() -> dict:
+    loop = asyncio.get_running_loop()
+    state = _loop_state.get(loop)
+    if state is None or state["pid"] != os.getpid():
+        state = {"pid": os.getpid(), "client": None, "flights": {}}
+        _loop_state[loop] = state
+    if state["client"] is None:
+        state["client"] = _new_async_client()
+    return state
+
+
+async def aclose_async_client():
+    """Close the running loop's AsyncGroq client (ASGI shutdown, tests)."""
+    state = _loop_state.pop(asyncio.get_running_loop(), None)
+    if state and state["client"] is not None:
+        try:
+            await state["client"].close()
+        except Exception:
+            pass
+
+
+async def interpret_dream_async(dream_text: str, db_context: str = "", use_cache: bool = True,
+                                deadline: float = None, priority: int = INTERACTIVE, mode: str = "auto") -> dict:
+    """`interpret_dream()` for asyncio callers; the same result dict.
+
+    Waiting on Groq holds no thread, so one event loop can have thousands of
+    interpretations in flight. Identical concurrent calls on the loop share
+    one upstream request; cache reads and writes run in the default executor.
+    """
+    deadline = deadline or request_deadline(mode)
+    route = _route(dream_text, db_context, mode)
+    key = _route_key(dream_text, db_context, route)
+    with metrics.span(stage="groq_cache"):
+        cached = await asyncio.to_thread(_cached_result, key, use_cache)
+    if cached:
+        return cached
+
+    flights = _async_state()["flights"]
+    pending = flights.get(key)
+    if pending is not None:
+        _flights.count("coalesced")
+        try:
+            shared = await asyncio.wait_for(asyncio.shield(pending), _remaining(deadline))
+        except asyncio.TimeoutError:
+            _flights.count("follower_timeouts")
+            shared = None
+        if shared is not None:
+            return dict(shared)
+        if pending.done():
+            _flights.count("leader_abandoned")
+        return await _admitted_call_async(key, dream_text, db_context, deadline, priority, route)
+
+    future = asyncio.get_running_loop().create_future()
+    flights[key] = future
+    _flights.count("leaders")
+    result = None
+    try:
+        result = await _admitted_call_async(key, dream_text, db_context, deadline, priority, route)
+        return result
+    finally:
+        # A cancelled leader hands followers None and they make their own call.
+        if flights.get(key) is future:
+            del flights[key]
+        future.set_result(result)
+
+
+async def _admitted_call_async(key: str, dream_text: str, db_context: str, deadline: float, priority: int,
+                               route: dict) -> dict:
+    slot = await _gate.acquire_async(priority, _remaining(deadline))
+    if slot is None:
+        return _shed()
+    try:
+        return await _call_groq_async(key, dream_text, db_context, deadline, route)
+    finally:
+        _gate.release(slot)
+
+
+async def _call_groq_async(key: str, dream_text: str, db_context: str, deadline: float, route: dict) -> dict:
+    prompt, request, failed = _prepare_call("async", dream_text, db_context, route)
+    if failed:
+        return failed
+    client = _async_state()["client"]
+
+    def send(timeout):
+        return client.chat.completions.create(**request, timeout=timeout)
+
+    response, started, error = await _send_guarded_async("async", deadline, send, route)
+    if error:
+        _log(error)
+        return _failed(route["model"], error)
+    result = _finish_call("async", started, route, prompt, _answer(response), getattr(response, "usage", None))
+    if result["success"]:
+        await asyncio.to_thread(_cache_put, key, result["interpretation"], result["model"])
+    return result
@@ -0,0 +1,21 @@
+"""Gunicorn settings picked up automatically from the working directory."""
+
+
+def post_worker_init(worker):
+    # app.py defers pandas/scikit-learn and the dataset indexes until first use;
+    # load them as each worker boots so the first /interpret doesn't pay for it.
+    import metrics
+    from app import warm_up
+
+    warm_up()
+    metrics.REGISTRY.start()
+
+
+def worker_exit(server, worker):
+    # Commit history rows still queued for the background writer, and archive
+    # this worker's metrics (asgi.py's lifespan does the same under uvicorn).
+    import metrics
+    from app import get_history
+
+    get_history().close()
+    metrics.REGISTRY.close()
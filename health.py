@@ -0,0 +1,104 @@
+"""
+DREAMLENS AI - Health Monitor
+Runs an expensive status check (the Groq models.list() round trip) on a
+background thread at a fixed interval and serves the last result from
+memory. Request handlers read the snapshot, so health and admin pages
+never wait on, or spend rate limit against, the upstream API.
+"""
+
+import os
+import threading
+import time
+from datetime import datetime
+
+
+class HealthMonitor:
+    """Cached result of `check()`, refreshed every `interval` seconds."""
+
+    def __init__(self, check, interval: float = 60.0, name: str = "health"):
+        self.check = check
+        self.interval = interval
+        self.name = name
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._result = None
+        self._checked_at = None       # time.time() of the last completed check
+        self._checked_mono = None
+        self._duration = None
+        self._thread = None
+        self._pid = None
+
+    def start(self):
+        """Start the refresher thread for this process (idempotent, fork-aware)."""
+        pid = os.getpid()
+        if self._pid == pid and self._thread is not None and self._thread.is_alive():
+            return
+        if self._pid is not None and self._pid != pid:
+            # The parent's refresher may have held the lock at fork time.
+            self._lock = threading.Lock()
+        with self._lock:
+            if self._pid == pid and self._thread is not None and self._thread.is_alive():
+                return
+            # A forked worker inherits the snapshot but not the thread.
+            self._wake = threading.Event()
+            self._thread = threading.Thread(target=self._run, name=f"{self.name}-refresher", daemon=True)
+            self._pid = pid
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            age = self.age()
+            # A snapshot inherited across fork, or taken at startup, is reused until due.
+            if age is None or age >= self.interval or self._wake.is_set():
+                self._wake.clear()
+                self.refresh()
+                age = 0.0
+            self._wake.wait(self.interval - age)
+
+    def refresh(self) -> dict:
+        """Run the check now, store and return its result."""
+        started = time.monotonic()
+        try:
+            result = self.check()
+        except Exception as e:
+            result = {"error": f"{self.name} check failed: {e}"}
+        with self._lock:
+            self._result = result
+            self._checked_at = time.time()
+            self._checked_mono = time.monotonic()
+            self._duration = self._checked_mono - started
+        return self.snapshot(start=False)
+
+    def request_refresh(self):
+        """Ask the refresher thread to check again without waiting for it."""
+        self.start()
+        self._wake.set()
+
+    def age(self):
+        """Seconds since the last completed check, or None if there has been none."""
+        checked = self._checked_mono
+        return None if checked is None else time.monotonic() - checked
+
+    def is_stale(self) -> bool:
+        # Missing two refreshes in a row means the refresher is stuck or frozen.
+        age = self.age()
+        return age is None or age > 2 * self.interval + 5
+
+    def snapshot(self, start: bool = True) -> dict:
+        """The last result plus `checked_at`, `age_seconds` and `stale`. Never blocks on `check()`."""
+        if start:
+            self.start()
+        with self._lock:
+            result, checked_at, duration = self._result, self._checked_at, self._duration
+        if result is None:
+            return {"error": f"{self.name} not checked yet.", "checked_at": None, "age_seconds": None,
+                    "stale": True}
+        age = self.age()
+        snapshot = dict(result)
+        snapshot.update({
+            "checked_at": datetime.utcfromtimestamp(checked_at).isoformat(),
+            "age_seconds": round(age, 3),
+            "check_duration_ms": round(duration * 1000, 1),
+            "stale": self.is_stale(),
+        })
+        return snapshot
@@ -0,0 +1,348 @@
+"""
+DREAMLENS AI - History Store
+Write-behind storage for interpretation history in SQLite. Requests enqueue
+rows and return; a background writer drains the queue and inserts rows in
+grouped transactions over one persistent WAL-mode connection per process,
+so the request path never opens a database, migrates a schema or waits on
+a commit.
+
+Reads page through history by rowid (keyset pagination) and search an FTS5
+index over dream and response text that triggers keep in sync with the
+table. Rowids double as page cursors and FTS keys, so the history table
+must not be VACUUMed (it has no INTEGER PRIMARY KEY to pin them).
+"""
+
+import atexit
+import html
+import os
+import queue
+import re
+import sqlite3
+import threading
+from datetime import datetime
+
+SCHEMA_VERSION = 2
+
+FTS_SCHEMA = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS history_fts USING fts5("
+    "dream, response, content='history', content_rowid='rowid', tokenize='porter unicode61')",
+    """CREATE TRIGGER IF NOT EXISTS history_fts_insert AFTER INSERT ON history BEGIN
+        INSERT INTO history_fts(rowid, dream, response) VALUES (new.rowid, new.dream, new.response);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS history_fts_delete AFTER DELETE ON history BEGIN
+        INSERT INTO history_fts(history_fts, rowid, dream, response)
+        VALUES ('delete', old.rowid, old.dream, old.response);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS history_fts_update AFTER UPDATE OF dream, response ON history BEGIN
+        INSERT INTO history_fts(history_fts, rowid, dream, response)
+        VALUES ('delete', old.rowid, old.dream, old.response);
+        INSERT INTO history_fts(rowid, dream, response) VALUES (new.rowid, new.dream, new.response);
+    END""",
+)
+
+# Dreams weigh twice as much as interpretations when ranking search results.
+BM25_WEIGHTS = (2.0, 1.0)
+# Broad queries rank only the newest matches, so a word found in half the
+# table costs the same as a rare one.
+SEARCH_RANK_WINDOW = 5000
+_WORD_RE = re.compile(r"\w+")
+_MARK_OPEN, _MARK_CLOSE = "\x02", "\x03"
+
+
+def connect(path: str) -> sqlite3.Connection:
+    """A connection configured for concurrent workers: WAL, NORMAL sync, busy timeout."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=10)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def migrate(conn: sqlite3.Connection):
+    """Bring the database up to SCHEMA_VERSION (tracked in PRAGMA user_version).
+
+    Version 1 is the history table with its method column; version 2 adds the
+    FTS5 index and backfills it from existing rows. Workers starting together
+    serialize on the write lock and re-check the version inside it.
+    """
+    if conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+        return
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version < 1:
+            conn.execute("CREATE TABLE IF NOT EXISTS history (ts TEXT, dream TEXT, response TEXT, method TEXT)")
+            if "method" not in {row[1] for row in conn.execute("PRAGMA table_info(history)")}:
+                conn.execute("ALTER TABLE history ADD COLUMN method TEXT")
+            version = 1
+        if version < 2:
+            try:
+                for statement in FTS_SCHEMA:
+                    conn.execute(statement)
+                conn.execute("INSERT INTO history_fts(history_fts) VALUES ('rebuild')")
+                version = 2
+            except sqlite3.OperationalError as e:
+                # SQLite built without FTS5: history still works, search falls back to LIKE.
+                print("History search index unavailable:", e)
+        conn.execute(f"PRAGMA user_version = {version}")
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+
+def has_fts(conn: sqlite3.Connection) -> bool:
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'history_fts'").fetchone() is not None
+
+
+def fts_query(text: str) -> str:
+    """User text as an FTS5 query: every word must match, each quoted so no syntax leaks through."""
+    return " ".join(f'"{word}"' for word in _WORD_RE.findall(text))
+
+
+def highlight(snippet: str) -> str:
+    """HTML-escape a snippet and turn the match markers into <mark> tags."""
+    return html.escape(snippet).replace(_MARK_OPEN, "<mark>").replace(_MARK_CLOSE, "</mark>")
+
+
+def _like_snippet(text: str, words: list, width: int = 160) -> str:
+    lowered = (text or "").lower()
+    start = min((i for i in (lowered.find(w.lower()) for w in words) if i >= 0), default=0)
+    start = max(0, start - width // 4)
+    piece = (text or "")[start:start + width]
+    for word in words:
+        piece = re.sub(f"({re.escape(word)})", _MARK_OPEN + r"\1" + _MARK_CLOSE, piece, flags=re.IGNORECASE)
+    return ("…" if start else "") + piece + ("…" if start + width < len(text or "") else "")
+
+
+class _Flush:
+    __slots__ = ("event",)
+
+    def __init__(self):
+        self.event = threading.Event()
+
+
+class HistoryStore:
+    """Batched, asynchronous inserts into the history table."""
+
+    def __init__(self, path: str, batch_size: int = 500, max_queue: int = 10000, put_timeout: float = 1.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.max_queue = max_queue
+        self.put_timeout = put_timeout
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+        self._thread = None
+        self._local = threading.local()
+        self._migrated_pid = None
+        self._fts = None
+        self._stats = {"enqueued": 0, "written": 0, "batches": 0, "largest_batch": 0, "dropped": 0, "errors": 0}
+        atexit.register(self.close)
+
+    # ----- lifecycle -----
+
+    def _ensure_started(self):
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._lock:
+            if self._pid == pid:
+                return
+            # First use in this process (or a forked worker): the parent's
+            # queue, thread and connection do not carry over.
+            self._queue = queue.Queue(maxsize=self.max_queue)
+            self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+            self._pid = pid
+            self._thread.start()
+
+    def connection(self) -> sqlite3.Connection:
+        """The calling thread's connection; the schema is migrated once per process."""
+        pid = os.getpid()
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != pid:
+            conn = connect(self.path)
+            with self._lock:
+                if self._migrated_pid != pid:
+                    migrate(conn)
+                    self._fts = has_fts(conn)
+                    self._migrated_pid = pid
+            self._local.conn = conn
+            self._local.pid = pid
+        return conn
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Wait until every row enqueued before this call is committed."""
+        if self._pid != os.getpid():
+            return True
+        marker = _Flush()
+        try:
+            self._queue.put(marker, timeout=timeout)
+        except queue.Full:
+            return False
+        return marker.event.wait(timeout)
+
+    def close(self, timeout: float = 5.0):
+        """Flush pending rows and stop the writer; later adds restart it."""
+        if self._pid != os.getpid() or self._thread is None:
+            return
+        # The writer commits everything queued ahead of the stop marker before exiting.
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+        with self._lock:
+            self._pid = None
+            self._thread = None
+
+    # ----- writes -----
+
+    def add(self, dream: str, response: str, method: str = None, ts: str = None) -> bool:
+        """Enqueue one row; returns False if the queue stayed full past `put_timeout`."""
+        self._ensure_started()
+        row = (ts or datetime.utcnow().isoformat(), dream, response, method)
+        try:
+            self._queue.put(row, timeout=self.put_timeout)
+        except queue.Full:
+            self._count("dropped")
+            return False
+        self._count("enqueued")
+        return True
+
+    def add_many(self, rows, ts: str = None) -> bool:
+        """Enqueue (dream, response, method) rows as one item, committed together."""
+        self._ensure_started()
+        ts = ts or datetime.utcnow().isoformat()
+        batch = [(ts, dream, response, method) for dream, response, method in rows]
+        try:
+            self._queue.put(batch, timeout=self.put_timeout)
+        except queue.Full:
+            with self._lock:
+                self._stats["dropped"] += len(batch)
+            return False
+        with self._lock:
+            self._stats["enqueued"] += len(batch)
+        return True
+
+    def _run(self):
+        q = self._queue
+        while True:
+            item = q.get()
+            batch, markers, stop = [], [], False
+            while True:
+                if item is None:
+                    stop = True
+                elif isinstance(item, _Flush):
+                    markers.append(item)
+                elif isinstance(item, list):
+                    batch.extend(item)
+                else:
+                    batch.append(item)
+                if stop or len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = q.get_nowait()
+                except queue.Empty:
+                    break
+            if batch:
+                self._write(batch)
+            for marker in markers:
+                marker.event.set()
+            if stop:
+                conn = getattr(self._local, "conn", None)
+                if conn is not None:
+                    conn.close()
+                return
+
+    def _write(self, batch: list):
+        try:
+            conn = self.connection()
+            with conn:
+                conn.executemany("INSERT INTO history (ts,dream,response,method) VALUES (?,?,?,?)", batch)
+        except sqlite3.Error as e:
+            self._count("errors")
+            print("Failed to save history:", e)
+            return
+        with self._lock:
+            self._stats["written"] += len(batch)
+            self._stats["batches"] += 1
+            self._stats["largest_batch"] = max(self._stats["largest_batch"], len(batch))
+
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    # ----- reads -----
+
+    def page(self, before: int = None, limit: int = 25) -> dict:
+        """Rows older than the `before` cursor, newest first.
+
+        Seeks on rowid, so page 10,000 costs the same as page 1. Returns
+        `items` and `next_before`, the cursor for the following page (None
+        on the last page). Only committed rows are read: a reader never
+        waits on the writer, so a row enqueued a moment ago may show up on
+        the next request instead.
+        """
+        if before is None:
+            rows = self.connection().execute(
+                "SELECT rowid, ts, dream, response, method FROM history ORDER BY rowid DESC LIMIT ?",
+                (limit,)).fetchall()
+        else:
+            rows = self.connection().execute(
+                "SELECT rowid, ts, dream, response, method FROM history WHERE rowid < ? "
+                "ORDER BY rowid DESC LIMIT ?", (before, limit)).fetchall()
+        items = [{"id": r[0], "ts": r[1], "dream": r[2], "response": r[3], "method": r[4]} for r in rows]
+        return {"items": items, "next_before": items[-1]["id"] if len(items) == limit else None}
+
+    def search(self, text: str, limit: int = 20, offset: int = 0) -> dict:
+        """Rows matching every word of `text`, best BM25 rank first.
+
+        Ranking is limited to the newest SEARCH_RANK_WINDOW matches, and
+        like page() only committed rows are searched.
+
+        Each item carries `dream_snippet` and `response_snippet`: escaped
+        HTML excerpts with the matched words wrapped in <mark>.
+        """
+        words = _WORD_RE.findall(text)
+        if not words:
+            return {"items": [], "next_offset": None}
+        conn = self.connection()
+        if self._fts:
+            match = fts_query(text)
+            floor = conn.execute(
+                "SELECT rowid FROM history_fts WHERE history_fts MATCH ? ORDER BY rowid DESC LIMIT 1 OFFSET ?",
+                (match, SEARCH_RANK_WINDOW - 1)).fetchone()
+            rows = conn.execute(
+                "SELECT h.rowid, h.ts, h.method, "
+                "snippet(history_fts, 0, ?, ?, '…', 16), snippet(history_fts, 1, ?, ?, '…', 32), "
+                f"bm25(history_fts, {BM25_WEIGHTS[0]}, {BM25_WEIGHTS[1]}) AS score "
+                "FROM history_fts JOIN history h ON h.rowid = history_fts.rowid "
+                "WHERE history_fts MATCH ? AND history_fts.rowid >= ? ORDER BY score LIMIT ? OFFSET ?",
+                (_MARK_OPEN, _MARK_CLOSE, _MARK_OPEN, _MARK_CLOSE, match, floor[0] if floor else 0,
+                 limit, offset),
+            ).fetchall()
+        else:
+            clauses = " AND ".join("(dream LIKE ? OR response LIKE ?)" for _ in words)
+            params = [p for w in words for p in (f"%{w}%", f"%{w}%")]
+            rows = [
+                (r[0], r[1], r[2], _like_snippet(r[3], words), _like_snippet(r[4], words), None)
+                for r in conn.execute(
+                    f"SELECT rowid, ts, method, dream, response FROM history WHERE {clauses} "
+                    "ORDER BY rowid DESC LIMIT ? OFFSET ?", params + [limit, offset])
+            ]
+        items = [
+            {"id": r[0], "ts": r[1], "method": r[2], "dream_snippet": highlight(r[3] or ""),
+             "response_snippet": highlight(r[4] or ""), "score": None if r[5] is None else round(-r[5], 4)}
+            for r in rows
+        ]
+        return {"items": items, "next_offset": offset + limit if len(items) == limit else None}
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["queued"] = self._queue.qsize() if self._queue is not None and self._pid == os.getpid() else 0
+        return stats
@@ -0,0 +1,208 @@
+"""
+DREAMLENS AI - Interpretation Cache
+SQLite-backed response cache shared by every worker on the host, so popular
+dreams ("I was falling", "teeth falling out") skip the Groq round trip.
+
+Entries are keyed on the normalized dream text, model, prompt version and
+database context, expire after a TTL, and the table is trimmed to a maximum
+size by least-recent access.
+
+A lookup is a plain read. Hit and miss counters and access times are kept
+in memory and written in one transaction every `flush_interval` seconds
+(and before every put or stats read), so cache hits in different workers
+never queue on SQLite's write lock.
+"""
+
+import atexit
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+
+_WORD_RE = re.compile(r"[\w']+")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS interpretation_cache (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    interpretation TEXT NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS interpretation_cache_accessed ON interpretation_cache (accessed);
+CREATE TABLE IF NOT EXISTS interpretation_cache_stats (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+def normalize_dream(text: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace."""
+    return " ".join(_WORD_RE.findall(text.lower()))
+
+
+def make_key(dream_text: str, model: str, prompt_version: str, db_context: str = "") -> str:
+    material = "\x1f".join([normalize_dream(dream_text), model, prompt_version, db_context])
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class InterpretationCache:
+    """Cross-process cache of successful interpretations."""
+
+    def __init__(self, path: str, ttl: float = 7 * 86400, max_entries: int = 5000, flush_interval: float = 5.0):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.flush_interval = flush_interval
+        self._local = threading.local()
+        self._schema_ready = False
+        self._schema_lock = threading.Lock()
+        self._pending_lock = threading.Lock()
+        self._pending_pid = os.getpid()
+        self._counts = {}  # counter name -> increments not yet written
+        self._accessed = {}  # key -> [last access, hits] not yet written
+        self._flushed = time.monotonic()
+        atexit.register(self.flush)
+
+    def _conn(self) -> sqlite3.Connection:
+        # One connection per thread and process; sqlite connections can't cross a fork.
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with self._schema_lock:
+                if not self._schema_ready:
+                    conn.executescript(SCHEMA)
+                    self._schema_ready = True
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _drop_if_forked(self):
+        # A forked worker starts empty: what it inherited is the parent's to write.
+        if self._pending_pid != os.getpid():
+            self._counts, self._accessed, self._pending_pid = {}, {}, os.getpid()
+
+    def _record(self, key: str, now: float, *names):
+        """Count `names` (and a hit's access time) for the next flush; flushes if one is due."""
+        with self._pending_lock:
+            self._drop_if_forked()
+            for name in names:
+                self._counts[name] = self._counts.get(name, 0) + 1
+            if names == ("hits",):
+                seen = self._accessed.setdefault(key, [now, 0])
+                seen[0] = max(seen[0], now)
+                seen[1] += 1
+            due = time.monotonic() - self._flushed >= self.flush_interval
+        if due:
+            self.flush()
+
+    def _write_pending(self, conn):
+        """Write the pending counters and access times in the caller's transaction."""
+        with self._pending_lock:
+            self._drop_if_forked()
+            counts, accessed = self._counts, self._accessed
+            self._counts, self._accessed = {}, {}
+            self._flushed = time.monotonic()
+        if accessed:
+            conn.executemany(
+                "UPDATE interpretation_cache SET accessed = MAX(accessed, ?), hits = hits + ? WHERE key = ?",
+                [(at, hits, key) for key, (at, hits) in accessed.items()],
+            )
+        if counts:
+            conn.executemany(
+                "INSERT INTO interpretation_cache_stats (name, value) VALUES (?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                list(counts.items()),
+            )
+
+    def flush(self):
+        """Write the counters and access times recorded since the last flush."""
+        with self._pending_lock:
+            if not self._counts and not self._accessed:
+                self._flushed = time.monotonic()
+                return
+        try:
+            conn = self._conn()
+            with conn:
+                self._write_pending(conn)
+                conn.execute("DELETE FROM interpretation_cache WHERE created < ?", (time.time() - self.ttl,))
+        except sqlite3.Error as e:
+            print("Interpretation cache stats not saved:", e)
+
+    def get(self, key: str):
+        """Return the cached interpretation dict or None; counts a hit or miss."""
+        now = time.time()
+        row = self._conn().execute(
+            "SELECT model, interpretation, created FROM interpretation_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row and now - row[2] > self.ttl:
+            # Expired rows are deleted by the next flush or put.
+            self._record(key, now, "expired", "misses")
+            return None
+        if row is None:
+            self._record(key, now, "misses")
+            return None
+        self._record(key, now, "hits")
+        return {"model": row[0], "interpretation": row[1], "age": now - row[2]}
+
+    def put(self, key: str, model: str, interpretation: str):
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            # Pending access times first, so eviction below sees recent hits.
+            self._write_pending(conn)
+            conn.execute(
+                "INSERT OR REPLACE INTO interpretation_cache (key, model, interpretation, created, accessed, hits) "
+                "VALUES (?, ?, ?, ?, ?, 0)",
+                (key, model, interpretation, now, now),
+            )
+            conn.execute("DELETE FROM interpretation_cache WHERE created < ?", (now - self.ttl,))
+            # Keep the most recently accessed `max_entries` rows.
+            evicted = conn.execute(
+                "DELETE FROM interpretation_cache WHERE key IN ("
+                "SELECT key FROM interpretation_cache ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            ).rowcount
+            if evicted > 0:
+                conn.execute(
+                    "INSERT INTO interpretation_cache_stats (name, value) VALUES ('evictions', ?) "
+                    "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                    (evicted,),
+                )
+
+    def stats(self) -> dict:
+        """Counters over every worker, as of their last flush (this worker's is flushed first)."""
+        self.flush()
+        conn = self._conn()
+        counters = dict(conn.execute("SELECT name, value FROM interpretation_cache_stats").fetchall())
+        entries = conn.execute("SELECT COUNT(*) FROM interpretation_cache").fetchone()[0]
+        hits = counters.get("hits", 0)
+        misses = counters.get("misses", 0)
+        return {
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": hits,
+            "misses": misses,
+            "expired": counters.get("expired", 0),
+            "evictions": counters.get("evictions", 0),
+            "hit_rate": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+        }
+
+    def clear(self):
+        with self._pending_lock:
+            self._counts, self._accessed = {}, {}
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM interpretation_cache")
+            conn.execute("DELETE FROM interpretation_cache_stats")
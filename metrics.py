@@ -0,0 +1,508 @@
+"""
+DREAMLENS AI - Metrics
+In-process latency histograms, counters and gauges, exported in Prometheus
+text format on /metrics.
+
+Each worker keeps its own registry and, once configured with a directory,
+snapshots it to metrics-<pid>-<token>.json about once a second (the token
+keeps a reused pid from overwriting an older worker's file). /metrics
+merges every worker's snapshot, so any worker answers for the whole server.
+A snapshot that stops updating belongs to a worker that exited, however it
+exited and whichever server ran it; the next sweep folds it into
+metrics-archive.json without its gauges, so counters never go backwards
+and gauges are summed across live workers only (e.g. how many workers have
+their breaker open).
+"""
+
+import atexit
+import bisect
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Latency buckets from 10 us to ~2 min, four per doubling (each ~19% wider than the last).
+BUCKETS = tuple(float(f"{0.00001 * 2 ** (i / 4):.3g}") for i in range(95))
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+HELP = {
+    "dreamlens_stage_seconds": ("histogram", "Time spent in each stage of /interpret."),
+    "dreamlens_groq_request_seconds": ("histogram", "Duration of Groq chat completion calls."),
+    "dreamlens_interpretations_total": ("counter", "Interpretations served, by meta.method."),
+    "dreamlens_groq_requests_total": ("counter", "Groq chat completion calls, by outcome."),
+    "dreamlens_groq_tokens_total": ("counter", "Tokens reported by Groq usage, by kind."),
+    "dreamlens_groq_retries_total": ("counter", "Groq calls retried after a transient failure."),
+    "dreamlens_groq_breaker_transitions_total": ("counter", "Groq circuit breaker state changes, by new state."),
+    "dreamlens_groq_breaker_open": ("gauge", "Workers whose Groq circuit breaker is open or half-open."),
+    "dreamlens_groq_routes_total": ("counter", "Groq requests by routed model tier and the reason for it."),
+    "dreamlens_groq_tier_seconds": ("histogram", "Duration of Groq calls, by model tier."),
+    "dreamlens_groq_tier_tokens_total": ("counter", "Tokens reported by Groq usage, by model tier and kind."),
+    "dreamlens_prompt_snippets_total": ("counter", "Dataset snippets in Groq prompts, by outcome."),
+    "dreamlens_prompt_tokens_estimated_total": ("counter", "Estimated prompt tokens of Groq calls with usage."),
+    "dreamlens_rate_limited_total": ("counter", "Requests refused with 429 by the per-client rate limit, by route."),
+}
+
+ARCHIVE = "metrics-archive.json"
+# A live worker rewrites or touches its snapshot every flush interval; one older than this is an exited worker's.
+STALE_AFTER = 30.0
+
+
+def _labels(labels: dict) -> tuple:
+    items = tuple(labels.items())
+    return tuple(sorted(items)) if len(items) > 1 else items
+
+
+class _Span:
+    """Times a `with` block into one histogram series."""
+
+    __slots__ = ("registry", "key", "started")
+
+    def __init__(self, registry, key):
+        self.registry = registry
+        self.key = key
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.registry._observe(self.key, time.perf_counter() - self.started)
+        return False
+
+
+class Timer:
+    """Stage timings for one request, handed to the registry by finish().
+
+    `with timer.stage("name"):` only reads the clock, and finish() only
+    appends to a queue; the histograms are updated off the request path.
+    """
+
+    __slots__ = ("registry", "started", "wall", "stages", "_name", "_entered")
+
+    def __init__(self, registry):
+        self.registry = registry
+        self.started = time.perf_counter()
+        self.wall = time.time()
+        self.stages = []    # (stage, seconds after start, duration in seconds)
+
+    def stage(self, name: str) -> "Timer":
+        self._name = name
+        return self
+
+    def __enter__(self):
+        self._entered = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.stages.append((self._name, self._entered - self.started, time.perf_counter() - self._entered))
+        return False
+
+    def finish(self, method: str, total: bool = True):
+        """Record the stages, the whole request (unless total=False) and one served `method`."""
+        if total:
+            self.stages.append(("total", 0.0, time.perf_counter() - self.started))
+        self.registry._finished(self.stages, method)
+
+
+STAGE_HISTOGRAM = "dreamlens_stage_seconds"
+# Without a flusher thread (no directory), finished requests are folded in once this many queue up.
+DRAIN_BACKLOG = 1024
+
+
+class Registry:
+    """Histograms and counters for one process, optionally shared through a directory."""
+
+    def __init__(self, directory: str = None, flush_interval: float = 1.0, stale_after: float = STALE_AFTER):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.stale_after = stale_after
+        self._after_fork()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    # ----- recording -----
+
+    def _after_fork(self):
+        # A forked worker starts from zero; the parent still reports its own numbers.
+        self._lock = threading.Lock()
+        self._histograms = {}   # (name, labels) -> [bucket counts..., +Inf count, sum of seconds]
+        self._stages = {}       # stage -> its dreamlens_stage_seconds series, for Timer.finish()
+        self._counters = {}     # (name, labels) -> value
+        self._gauges = {}       # (name, labels) -> value, this process only
+        self._finished_requests = deque()  # (stages, method) from Timer.finish(), not yet counted
+        self._flusher = None
+        self._dirty = False
+        self._token = uuid.uuid4().hex[:8]
+        self._written = None    # the snapshot last written to this process's file
+
+    def _series(self, key: tuple) -> list:
+        series = self._histograms.get(key)
+        if series is None:
+            series = self._histograms[key] = [0] * (len(BUCKETS) + 1) + [0.0]
+        return series
+
+    def _observe(self, key: tuple, seconds: float):
+        index = bisect.bisect_left(BUCKETS, seconds)
+        with self._lock:
+            series = self._series(key)
+            series[index] += 1
+            series[-1] += seconds
+            self._dirty = True
+        if self._flusher is None and self.directory:
+            self._start_flusher()
+
+    def _finished(self, stages: list, method: str):
+        # deque.append is atomic, so the request path takes no lock.
+        self._finished_requests.append((stages, method))
+        if self._flusher is None and self.directory:
+            self._start_flusher()
+        elif len(self._finished_requests) >= DRAIN_BACKLOG:
+            self._drain()
+
+    def _drain(self):
+        """Fold finished requests into the stage histograms and method counters."""
+        finished = self._finished_requests
+        stage_series = self._stages
+        with self._lock:
+            while finished:
+                stages, method = finished.popleft()
+                for name, _, seconds in stages:
+                    series = stage_series.get(name)
+                    if series is None:
+                        series = stage_series[name] = self._series((STAGE_HISTOGRAM, (("stage", name),)))
+                    series[bisect.bisect_left(BUCKETS, seconds)] += 1
+                    series[-1] += seconds
+                key = ("dreamlens_interpretations_total", (("method", method),))
+                self._counters[key] = self._counters.get(key, 0) + 1
+                self._dirty = True
+
+    def observe(self, name: str, seconds: float, **labels):
+        self._observe((name, _labels(labels)), seconds)
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+            self._dirty = True
+        if self._flusher is None and self.directory:
+            self._start_flusher()
+
+    def set(self, name: str, value: float, **labels):
+        """Set a gauge; /metrics shows the sum over live workers."""
+        with self._lock:
+            self._gauges[(name, _labels(labels))] = value
+            self._dirty = True
+        if self._flusher is None and self.directory:
+            self._start_flusher()
+
+    def timer(self) -> Timer:
+        """A Timer for one /interpret request."""
+        return Timer(self)
+
+    def span(self, name: str = STAGE_HISTOGRAM, **labels) -> _Span:
+        """Time a `with` block into histogram `name` (default: the per-stage histogram)."""
+        return _Span(self, (name, _labels(labels)))
+
+    # ----- sharing across workers -----
+
+    def _start_flusher(self):
+        with self._lock:
+            if self._flusher is not None:
+                return
+            self._flusher = threading.Thread(target=self._flush_loop, name="metrics-flusher", daemon=True)
+            self._flusher.start()
+
+    def _flush_loop(self):
+        me = threading.current_thread()
+        while self._flusher is me:
+            time.sleep(self.flush_interval)
+            if self._flusher is me:
+                self.flush()
+                self.sweep()
+
+    def snapshot(self) -> dict:
+        self._drain()
+        with self._lock:
+            return {
+                "histograms": [[n, [list(p) for p in l], c[:-1], c[-1]]
+                               for (n, l), c in self._histograms.items()],
+                "counters": [[n, [list(p) for p in l], v] for (n, l), v in self._counters.items()],
+                "gauges": [[n, [list(p) for p in l], v] for (n, l), v in self._gauges.items()],
+            }
+
+    def _path(self) -> str:
+        return os.path.join(self.directory, f"metrics-{os.getpid()}-{self._token}.json")
+
+    def flush(self):
+        """Write this process's snapshot for the other workers' /metrics, or touch it if nothing changed."""
+        self._drain()
+        if not self.directory or not (self._dirty or self._written):
+            return
+        path = self._path()
+        try:
+            with self._dir_lock():
+                if self._written and not os.path.exists(path):
+                    # A sweep took this process for dead (it stalled past stale_after) and archived
+                    # what it had written; keep only what came after so nothing is counted twice.
+                    self._forget(self._written)
+                    self._written = None
+                if not self._dirty:
+                    if self._written:
+                        os.utime(path)
+                    return
+                self._dirty = False
+                data = self.snapshot()
+                with open(path + ".tmp", "w", encoding="utf-8") as f:
+                    json.dump(data, f)
+                os.replace(path + ".tmp", path)
+                self._written = data
+        except OSError as e:
+            print("Metrics flush failed:", e)
+
+    def _forget(self, archived: dict):
+        """Subtract a snapshot of this process that is in the archive now. Gauges stay: it never holds them."""
+        with self._lock:
+            for name, labels, counts, total in archived["histograms"]:
+                series = self._histograms.get((name, tuple(tuple(p) for p in labels)))
+                if series is not None:
+                    for i, c in enumerate(counts):
+                        series[i] -= c
+                    series[-1] -= total
+            for name, labels, value in archived["counters"]:
+                key = (name, tuple(tuple(p) for p in labels))
+                self._counters[key] = self._counters.get(key, 0) - value
+            self._dirty = True
+
+    def _retire(self, path: str):
+        """Fold one snapshot into the archive and remove it. Call with the directory lock held."""
+        dead = _read(path)
+        if dead is not None:
+            # A dead worker's gauges describe nothing any more.
+            dead.pop("gauges", None)
+            archive_path = os.path.join(self.directory, ARCHIVE)
+            merged = merge([_read(archive_path) or {}, dead])
+            with open(archive_path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(merged, f)
+            os.replace(archive_path + ".tmp", archive_path)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _sweep(self) -> int:
+        """Retire snapshots older than stale_after; the number of other live workers. Lock held."""
+        now = time.time()
+        own = os.path.abspath(self._path())
+        live = 0
+        for path in glob.glob(os.path.join(self.directory, "metrics-*.json")):
+            if os.path.basename(path) == ARCHIVE or os.path.abspath(path) == own:
+                continue
+            try:
+                age = now - os.path.getmtime(path)
+            except OSError:
+                continue
+            if age > self.stale_after:
+                self._retire(path)
+            else:
+                live += 1
+        return live
+
+    def sweep(self):
+        """Fold the snapshots of exited workers into the archive."""
+        if not self.directory:
+            return
+        try:
+            with self._dir_lock():
+                self._sweep()
+        except OSError as e:
+            print("Metrics sweep failed:", e)
+
+    def start(self):
+        """Join the shared directory as a live worker; call once as each worker boots.
+
+        Exited workers' snapshots are archived. If no other worker is live,
+        this is a new server, and the previous run's archive is dropped so
+        the counts start from zero.
+        """
+        if not self.directory:
+            return
+        try:
+            with self._dir_lock():
+                if not self._sweep():
+                    try:
+                        os.remove(os.path.join(self.directory, ARCHIVE))
+                    except FileNotFoundError:
+                        pass
+        except OSError as e:
+            print("Metrics start failed:", e)
+        with self._lock:
+            self._dirty = True
+        self.flush()
+        self._start_flusher()
+
+    def close(self):
+        """Write the final snapshot and archive it at once, so the gauges leave /metrics now."""
+        if not self.directory:
+            return
+        self._flusher = None
+        self.flush()
+        try:
+            if self._written:
+                with self._dir_lock():
+                    if os.path.exists(self._path()):
+                        self._retire(self._path())
+        except OSError as e:
+            print("Metrics close failed:", e)
+        # Anything recorded after this stays in-process.
+        self.directory = None
+
+    @contextmanager
+    def _dir_lock(self):
+        os.makedirs(self.directory, exist_ok=True)
+        if fcntl is None:
+            yield
+            return
+        fd = os.open(os.path.join(self.directory, ".lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    def collect(self) -> dict:
+        """This process's live numbers merged with every other worker's snapshot."""
+        snapshots = [self.snapshot()]
+        if self.directory:
+            own = os.path.abspath(self._path())
+            for path in glob.glob(os.path.join(self.directory, "metrics-*.json")):
+                if os.path.abspath(path) != own:
+                    snapshots.append(_read(path) or {})
+        return merge(snapshots)
+
+    def render(self) -> str:
+        return render(self.collect())
+
+
+def _read(path: str):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def merge(snapshots) -> dict:
+    histograms, sums, counters, gauges = {}, {}, {}, {}
+    for snap in snapshots:
+        for name, labels, counts, total in snap.get("histograms", []):
+            key = (name, tuple(tuple(pair) for pair in labels))
+            merged = histograms.setdefault(key, [0] * len(counts))
+            for i, c in enumerate(counts):
+                merged[i] += c
+            sums[key] = sums.get(key, 0.0) + total
+        for name, labels, value in snap.get("counters", []):
+            key = (name, tuple(tuple(pair) for pair in labels))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, value in snap.get("gauges", []):
+            key = (name, tuple(tuple(pair) for pair in labels))
+            gauges[key] = gauges.get(key, 0) + value
+    return {
+        "histograms": [[n, [list(p) for p in l], c, sums[(n, l)]] for (n, l), c in histograms.items()],
+        "counters": [[n, [list(p) for p in l], v] for (n, l), v in counters.items()],
+        "gauges": [[n, [list(p) for p in l], v] for (n, l), v in gauges.items()],
+    }
+
+
+def quantile(counts, q: float) -> float:
+    """Estimate the q-quantile from bucket counts, interpolating inside the bucket."""
+    total = sum(counts)
+    if not total:
+        return 0.0
+    rank = q * total
+    seen = 0
+    for i, c in enumerate(counts):
+        if c and seen + c >= rank:
+            lower = BUCKETS[i - 1] if i > 0 else 0.0
+            upper = BUCKETS[i] if i < len(BUCKETS) else BUCKETS[-1]
+            return lower + (upper - lower) * (rank - seen) / c
+        seen += c
+    return BUCKETS[-1]
+
+
+def _fmt_labels(labels, extra=()) -> str:
+    pairs = [*labels, *extra]
+    if not pairs:
+        return ""
+    body = ",".join(f'{k}="{str(v)}"'.replace("\n", " ") for k, v in pairs)
+    return "{" + body + "}"
+
+
+def _fmt_value(value) -> str:
+    # Whole numbers print exactly at any size; `:g` would round 1234567 to 1.23457e+06.
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def render(snapshot: dict) -> str:
+    """Prometheus text exposition of a (merged) snapshot."""
+    lines = []
+    by_name = {}
+    for name, labels, counts, total in snapshot["histograms"]:
+        by_name.setdefault(name, []).append((labels, counts, total))
+    for name in sorted(by_name):
+        kind, text = HELP.get(name, ("histogram", name))
+        lines += [f"# HELP {name} {text}", f"# TYPE {name} histogram"]
+        for labels, counts, total in sorted(by_name[name]):
+            cumulative = 0
+            for bound, c in zip(BUCKETS, counts):
+                cumulative += c
+                lines.append(f"{name}_bucket{_fmt_labels(labels, [('le', repr(bound))])} {cumulative}")
+            cumulative += counts[-1]
+            lines.append(f"{name}_bucket{_fmt_labels(labels, [('le', '+Inf')])} {cumulative}")
+            lines.append(f"{name}_sum{_fmt_labels(labels)} {total:.6f}")
+            lines.append(f"{name}_count{_fmt_labels(labels)} {cumulative}")
+        gauge = name.replace("_seconds", "_quantile_seconds")
+        lines += [f"# HELP {gauge} Estimated p50/p95/p99 of {name}.", f"# TYPE {gauge} gauge"]
+        for labels, counts, _ in sorted(by_name[name]):
+            for q in QUANTILES:
+                lines.append(f"{gauge}{_fmt_labels(labels, [('quantile', str(q))])} {quantile(counts, q):.6f}")
+
+    for section, kind in (("counters", "counter"), ("gauges", "gauge")):
+        series = {}
+        for name, labels, value in snapshot.get(section, []):
+            series.setdefault(name, []).append((labels, value))
+        for name in sorted(series):
+            text = HELP.get(name, (kind, name))[1]
+            lines += [f"# HELP {name} {text}", f"# TYPE {name} {kind}"]
+            for labels, value in sorted(series[name]):
+                lines.append(f"{name}{_fmt_labels(labels)} {_fmt_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry(os.environ.get("METRICS_DIR") or None)
+atexit.register(lambda: REGISTRY.close())
+
+
+def configure(directory: str):
+    """Share metrics across workers through `directory` (unless METRICS_DIR overrides it)."""
+    if not os.environ.get("METRICS_DIR"):
+        REGISTRY.directory = directory
+
+
+span = REGISTRY.span
+observe = REGISTRY.observe
+inc = REGISTRY.inc
+set_gauge = REGISTRY.set
+timer = REGISTRY.timer
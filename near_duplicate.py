@@ -0,0 +1,282 @@
+"""
+DREAMLENS AI - Near-Duplicate Dreams
+MinHash LSH index over past dreams in history.db. Dreams that differ only in
+wording ("I was chased by a snake" / "a snake was chasing me") reduce to the
+same content-word set and can reuse the stored interpretation instead of a
+new Groq call.
+
+The index holds only each row's rowid and its LSH band keys (about 136
+bytes a row), in sorted arrays searched with binary search. A lookup's
+candidates are read back from history.db by rowid and verified with exact
+Jaccard over their content words. New history rows are indexed on a
+background thread, so a lookup never waits on the history table.
+"""
+
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+
+import numpy as np
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+
+_PRIME = (1 << 31) - 1
+_rng = np.random.RandomState(20240601)
+_A = _rng.randint(1, _PRIME, size=NUM_PERM).astype(np.uint64)
+_B = _rng.randint(0, _PRIME, size=NUM_PERM).astype(np.uint64)
+# Folds a band's ROWS hash values into one 32-bit key.
+_BAND_MIX = np.uint64(0x9E3779B1)
+
+_WORD_RE = re.compile(r"[a-z0-9']+")
+
+STOPWORDS = frozenset("""
+a about above after again all am an and any are as at be been before being below between both but by
+can could did do does doing down during each few for from further had has have having he her here hers
+herself him himself his how i i'm if in into is it it's its itself just me more most my myself
+of off on once only or other our ours out over own same she should so some such than that the their
+them then there these they this those through to too under until up very was we were what when where
+which while who whom why will with would you your yours dream dreams dreamed dreamt dreaming night
+last saw see seen suddenly really felt feel feeling like
+""".split())
+
+# "I could not fly" and "I could fly" are different dreams: every negation
+# stays in the feature set, folded into one feature so "couldn't" = "could not",
+# and a dream never matches one that differs from it in being negated.
+NEGATIONS = frozenset(("no", "not", "nor", "never", "cannot"))
+NEGATION = "not"
+
+# Template fallbacks are generic, so they are never offered as a near duplicate.
+EXCLUDED_METHODS = ("fallback",)
+
+# Candidates verified per lookup, most shared bands first.
+MAX_CANDIDATES = 16
+# New rows wait in a small hash table until this many pile up, then merge into the sorted arrays.
+MERGE_AT = 4096
+# History rows read (and signed) per batch while refreshing.
+REFRESH_BATCH = 5000
+
+
+def _stem(word: str) -> str:
+    for suffix in ("ing", "ed", "s"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            word = word[: -len(suffix)]
+            break
+    if word.endswith("e") and len(word) > 3:
+        word = word[:-1]
+    return word
+
+
+def features(text: str) -> frozenset:
+    """Stemmed content words of a dream, negations included; the set MinHash approximates Jaccard over."""
+    feats = set()
+    for word in _WORD_RE.findall(text.lower()):
+        word = word.strip("'")
+        if word in NEGATIONS or word.endswith("n't"):
+            feats.add(NEGATION)
+        elif word not in STOPWORDS:
+            feats.add(_stem(word))
+    return frozenset(feats)
+
+
+def signature(feature_set) -> np.ndarray:
+    hashes = np.fromiter((zlib.crc32(f.encode("utf-8")) for f in feature_set), dtype=np.uint64)
+    return ((np.outer(hashes, _A) + _B) % _PRIME).min(axis=0)
+
+
+def band_keys(sig: np.ndarray) -> np.ndarray:
+    """One uint32 key per LSH band of a signature."""
+    rows = sig.reshape(BANDS, ROWS)
+    keys = rows[:, 0].copy()
+    for j in range(1, ROWS):
+        keys = keys * _BAND_MIX + rows[:, j]
+    return (keys ^ (keys >> np.uint64(32))).astype(np.uint32)
+
+
+def jaccard(a, b) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class NearDuplicateIndex:
+    """LSH over history rows; candidates are read back by rowid and verified with exact Jaccard.
+
+    Without `db_path` (the offline report, tests), add() keeps each row's
+    text in memory instead, since there is no table to read it back from.
+    """
+
+    def __init__(self, db_path: str = None, threshold: float = 0.8, refresh_interval: float = 30.0):
+        self.db_path = db_path
+        self.threshold = threshold
+        self.refresh_interval = refresh_interval
+        self._rowids = np.zeros(0, dtype=np.int64)
+        self._keys = [np.zeros(0, dtype=np.uint32) for _ in range(BANDS)]   # sorted, per band
+        self._docs = [np.zeros(0, dtype=np.uint32) for _ in range(BANDS)]   # doc index of each key
+        self._pending = []      # (rowid, band keys) not yet merged into the arrays
+        self._pending_buckets = [dict() for _ in range(BANDS)]
+        self._texts = {}        # rowid -> (dream, interpretation, ts), only without db_path
+        self._last_rowid = 0
+        self._last_refresh = 0.0
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._local = threading.local()
+
+    def __len__(self):
+        return len(self._rowids) + len(self._pending)
+
+    def add(self, dream: str, interpretation: str = None, ts: str = None, rowid: int = None):
+        """Index one dream. With a history table, `rowid` is its row; otherwise the text is kept in memory.
+
+        Rows are added from one thread at a time (the refresher); lookups may run alongside.
+        """
+        feats = features(dream)
+        if not feats:
+            return
+        keys = band_keys(signature(feats))
+        with self._lock:
+            if rowid is None:
+                rowid = len(self) + 1
+                self._texts[rowid] = (dream, interpretation, ts)
+            doc_id = len(self)
+            self._pending.append((rowid, keys))
+            for band, key in enumerate(keys.tolist()):
+                self._pending_buckets[band].setdefault(key, []).append(doc_id)
+            full = len(self._pending) >= MERGE_AT
+        if full:
+            self._merge()
+
+    def _merge(self):
+        """Fold the pending rows into new sorted arrays, then swap them in."""
+        with self._lock:
+            pending, rowids, sorted_keys, sorted_docs = self._pending, self._rowids, self._keys, self._docs
+        if not pending:
+            return
+        new_rowids = np.fromiter((r for r, _ in pending), dtype=np.int64, count=len(pending))
+        keys = np.stack([k for _, k in pending])
+        docs = np.arange(len(rowids), len(rowids) + len(pending), dtype=np.uint32)
+        merged_keys, merged_docs = [], []
+        for band in range(BANDS):
+            order = np.argsort(keys[:, band], kind="stable")
+            at = sorted_keys[band].searchsorted(keys[order, band], side="right")
+            merged_keys.append(np.insert(sorted_keys[band], at, keys[order, band]))
+            merged_docs.append(np.insert(sorted_docs[band], at, docs[order]))
+        with self._lock:
+            self._rowids = np.concatenate([rowids, new_rowids])
+            self._keys, self._docs = merged_keys, merged_docs
+            self._pending = []
+            self._pending_buckets = [dict() for _ in range(BANDS)]
+
+    def refresh(self, force: bool = False):
+        """Index history rows written (by any worker) since the last refresh. Blocks; see refresh_in_background()."""
+        if not self.db_path:
+            return
+        if not force and time.monotonic() - self._last_refresh < self.refresh_interval:
+            return
+        # One refreshing thread at a time; others keep serving the current index.
+        if not self._refresh_lock.acquire(blocking=force):
+            return
+        try:
+            self._refresh()
+        finally:
+            self._refresh_lock.release()
+
+    def refresh_in_background(self):
+        """Start a refresh on a daemon thread when one is due; the caller never waits for it."""
+        if not self.db_path:
+            return
+        with self._lock:
+            if time.monotonic() - self._last_refresh < self.refresh_interval or self._refresh_lock.locked():
+                return
+            self._last_refresh = time.monotonic()
+        threading.Thread(target=self.refresh, args=(True,), name="near-duplicate-refresh", daemon=True).start()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=5)
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def _refresh(self):
+        self._last_refresh = time.monotonic()
+        if not os.path.exists(self.db_path):
+            return
+        try:
+            conn = self._connection()
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(history)")}
+            method_filter = ""
+            if "method" in columns:
+                placeholders = ",".join("?" for _ in EXCLUDED_METHODS)
+                method_filter = f" AND (method IS NULL OR method NOT IN ({placeholders}))"
+            top = conn.execute("SELECT MAX(rowid) FROM history").fetchone()[0] or 0
+            while self._last_rowid < top:
+                params = (self._last_rowid, top) + (EXCLUDED_METHODS if method_filter else ())
+                rows = conn.execute(
+                    "SELECT rowid, dream FROM history WHERE rowid > ? AND rowid <= ?"
+                    " AND response IS NOT NULL AND response != ''"
+                    + method_filter + f" ORDER BY rowid LIMIT {REFRESH_BATCH}",
+                    params,
+                ).fetchall()
+                for rowid, dream in rows:
+                    if dream:
+                        self.add(dream, rowid=rowid)
+                # Advance past excluded rows too so they are not rescanned.
+                self._last_rowid = rows[-1][0] if len(rows) == REFRESH_BATCH else top
+        except sqlite3.Error as e:
+            print("Near-duplicate refresh failed:", e)
+        self._merge()
+
+    def candidates(self, feats) -> list:
+        """Rowids sharing at least one band with `feats`, most shared bands first (at most MAX_CANDIDATES)."""
+        keys = band_keys(signature(feats))
+        with self._lock:
+            rowids, sorted_keys, sorted_docs = self._rowids, self._keys, self._docs
+            pending, pending_buckets = self._pending, self._pending_buckets
+        shared = {}
+        for band, key in enumerate(keys.tolist()):
+            lo = sorted_keys[band].searchsorted(key, side="left")
+            hi = sorted_keys[band].searchsorted(key, side="right")
+            for doc in sorted_docs[band][lo:hi].tolist():
+                shared[doc] = shared.get(doc, 0) + 1
+            for doc in pending_buckets[band].get(key, ()):
+                shared[doc] = shared.get(doc, 0) + 1
+        best = sorted(shared, key=lambda d: (-shared[d], d))[:MAX_CANDIDATES]
+        base = len(rowids)
+        return [int(rowids[d]) if d < base else pending[d - base][0] for d in best if d - base < len(pending)]
+
+    def _fetch(self, rowids: list) -> dict:
+        """rowid -> (dream, interpretation, ts) for the candidates."""
+        if not self.db_path:
+            return {r: self._texts[r] for r in rowids if r in self._texts}
+        placeholders = ",".join("?" for _ in rowids)
+        rows = self._connection().execute(
+            f"SELECT rowid, dream, response, ts FROM history WHERE rowid IN ({placeholders})", rowids).fetchall()
+        return {rowid: (dream, response, ts) for rowid, dream, response, ts in rows}
+
+    def find(self, dream: str):
+        """Best stored dream with Jaccard >= threshold, as a dict, or None."""
+        self.refresh_in_background()
+        feats = features(dream)
+        if not feats or not len(self):
+            return None
+        rowids = self.candidates(feats)
+        if not rowids:
+            return None
+        best, best_score = None, 0.0
+        negated = NEGATION in feats
+        for doc_dream, interpretation, ts in self._fetch(rowids).values():
+            doc_feats = features(doc_dream or "")
+            if (NEGATION in doc_feats) != negated:
+                # One word of difference, but the opposite dream.
+                continue
+            score = jaccard(feats, doc_feats)
+            if interpretation and score >= self.threshold and score > best_score:
+                best, best_score = (doc_dream, interpretation, ts), score
+        if best is None:
+            return None
+        return {"dream": best[0], "interpretation": best[1], "ts": best[2], "similarity": round(best_score, 4)}
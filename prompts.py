@@ -0,0 +1,144 @@
+"""
+DREAMLENS AI - Prompt Assembly
+Builds the chat messages for a Groq interpretation within a token budget.
+The system prompt and the instruction line come first and never change
+between requests, so upstream prompt caching can reuse that prefix. The
+matched dataset snippets and the dream follow. When the whole prompt would
+exceed the budget, the snippets are ranked, and the lowest-ranked ones are
+cut short or dropped. The system prompt and the dream itself are never
+shortened to make room. Token counts come from a local approximation of
+the Llama tokenizer, so no tokenizer download or extra dependency is
+needed.
+"""
+
+import hashlib
+import re
+
+INSTRUCTION = "Please provide a comprehensive, insightful interpretation of the dream below."
+CONTEXT_HEADING = "Related dream symbols from our database:"
+
+# Chat template tokens around each message (role header, end-of-turn) and
+# the assistant header that opens the reply.
+MESSAGE_OVERHEAD = 4
+REPLY_OVERHEAD = 3
+
+_PIECE_RE = re.compile(r"[^\W\d_]+|\d{1,3}|\n+|\S")
+_SNIPPET_RE = re.compile(r"- (?P<word>[^:]+): (?P<text>.*)")
+
+
+def count_tokens(text: str) -> int:
+    """Approximate Llama 3 token count of `text`.
+
+    Letters: one token per started eight characters of each word (the
+    vocabulary holds most English words whole). Digits: one per group of
+    three. Newline runs and ASCII punctuation: one each. Other symbols,
+    such as emoji, count as two. Rare words are undercounted, which the
+    estimate-to-actual ratio in the trace report shows.
+    """
+    tokens = 0
+    for piece in _PIECE_RE.findall(text):
+        first = piece[0]
+        if first.isalpha():
+            tokens += (len(piece) + 7) // 8
+        elif first.isdigit() or first == "\n" or first.isascii():
+            tokens += 1
+        else:
+            tokens += 2
+    return tokens
+
+
+def parse_snippets(db_context: str) -> list:
+    """[(word, text)] from a context block of "- word: interpretation..." lines (SymbolIndex.context())."""
+    snippets = []
+    for line in (db_context or "").splitlines():
+        match = _SNIPPET_RE.fullmatch(line.strip())
+        if match:
+            snippets.append((match["word"].strip(), match["text"].strip()))
+    return snippets
+
+
+def rank_snippets(snippets: list, dream_text: str) -> list:
+    """Snippets whose symbol the dream names outright come first. Otherwise the search order is kept."""
+    dream = " " + " ".join(re.findall(r"[\w']+", dream_text.lower())) + " "
+    return sorted(snippets, key=lambda s: f" {s[0].lower()} " not in dream)
+
+
+def _cut(text: str, tokens: int) -> str:
+    """The longest word-boundary prefix of `text` estimated at no more than `tokens`, plus "..."."""
+    words = text.rstrip(".").split()
+    kept, used = [], count_tokens("...")
+    for word in words:
+        cost = count_tokens(word)
+        if used + cost > tokens:
+            break
+        kept.append(word)
+        used += cost
+    return " ".join(kept) + "..." if kept else ""
+
+
+class PromptBuilder:
+    """System prompt + instruction, then the ranked snippets that fit, then the dream.
+
+    `budget` caps the estimated prompt tokens of a call, chat template
+    included; 0 means unlimited. Snippets are kept in rank order while they
+    fit. The first one that doesn't is cut at a word boundary if at least
+    `min_snippet_tokens` of room is left. It and everything after it are
+    dropped otherwise.
+    """
+
+    def __init__(self, system_prompt: str, budget: int = 0, min_snippet_tokens: int = 12):
+        self.system_prompt = system_prompt
+        self.budget = budget
+        self.min_snippet_tokens = min_snippet_tokens
+        self.prefix_tokens = (count_tokens(system_prompt) + count_tokens(INSTRUCTION)
+                              + 2 * MESSAGE_OVERHEAD + REPLY_OVERHEAD)
+        # Anything that changes the prompt for the same dream and context changes this.
+        self.version = hashlib.sha256(
+            "\0".join((system_prompt, INSTRUCTION, CONTEXT_HEADING, str(budget))).encode("utf-8")
+        ).hexdigest()[:12]
+
+    def build(self, dream_text: str, db_context: str = "") -> dict:
+        """{"messages", "tokens", "snippets", "trimmed", "dropped"} for one request.
+
+        `tokens` is the estimated prompt size. `snippets`, `trimmed` and
+        `dropped` count context lines kept whole, cut short and left out.
+        """
+        dream_line = f'Dream: "{dream_text}"'
+        used = self.prefix_tokens + 1 + count_tokens(dream_line)
+        snippets = rank_snippets(parse_snippets(db_context), dream_text)
+        lines, trimmed = [], 0
+        if snippets:
+            used += 1 + count_tokens(CONTEXT_HEADING)
+        for word, text in snippets:
+            line = f"- {word}: {text}"
+            cost = 1 + count_tokens(line)
+            room = self.budget - used if self.budget > 0 else cost
+            if cost > room:
+                head = count_tokens(f"- {word}:")
+                short = _cut(text, room - 1 - head) if room - 1 - head >= self.min_snippet_tokens else ""
+                if short:
+                    line = f"- {word}: {short}"
+                    cost = 1 + count_tokens(line)
+                    trimmed = 1
+                    lines.append(line)
+                    used += cost
+                break
+            lines.append(line)
+            used += cost
+        if snippets and not lines:
+            used -= 1 + count_tokens(CONTEXT_HEADING)
+
+        user_prompt = INSTRUCTION
+        if lines:
+            user_prompt += f"\n\n{CONTEXT_HEADING}\n" + "\n".join(lines)
+        user_prompt += f"\n\n{dream_line}"
+        return {
+            "messages": [
+                {"role": "system", "content": self.system_prompt},
+                {"role": "user", "content": user_prompt},
+            ],
+            "tokens": used,
+            "snippets": len(lines) - trimmed,
+            "trimmed": trimmed,
+            "dropped": len(snippets) - len(lines),
+        }
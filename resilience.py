@@ -0,0 +1,173 @@
+"""
+DREAMLENS AI - Resilience
+Circuit breaker, retry budget and jittered backoff for the Groq calls in
+groq_client.py. While Groq is failing the breaker answers "no" at once, so
+requests fall back immediately instead of each waiting out a timeout, and
+the retry budget keeps retries from multiplying load on a struggling API.
+"""
+
+import random
+import threading
+import time
+from collections import deque
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class RollingCounts:
+    """Event counts over the last `window` seconds, kept in one-second buckets."""
+
+    def __init__(self, window: float, clock=time.monotonic):
+        self.window = window
+        self.clock = clock
+        self._buckets = deque()     # [second, {name: count}]
+
+    def add(self, name: str, amount: int = 1):
+        second = int(self.clock())
+        if not self._buckets or self._buckets[-1][0] != second:
+            self._buckets.append([second, {}])
+        counts = self._buckets[-1][1]
+        counts[name] = counts.get(name, 0) + amount
+
+    def totals(self) -> dict:
+        horizon = self.clock() - self.window
+        while self._buckets and self._buckets[0][0] + 1 <= horizon:
+            self._buckets.popleft()
+        totals = {}
+        for _, counts in self._buckets:
+            for name, count in counts.items():
+                totals[name] = totals.get(name, 0) + count
+        return totals
+
+    def clear(self):
+        self._buckets.clear()
+
+
+class CircuitBreaker:
+    """Rolling-window circuit breaker.
+
+    Closed: calls go through and outcomes are counted over `window` seconds.
+    Once at least `min_calls` were made and `failure_ratio` of them failed,
+    it opens and refuses calls for `open_seconds`. Then it lets one probe
+    through (half-open): success closes it, failure opens it again.
+    `on_change(old, new)` is called on every transition, outside the lock.
+    """
+
+    def __init__(self, window: float = 30.0, min_calls: int = 10, failure_ratio: float = 0.5,
+                 open_seconds: float = 15.0, clock=time.monotonic, on_change=None):
+        self.min_calls = min_calls
+        self.failure_ratio = failure_ratio
+        self.open_seconds = open_seconds
+        self.clock = clock
+        self.on_change = on_change
+        self._lock = threading.Lock()
+        self._counts = RollingCounts(window, clock)
+        self._state = CLOSED
+        self._opened_at = None
+        self._probe_at = None
+        self._rejected = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    def allow(self) -> bool:
+        """Whether a call may go upstream now. A True in half-open state reserves the probe."""
+        changed = None
+        with self._lock:
+            now = self.clock()
+            if self._state == OPEN and now - self._opened_at >= self.open_seconds:
+                changed = self._set(HALF_OPEN)
+            if self._state == HALF_OPEN:
+                # A probe whose outcome was never recorded must not wedge the breaker.
+                if self._probe_at is None or now - self._probe_at >= self.open_seconds:
+                    self._probe_at = now
+                    allowed = True
+                else:
+                    allowed = False
+            else:
+                allowed = self._state == CLOSED
+            if not allowed:
+                self._rejected += 1
+        self._notify(changed)
+        return allowed
+
+    def record(self, success: bool):
+        """Count the outcome of a call that `allow()` let through."""
+        changed = None
+        with self._lock:
+            if self._state == HALF_OPEN:
+                changed = self._set(CLOSED if success else OPEN)
+            elif self._state == CLOSED:
+                self._counts.add("calls")
+                if not success:
+                    self._counts.add("failures")
+                totals = self._counts.totals()
+                calls = totals.get("calls", 0)
+                if calls >= self.min_calls and totals.get("failures", 0) >= self.failure_ratio * calls:
+                    changed = self._set(OPEN)
+        self._notify(changed)
+
+    def _set(self, state: str):
+        old, self._state = self._state, state
+        self._probe_at = None
+        if state == OPEN:
+            self._opened_at = self.clock()
+        if state == CLOSED:
+            self._counts.clear()
+        return old, state
+
+    def _notify(self, changed):
+        if changed and self.on_change is not None:
+            self.on_change(*changed)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            totals = self._counts.totals()
+            snap = {
+                "state": self._state,
+                "calls_in_window": totals.get("calls", 0),
+                "failures_in_window": totals.get("failures", 0),
+                "rejected": self._rejected,
+            }
+            if self._state == OPEN:
+                snap["retry_in_seconds"] = round(max(0.0, self._opened_at + self.open_seconds - self.clock()), 1)
+        return snap
+
+
+class RetryBudget:
+    """Allow retries up to `ratio` of the requests seen in the last `window` seconds,
+    plus `minimum` so a quiet process can still retry now and then."""
+
+    def __init__(self, ratio: float = 0.2, minimum: int = 3, window: float = 10.0, clock=time.monotonic):
+        self.ratio = ratio
+        self.minimum = minimum
+        self._lock = threading.Lock()
+        self._counts = RollingCounts(window, clock)
+
+    def request(self):
+        """Count a first attempt."""
+        with self._lock:
+            self._counts.add("requests")
+
+    def spend(self) -> bool:
+        """Take one retry from the budget; False when it is used up."""
+        with self._lock:
+            totals = self._counts.totals()
+            if totals.get("retries", 0) >= self.minimum + self.ratio * totals.get("requests", 0):
+                return False
+            self._counts.add("retries")
+            return True
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            totals = self._counts.totals()
+        return {"requests_in_window": totals.get("requests", 0), "retries_in_window": totals.get("retries", 0)}
+
+
+def backoff(attempt: int, base: float = 0.1, cap: float = 2.0, rng=random) -> float:
+    """Full-jitter exponential backoff: uniform in [0, min(cap, base * 2**attempt)]."""
+    return rng.uniform(0, min(cap, base * 2 ** attempt))
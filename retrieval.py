@@ -0,0 +1,134 @@
+"""
+DREAMLENS AI - Full-Text Retrieval
+BM25 over the dataset's symbol names and interpretation bodies, with a
+weight per field (BM25F). A row's term weights don't depend on the query,
+so they are computed once into a sparse document-term matrix. Scoring a
+batch of dreams is then one sparse product, and the top k of each dream
+comes from argpartition over that dream's nonzero scores only.
+"""
+
+import re
+from functools import lru_cache
+
+import numpy as np
+import scipy.sparse as sp
+
+FIELD_WEIGHTS = {"Word": 3.0, "Interpretation": 1.0}
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+@lru_cache(maxsize=65536)
+def stem(token: str) -> str:
+    """Strip common English inflections so "dogs" finds "Dogs" and "swimming" finds "swim"."""
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    for suffix in ("ing", "ed"):
+        if len(token) > len(suffix) + 3 and token.endswith(suffix):
+            token = token[:-len(suffix)]
+            if token[-1] == token[-2] and token[-1] not in "lsz":
+                token = token[:-1]
+            return token
+    if len(token) > 3 and token.endswith("s") and not token.endswith(("ss", "us", "is")):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> list:
+    """Lowercased, stemmed terms of two or more characters."""
+    return [stem(t) for t in _TOKEN_RE.findall(text.lower()) if len(t) > 1]
+
+
+class BM25Index:
+    """BM25F scores of free text against documents made of weighted text fields.
+
+    `fields` maps a field name to one string per document, and `weights`
+    maps it to its weight. Each query term counts once. Scores are divided
+    by the query's total IDF, so they fall in [0, 1): the share of the
+    query a row covers, discounted by BM25's term-frequency saturation.
+    Terms that no document has are ignored.
+    """
+
+    def __init__(self, fields: dict, weights: dict = None, k1: float = 1.2, b: float = 0.75):
+        weights = weights or {name: 1.0 for name in fields}
+        self.k1 = k1
+        self.b = b
+        self.vocabulary = {}
+        counts = {name: self._counts(texts, grow=True) for name, texts in fields.items()}
+        n_terms = len(self.vocabulary)
+        n_docs = len(next(iter(fields.values()))) if fields else 0
+
+        # BM25F: length-normalize each field's term counts, sum them by weight, then saturate once.
+        tf = sp.csr_matrix((n_docs, n_terms), dtype=np.float64)
+        for name, matrix in counts.items():
+            matrix = sp.csr_matrix(matrix, shape=(n_docs, n_terms))
+            lengths = np.asarray(matrix.sum(axis=1)).ravel()
+            mean = lengths.mean() if n_docs and lengths.mean() > 0 else 1.0
+            norm = 1.0 / (1 - b + b * lengths / mean)
+            tf = tf + sp.diags(weights.get(name, 1.0) * norm) @ matrix
+        tf = sp.csr_matrix(tf)
+        tf.eliminate_zeros()
+
+        df = np.bincount(tf.indices, minlength=n_terms)
+        self.idf = np.log1p((n_docs - df + 0.5) / (df + 0.5))
+        tf.data = self.idf[tf.indices] * tf.data / (k1 + tf.data)
+        # Terms x documents, so a batch of query rows multiplies straight through.
+        self.term_docs = tf.T.tocsr()
+        self.n_docs = n_docs
+
+    @classmethod
+    def from_frame(cls, df, weights: dict = FIELD_WEIGHTS, **kwargs):
+        return cls({name: df[name].astype(str).tolist() for name in weights}, weights, **kwargs)
+
+    def __len__(self):
+        return self.n_docs
+
+    def _counts(self, texts, grow: bool = False, binary: bool = False) -> sp.csr_matrix:
+        """Term counts per text, or 1 per distinct term if `binary`. Only `grow` adds new terms."""
+        indptr, indices = [0], []
+        vocabulary = self.vocabulary
+        for text in texts:
+            cols = []
+            for token in _TOKEN_RE.findall(text.lower()):
+                if len(token) < 2:
+                    continue
+                term = stem(token)
+                col = vocabulary.get(term)
+                if col is None:
+                    if not grow:
+                        continue
+                    col = vocabulary[term] = len(vocabulary)
+                cols.append(col)
+            indices.extend(set(cols) if binary else cols)
+            indptr.append(len(indices))
+        data = np.ones(len(indices), dtype=np.float64)
+        matrix = sp.csr_matrix((data, indices, indptr), shape=(len(texts), len(vocabulary)))
+        if not binary:
+            matrix.sum_duplicates()
+        return matrix
+
+    def scores(self, texts: list) -> sp.csr_matrix:
+        """Normalized scores of every row for each text: a len(texts) x len(self) sparse matrix.
+
+        Each row holds only the documents sharing a term with its text, in no particular order.
+        """
+        query = self._counts(texts, binary=True)
+        total = query @ self.idf
+        scale = np.divide(1.0, total, out=np.zeros_like(total), where=total > 0)
+        scores = query @ self.term_docs
+        scores.data *= np.repeat(scale, np.diff(scores.indptr))
+        return scores
+
+    def top_k(self, texts: list, k: int = 5) -> list:
+        """[(rows, scores)] per text: its `k` best rows with a nonzero score, best first."""
+        scores = self.scores(texts)
+        results = []
+        for i in range(len(texts)):
+            start, end = scores.indptr[i], scores.indptr[i + 1]
+            data, rows = scores.data[start:end], scores.indices[start:end]
+            if len(data) > k:
+                keep = np.argpartition(-data, k - 1)[:k]
+                data, rows = data[keep], rows[keep]
+            order = np.lexsort((rows, -data))
+            results.append((rows[order], data[order]))
+        return results
@@ -0,0 +1,101 @@
+"""
+DREAMLENS AI - Model Routing
+Picks the Groq model and max_tokens budget for each interpretation. Short,
+simple dreams go to a small fast model with a smaller budget. Everything
+else goes to the standard model. A caller's "deep" mode gets the large model
+with a larger budget. When the standard model has recently been slow,
+medium-length dreams move to the fast tier too, and long ones get the fast
+tier's shorter budget.
+"""
+
+import re
+import threading
+
+FAST = "fast"
+STANDARD = "standard"
+DEEP = "deep"
+TIERS = (FAST, STANDARD, DEEP)
+
+_WORD_RE = re.compile(r"[\w']+")
+
+
+def count_symbols(db_context: str) -> int:
+    """Dataset symbols in a context block from SymbolIndex.context(): one "- word: ..." line each."""
+    return sum(1 for line in db_context.splitlines() if line.startswith("- ")) if db_context else 0
+
+
+class LatencyEwma:
+    """Exponentially weighted mean call duration per tier, in seconds."""
+
+    def __init__(self, alpha: float = 0.2):
+        self.alpha = alpha
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def observe(self, tier: str, seconds: float):
+        with self._lock:
+            old = self._values.get(tier)
+            self._values[tier] = seconds if old is None else old + self.alpha * (seconds - old)
+
+    def get(self, tier: str):
+        with self._lock:
+            return self._values.get(tier)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {tier: round(value, 3) for tier, value in self._values.items()}
+
+
+class RoutingPolicy:
+    """Chooses a tier from dream length, matched symbol count, recent latency and the caller's mode.
+
+    `models` and `max_tokens` map each tier to its model id and budget. With
+    `enabled` False, or no fast model, every "auto" request is standard.
+    """
+
+    def __init__(self, models: dict, max_tokens: dict, fast_max_words: int = 30, fast_max_symbols: int = 1,
+                 slow_seconds: float = 6.0, enabled: bool = True):
+        self.models = models
+        self.max_tokens = max_tokens
+        self.fast_max_words = fast_max_words
+        self.fast_max_symbols = fast_max_symbols
+        self.slow_seconds = slow_seconds
+        self.enabled = enabled and bool(models.get(FAST))
+        self.latency = LatencyEwma()
+
+    def route(self, dream_text: str, symbols: int = 0, mode: str = "auto") -> dict:
+        """{"tier", "model", "max_tokens", "reason", "words", "symbols"} for one request."""
+        words = len(_WORD_RE.findall(dream_text))
+        tier, reason, budget = STANDARD, "default", None
+        if mode == DEEP:
+            tier, reason = DEEP, "deep_mode"
+        elif not self.enabled:
+            reason = "routing_off"
+        elif words <= self.fast_max_words and symbols <= self.fast_max_symbols:
+            tier, reason = FAST, "short"
+        elif self.slow_seconds > 0 and (self.latency.get(STANDARD) or 0) > self.slow_seconds:
+            reason = "upstream_slow"
+            if words <= 2 * self.fast_max_words:
+                tier = FAST
+            else:
+                budget = self.max_tokens[FAST]
+        return {
+            "tier": tier,
+            "model": self.models[tier],
+            "max_tokens": budget or self.max_tokens[tier],
+            "reason": reason,
+            "words": words,
+            "symbols": symbols,
+        }
+
+    def observe(self, tier: str, seconds: float):
+        """Record a successful call's duration; the standard tier's average drives "upstream_slow"."""
+        self.latency.observe(tier, seconds)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "models": dict(self.models),
+            "max_tokens": dict(self.max_tokens),
+            "latency_seconds": self.latency.snapshot(),
+        }
@@ -0,0 +1,6 @@
+"""
+DREAMLENS AI - Scripts
+Command-line tools, run as `python scripts/<name>.py`. A package so the
+tests can import them too (tests/groq_stub.py serves groq_stub_server's
+StubGroq).
+"""
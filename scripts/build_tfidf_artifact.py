@@ -0,0 +1,26 @@
+"""Build the memory-mappable TF-IDF artifact that app.py loads at startup.
+
+Run from the repository root after changing the dataset:
+
+    python scripts/build_tfidf_artifact.py
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd  # noqa: E402
+
+import tfidf_artifact  # noqa: E402
+
+DATASET_PATH = "project/cleaned_dream_interpretations.csv"
+
+
+if __name__ == "__main__":
+    dataset = sys.argv[1] if len(sys.argv) > 1 else DATASET_PATH
+    out_dir = sys.argv[2] if len(sys.argv) > 2 else tfidf_artifact.ARTIFACT_DIR
+    df = pd.read_csv(dataset)
+    manifest = tfidf_artifact.build(df, dataset, out_dir)
+    print(f"Wrote {out_dir}: {manifest['shape'][0]} rows x {manifest['shape'][1]} terms, "
+          f"{manifest['nnz']} non-zeros (format v{manifest['version']})")
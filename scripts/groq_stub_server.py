@@ -0,0 +1,285 @@
+"""Local stand-in for the Groq OpenAI-compatible API, for offline load tests.
+
+Serves GET /openai/v1/models[/<id>] and POST /openai/v1/chat/completions
+(plain and streaming) with synthetic replies. Latency, failures and output
+speed are configurable, so capacity runs cost no network or API spend:
+
+  * --latency: time before the first token, as fixed:S, uniform:LO,HI,
+    lognormal:MEDIAN,SIGMA (the default, lognormal:0.35,0.5) or
+    exp:MEAN (seconds)
+  * --tokens-per-sec: output speed after the first token (0 = instant)
+  * --completion-tokens: mean reply length, capped by the request's max_tokens
+  * --error-rate / --error-status: fraction of completions that fail, and how
+  * --model-latency MODEL=SPEC: a latency for one model id (repeatable), so
+    a fast tier can be told apart from the default model (see routing.py)
+
+The test suite runs the same stub in-process (tests/groq_stub.py) with a
+fixed reply, and with `record` on so tests can inspect what was sent.
+
+GET /stub/stats reports what the stub served, per model as well. Point the app at it with
+GROQ_BASE_URL=http://127.0.0.1:<port> and any GROQ_API_KEY.
+
+    python scripts/groq_stub_server.py --port 8300 --latency lognormal:0.5,0.6 --tokens-per-sec 250
+"""
+
+import argparse
+import json
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = ("your", "dream", "suggests", "a", "period", "of", "change", "and", "reflection", "the", "symbol",
+         "often", "points", "to", "hidden", "feelings", "about", "growth", "security", "or", "loss", "in",
+         "waking", "life", "consider", "what", "this", "image", "means", "for", "you", "now")
+
+
+def parse_latency(spec: str):
+    """A sampler for --latency, returning seconds (never negative)."""
+    kind, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",") if v] if args else []
+    if kind == "fixed":
+        return lambda rng: values[0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "lognormal":
+        median, sigma = values
+        return lambda rng: rng.lognormvariate(0, sigma) * median
+    if kind == "exp":
+        return lambda rng: rng.expovariate(1 / values[0]) if values[0] > 0 else 0.0
+    raise ValueError(f"unknown latency distribution {spec!r}; use fixed, uniform, lognormal or exp")
+
+
+def count_tokens(text: str) -> int:
+    # Close enough to Llama tokenization for usage accounting.
+    return max(1, len(re.findall(r"\w+|[^\w\s]", text)))
+
+
+class StubGroq:
+    """The stub's behaviour and counters, shared by its request handlers."""
+
+    def __init__(self, model="llama-3.3-70b-versatile", latency="lognormal:0.35,0.5", tokens_per_sec=200.0,
+                 completion_tokens=300, error_rate=0.0, error_status=503, seed=None, model_latency=None,
+                 reply=None, record=False):
+        self.model = model
+        self.latency_spec = latency
+        self.sample_latency = parse_latency(latency)
+        self.model_latency = {name: parse_latency(spec) for name, spec in (model_latency or {}).items()}
+        self.tokens_per_sec = tokens_per_sec
+        self.completion_tokens = completion_tokens
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.reply = reply  # fixed reply text instead of random words
+        self.record = record
+        self.requests = []  # (method, path, payload), when recording
+        self.connections = set()  # client addresses, when recording
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats = {"completions": 0, "streams": 0, "errors": 0, "in_flight": 0, "max_in_flight": 0,
+                      "prompt_tokens": 0, "completion_tokens": 0}
+        self.by_model = {}  # model: {"calls", "completion_tokens", "max_tokens"}
+
+    def models(self) -> list:
+        return [self.model] + [name for name in self.model_latency if name != self.model]
+
+    def seen(self, method: str, path: str, payload, client):
+        if self.record:
+            with self._lock:
+                self.requests.append((method, path, payload))
+                self.connections.add(client)
+
+    def plan(self, payload: dict) -> dict:
+        """Decide one completion up front: whether it fails, its delay and its reply, as streamed pieces."""
+        model = payload.get("model", self.model)
+        with self._lock:
+            fails = self._rng.random() < self.error_rate
+            delay = max(0.0, self.model_latency.get(model, self.sample_latency)(self._rng))
+            wanted = max(1, int(self._rng.gauss(self.completion_tokens, self.completion_tokens / 4)))
+            words = [self._rng.choice(WORDS) for _ in range(min(wanted, int(payload.get("max_tokens") or wanted)))]
+        if self.reply is not None:
+            words = self.reply.split(" ")
+            pieces = [word + " " for word in words[:-1]] + words[-1:]
+        else:
+            pieces = [word.capitalize() if i == 0 else " " + word for i, word in enumerate(words)]
+            pieces[-1] += "."
+        prompt = " ".join(str(m.get("content", "")) for m in payload.get("messages") or [])
+        return {"fails": fails, "delay": delay, "pieces": pieces, "prompt_tokens": count_tokens(prompt),
+                "model": model, "max_tokens": payload.get("max_tokens")}
+
+    def count(self, **deltas):
+        with self._lock:
+            for key, value in deltas.items():
+                self.stats[key] += value
+            self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self.stats["in_flight"])
+
+    def count_model(self, plan: dict):
+        with self._lock:
+            seen = self.by_model.setdefault(plan["model"], {"calls": 0, "completion_tokens": 0, "max_tokens": []})
+            seen["calls"] += 1
+            seen["completion_tokens"] += len(plan["pieces"])
+            if plan["max_tokens"] not in seen["max_tokens"]:
+                seen["max_tokens"].append(plan["max_tokens"])
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self.stats, model=self.model, latency=self.latency_spec,
+                        tokens_per_sec=self.tokens_per_sec, error_rate=self.error_rate,
+                        by_model={name: dict(seen, max_tokens=list(seen["max_tokens"]))
+                                  for name, seen in self.by_model.items()})
+
+
+def make_handler(stub: StubGroq):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, payload, status=200):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _chunk(self, data: bytes):
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+        def _model(self, name):
+            return {"id": name, "object": "model", "created": 0, "owned_by": "stub", "active": True,
+                    "context_window": 131072}
+
+        def do_GET(self):
+            stub.seen("GET", self.path, None, self.client_address)
+            if self.path == "/stub/stats":
+                self._send(stub.snapshot())
+            elif self.path.rstrip("/") == "/openai/v1/models":
+                self._send({"object": "list", "data": [self._model(name) for name in stub.models()]})
+            elif self.path.startswith("/openai/v1/models/") and self.path.rsplit("/", 1)[1] in stub.models():
+                self._send(self._model(self.path.rsplit("/", 1)[1]))
+            else:
+                self._send({"error": {"message": "not found", "type": "invalid_request_error"}}, 404)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            try:
+                payload = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError:
+                self._send({"error": {"message": "invalid JSON", "type": "invalid_request_error"}}, 400)
+                return
+            stub.seen("POST", self.path, payload, self.client_address)
+            if self.path != "/openai/v1/chat/completions":
+                self._send({"error": {"message": "not found", "type": "invalid_request_error"}}, 404)
+                return
+            plan = stub.plan(payload)
+            stub.count(in_flight=1)
+            try:
+                time.sleep(plan["delay"])
+                if plan["fails"]:
+                    stub.count(errors=1)
+                    self._send({"error": {"message": "stub: simulated failure", "type": "internal_server_error"}},
+                               stub.error_status)
+                elif payload.get("stream"):
+                    stub.count(streams=1)
+                    self._stream(payload, plan)
+                else:
+                    stub.count(completions=1)
+                    self._complete(payload, plan)
+            finally:
+                stub.count(in_flight=-1)
+
+        def _usage(self, plan):
+            stub.count_model(plan)
+            completion = len(plan["pieces"])
+            stub.count(prompt_tokens=plan["prompt_tokens"], completion_tokens=completion)
+            return {"prompt_tokens": plan["prompt_tokens"], "completion_tokens": completion,
+                    "total_tokens": plan["prompt_tokens"] + completion}
+
+        def _complete(self, payload, plan):
+            if stub.tokens_per_sec > 0:
+                time.sleep(len(plan["pieces"]) / stub.tokens_per_sec)
+            self._send({
+                "id": "chatcmpl-stub", "object": "chat.completion", "created": int(time.time()),
+                "model": payload.get("model", stub.model),
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": "".join(plan["pieces"])}}],
+                "usage": self._usage(plan),
+            })
+
+        def _stream(self, payload, plan):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            model = payload.get("model", stub.model)
+            interval = 1 / stub.tokens_per_sec if stub.tokens_per_sec > 0 else 0
+            for text in plan["pieces"]:
+                self._event({"id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": 0, "model": model,
+                             "choices": [{"index": 0, "delta": {"content": text}, "finish_reason": None}]})
+                if interval:
+                    time.sleep(interval)
+            # Groq reports usage on the last chunk, under x_groq.
+            self._event({"id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": 0, "model": model,
+                         "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                         "x_groq": {"id": "req_stub", "usage": self._usage(plan)}})
+            self._chunk(b"data: [DONE]\n\n")
+            self._chunk(b"")
+
+        def _event(self, chunk: dict):
+            self._chunk(f"data: {json.dumps(chunk)}\n\n".encode())
+
+    return Handler
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Load tests open hundreds of connections at once.
+    request_queue_size = 2048
+
+
+def serve(stub: StubGroq, host: str = "127.0.0.1", port: int = 0) -> StubServer:
+    """Start the stub on a background thread; returns the server (server_address has the port)."""
+    server = StubServer((host, port), make_handler(stub))
+    threading.Thread(target=server.serve_forever, name="groq-stub", daemon=True).start()
+    return server
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8300)
+    parser.add_argument("--model", default="llama-3.3-70b-versatile")
+    parser.add_argument("--latency", default="lognormal:0.35,0.5", help="time to first token (see above)")
+    parser.add_argument("--tokens-per-sec", type=float, default=200.0)
+    parser.add_argument("--completion-tokens", type=int, default=300)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--model-latency", action="append", default=[], metavar="MODEL=SPEC",
+                        help="latency for one model id, e.g. llama-3.1-8b-instant=fixed:0.1 (repeatable)")
+    args = parser.parse_args(argv)
+
+    stub = StubGroq(model=args.model, latency=args.latency, tokens_per_sec=args.tokens_per_sec,
+                    completion_tokens=args.completion_tokens, error_rate=args.error_rate,
+                    error_status=args.error_status, seed=args.seed,
+                    model_latency=dict(spec.split("=", 1) for spec in args.model_latency))
+    server = serve(stub, args.host, args.port)
+    print(f"Groq stub on http://{args.host}:{server.server_address[1]} ({args.latency}, "
+          f"{args.tokens_per_sec:g} tok/s, error rate {args.error_rate:g})", flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        print(json.dumps(stub.snapshot()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+"""Compare the old per-request history insert with the write-behind store.
+
+Both run in a scratch directory with concurrent threads standing in for
+request handlers. For each strategy it reports the latency a request pays
+for the history write (p50/p99) and rows committed per second, including
+the final flush for the write-behind store.
+
+    python scripts/history_benchmark.py [--rows 5000] [--threads 8]
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from history_store import HistoryStore  # noqa: E402
+
+
+def legacy_insert(path: str, dream: str, response: str, method: str):
+    # What save_history did before the store: connect, create, insert, commit, close.
+    conn = sqlite3.connect(path)
+    cur = conn.cursor()
+    cur.execute("CREATE TABLE IF NOT EXISTS history (ts TEXT, dream TEXT, response TEXT, method TEXT)")
+    cur.execute("INSERT INTO history (ts,dream,response,method) VALUES (?,?,?,?)",
+                (datetime.utcnow().isoformat(), dream, response, method))
+    conn.commit()
+    conn.close()
+
+
+def percentile(values, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+def run(write, rows: int, threads: int, finish=None) -> dict:
+    latencies = [[] for _ in range(threads)]
+    errors = []
+    response = "An interpretation of moderate length. " * 20
+
+    def worker(n):
+        for i in range(n, rows, threads):
+            started = time.perf_counter()
+            try:
+                write(f"dream number {i} about a long corridor", response, "groq")
+            except sqlite3.Error as e:
+                errors.append(str(e))
+            latencies[n].append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    if finish:
+        finish()
+    elapsed = time.perf_counter() - started
+    flat = [x for part in latencies for x in part]
+    return {
+        "rows_per_sec": rows / elapsed,
+        "p50_ms": 1000 * percentile(flat, 50),
+        "p99_ms": 1000 * percentile(flat, 99),
+        "errors": len(errors),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="history-bench-") as scratch:
+        legacy_path = os.path.join(scratch, "legacy.db")
+        legacy = run(lambda d, r, m: legacy_insert(legacy_path, d, r, m), args.rows, args.threads)
+
+        store = HistoryStore(os.path.join(scratch, "store.db"))
+        behind = run(store.add, args.rows, args.threads, finish=store.flush)
+        behind.update(batches=store.stats()["batches"])
+        store.close()
+
+    print(f"{args.rows} rows from {args.threads} threads")
+    print(f"{'strategy':<16}{'rows/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for name, result in (("per-request", legacy), ("write-behind", behind)):
+        print(f"{name:<16}{result['rows_per_sec']:>10.0f}{result['p50_ms']:>10.3f}"
+              f"{result['p99_ms']:>10.3f}{result['errors']:>8}")
+    print(f"write-behind committed in {behind['batches']} transactions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+"""Benchmark history paging and search on a synthetic table.
+
+Builds a history.db of --rows synthetic dreams in a scratch directory (FTS
+triggers and all), then times:
+
+  * keyset pages (`WHERE rowid < ?`) vs OFFSET pages at increasing depth
+  * FTS5 search vs a LIKE scan for a few queries
+
+    python scripts/history_search_benchmark.py [--rows 1000000] [--keep path.db]
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from history_store import HistoryStore, connect, migrate  # noqa: E402
+
+SYMBOLS = ("snake", "water", "flying", "teeth", "house", "falling", "ocean", "forest", "mother", "school",
+           "fire", "door", "mirror", "train", "baby", "wedding", "exam", "dog", "storm", "bridge")
+FILLER = ("I", "was", "in", "an", "old", "dark", "bright", "strange", "with", "my", "friend", "and", "felt",
+          "afraid", "calm", "lost", "running", "through", "the", "a", "near", "while", "someone", "watched")
+QUERIES = ("snake", "mirror bridge", "falling teeth exam", "lighthouse")
+
+
+def synthetic_rows(count: int, seed: int = 11):
+    rng = random.Random(seed)
+    for i in range(count):
+        words = rng.sample(FILLER, 8) + rng.sample(SYMBOLS, 2)
+        rng.shuffle(words)
+        dream = " ".join(words)
+        response = f"Dreams of {words[0]} and {words[1]} often reflect " + " ".join(rng.sample(FILLER, 12))
+        yield (f"2024-01-01T00:00:{i % 60:02d}", dream, response, "groq")
+
+
+def build(path: str, rows: int, batch: int = 20000):
+    conn = connect(path)
+    migrate(conn)
+    started = time.perf_counter()
+    pending = []
+    for row in synthetic_rows(rows):
+        pending.append(row)
+        if len(pending) == batch:
+            with conn:
+                conn.executemany("INSERT INTO history (ts,dream,response,method) VALUES (?,?,?,?)", pending)
+            pending = []
+    if pending:
+        with conn:
+            conn.executemany("INSERT INTO history (ts,dream,response,method) VALUES (?,?,?,?)", pending)
+    conn.close()
+    return time.perf_counter() - started
+
+
+def timed(fn, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--keep", help="build (or reuse) the table at this path instead of a scratch dir")
+    args = parser.parse_args(argv)
+
+    scratch = None
+    path = args.keep
+    if path is None:
+        scratch = tempfile.TemporaryDirectory(prefix="history-search-bench-")
+        path = os.path.join(scratch.name, "history.db")
+    try:
+        if not os.path.exists(path):
+            print(f"building {args.rows} rows ... {build(path, args.rows):.1f} s")
+        store = HistoryStore(path)
+        conn = sqlite3.connect(path)
+        total = conn.execute("SELECT MAX(rowid) FROM history").fetchone()[0]
+        print(f"{total} rows, {os.path.getsize(path) / 1e6:.0f} MB")
+
+        print(f"\n{'page depth':>12}{'keyset ms':>12}{'offset ms':>12}")
+        for depth in (0, 1000, 100_000, total - 50):
+            cursor = total - depth + 1
+            keyset = timed(lambda: store.page(cursor if depth else None, 25))
+            offset = timed(lambda: conn.execute(
+                "SELECT rowid, ts, dream, response FROM history ORDER BY rowid DESC LIMIT 25 OFFSET ?",
+                (depth,)).fetchall())
+            print(f"{depth:>12}{keyset:>12.3f}{offset:>12.3f}")
+
+        print(f"\n{'query':<22}{'fts ms':>10}{'like ms':>10}{'hits':>10}")
+        for query in QUERIES:
+            fts = timed(lambda: store.search(query, 20), repeat=3)
+            words = query.split()
+            clauses = " AND ".join("(dream LIKE ? OR response LIKE ?)" for _ in words)
+            params = [p for w in words for p in (f"%{w}%", f"%{w}%")]
+            like = timed(lambda: conn.execute(
+                f"SELECT rowid FROM history WHERE {clauses} ORDER BY rowid DESC LIMIT 20", params).fetchall(),
+                repeat=1)
+            hits = conn.execute("SELECT COUNT(*) FROM history_fts WHERE history_fts MATCH ?",
+                                (" ".join(f'"{w}"' for w in words),)).fetchone()[0]
+            print(f"{query:<22}{fts:>10.2f}{like:>10.2f}{hits:>10}")
+        conn.close()
+        store.close()
+    finally:
+        if scratch is not None:
+            scratch.cleanup()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
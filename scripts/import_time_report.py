@@ -0,0 +1,85 @@
+"""Report where cold-import time of a module goes, like `python -X importtime`.
+
+Runs a fresh interpreter, parses its import-time trace and prints the slowest
+top-level packages. Exits non-zero when the total exceeds the budget.
+
+    python scripts/import_time_report.py              # import app, 750 ms budget
+    python scripts/import_time_report.py groq_client --budget-ms 300
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BUDGET_MS = float(os.environ.get("IMPORT_BUDGET_MS", "750"))
+HEAVY_MODULES = ("pandas", "sklearn", "scipy", "groq", "numpy")
+
+
+def measure(module: str = "app") -> dict:
+    """Import `module` in a clean interpreter and return its import-time breakdown.
+
+    The result has `total_ms` (cumulative time of `module`), `packages`
+    (cumulative ms per top-level package imported directly or transitively)
+    and `loaded` (set of every module name imported).
+    """
+    env = dict(os.environ)
+    env.setdefault("PYTHONPATH", ROOT)
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+
+    total_us = 0
+    pending = {}
+    packages = {}
+    loaded = set()
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name_field = line[len("import time:"):].split("|")
+        name = name_field.strip()
+        loaded.add(name)
+        # Entries are emitted post-order with two spaces of indent per nesting level,
+        # so a module's direct imports are the depth-1 lines just before it.
+        depth = (len(name_field) - len(name_field.lstrip()) - 1) // 2
+        if depth == 1:
+            top = name.split(".")[0]
+            pending[top] = pending.get(top, 0) + int(cumulative_us)
+        elif depth == 0:
+            if name == module:
+                total_us = int(cumulative_us)
+                packages = pending
+            pending = {}
+    return {
+        "total_ms": total_us / 1000.0,
+        "packages": {k: v / 1000.0 for k, v in packages.items()},
+        "loaded": loaded,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("module", nargs="?", default="app")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args(argv)
+
+    report = measure(args.module)
+    print(f"import {args.module}: {report['total_ms']:.1f} ms (budget {args.budget_ms:.0f} ms)")
+    for name, ms in sorted(report["packages"].items(), key=lambda kv: kv[1], reverse=True)[:args.top]:
+        print(f"  {ms:9.1f} ms  {name}")
+    heavy = sorted(m for m in HEAVY_MODULES if m in report["loaded"])
+    if heavy:
+        print(f"  eagerly imported heavy modules: {', '.join(heavy)}")
+    if report["total_ms"] > args.budget_ms:
+        print("OVER BUDGET")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
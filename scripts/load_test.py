@@ -0,0 +1,295 @@
+"""Concurrent load test for POST /interpret, offline by default.
+
+Dreams are generated from the symbols in project/dream_interpretations_10k.csv
+(a share sent with force_model, so they take the Groq path, and a share
+repeated, so the cache and near-duplicate paths see traffic). Reports
+throughput and latency percentiles overall and per meta.method.
+
+Against a running server:
+
+    python scripts/load_test.py --url http://127.0.0.1:5000 --concurrency 50 --requests 2000
+
+Or fully offline: start scripts/groq_stub_server.py and the app (uvicorn or
+gunicorn) pointed at it in a scratch data directory, then drive them:
+
+    python scripts/load_test.py --spawn uvicorn --workers 4 --rate 100 --duration 60 \\
+        --stub-latency lognormal:0.5,0.6 --stub-tokens-per-sec 250 --stub-error-rate 0.01
+
+--rate sends on a Poisson schedule whatever the response times (open loop;
+latency counts from the scheduled send, so a stalled server shows up as
+queueing instead of a lower request rate). Without it, --concurrency
+clients each send their next request as soon as the last one answers.
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CORPUS_PATH = os.path.join(ROOT, "project", "dream_interpretations_10k.csv")
+
+TEMPLATES = (
+    "I dreamed about a {a} in my house and felt uneasy",
+    "Last night I saw a {a} next to a {b} and I could not move",
+    "I keep dreaming of {a}; this time it was chasing me through a {b}",
+    "In my dream a {a} was talking to me while I stood near a {b}",
+    "I was lost in a strange city and suddenly found a {a} at my feet",
+    "My mother handed me a {a} and then everything turned into {b}",
+    "I was flying over {a} and {b}, feeling completely free",
+    "There was a {a} at the bottom of the ocean and I had to reach it",
+    "I dreamed I was late for an exam and a {a} blocked the door",
+    "A huge {a} appeared in the sky and everyone around me started running",
+)
+SETTINGS = ("at night", "in an old school", "during a storm", "at my childhood home", "on a crowded train")
+
+
+def load_symbols(path: str = CORPUS_PATH) -> list:
+    with open(path, newline="", encoding="utf-8") as f:
+        return sorted({row["Word"].strip() for row in csv.DictReader(f) if row.get("Word", "").strip()})
+
+
+def make_requests(symbols: list, count: int, groq_share: float, repeat_share: float, seed: int = 7):
+    """`count` request bodies: templated dreams, some forced to Groq, some repeats."""
+    rng = random.Random(seed)
+    sent = []
+    for _ in range(count):
+        if sent and rng.random() < repeat_share:
+            yield dict(rng.choice(sent))
+            continue
+        a, b = rng.sample(symbols, 2)
+        dream = rng.choice(TEMPLATES).format(a=a, b=b)
+        if rng.random() < 0.5:
+            dream += " " + rng.choice(SETTINGS)
+        body = {"dream": dream}
+        if rng.random() < groq_share:
+            body["force_model"] = True
+        sent.append(body)
+        yield body
+
+
+def percentile(values, pct: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+class Results:
+    def __init__(self):
+        self.latencies = []
+        self.by_method = {}
+        self.errors = {}
+        self.started = time.perf_counter()
+        self.finished = None
+
+    def ok(self, latency: float, method: str):
+        self.latencies.append(latency)
+        self.by_method.setdefault(method, []).append(latency)
+
+    def error(self, kind: str):
+        self.errors[kind] = self.errors.get(kind, 0) + 1
+
+    def summary(self) -> dict:
+        elapsed = (self.finished or time.perf_counter()) - self.started
+
+        def describe(values):
+            return {"count": len(values), **{f"p{p}_ms": round(1000 * percentile(values, p), 2)
+                                             for p in (50, 90, 95, 99)},
+                    "max_ms": round(1000 * max(values), 2) if values else 0.0}
+
+        return {
+            "seconds": round(elapsed, 2),
+            "ok": len(self.latencies),
+            "errors": dict(self.errors),
+            "throughput_rps": round(len(self.latencies) / elapsed, 1) if elapsed else 0.0,
+            "latency": describe(self.latencies),
+            "by_method": {m: describe(v) for m, v in sorted(self.by_method.items())},
+        }
+
+
+async def send(client: httpx.AsyncClient, body: dict, scheduled: float, results: Results):
+    try:
+        response = await client.post("/interpret", json=body)
+        latency = time.perf_counter() - scheduled
+        if response.status_code != 200:
+            results.error(f"http_{response.status_code}")
+            return
+        results.ok(latency, (response.json().get("meta") or {}).get("method", "-"))
+    except httpx.HTTPError as e:
+        results.error(type(e).__name__)
+
+
+async def run_closed(url: str, bodies, concurrency: int, deadline: float, timeout: float) -> Results:
+    results = Results()
+    bodies = iter(bodies)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=timeout) as client:
+        async def worker():
+            for body in bodies:
+                if time.perf_counter() > deadline:
+                    return
+                await send(client, body, time.perf_counter(), results)
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    results.finished = time.perf_counter()
+    return results
+
+
+async def run_open(url: str, bodies, rate: float, max_outstanding: int, deadline: float, timeout: float,
+                   seed: int = 7) -> Results:
+    results = Results()
+    rng = random.Random(seed)
+    limits = httpx.Limits(max_connections=max_outstanding, max_keepalive_connections=max_outstanding)
+    pending = set()
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=timeout) as client:
+        scheduled = time.perf_counter()
+        for body in bodies:
+            scheduled += rng.expovariate(rate)
+            if scheduled > deadline:
+                break
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            task = asyncio.ensure_future(send(client, body, scheduled, results))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+        if pending:
+            await asyncio.gather(*pending)
+    results.finished = time.perf_counter()
+    return results
+
+
+# ---------- Offline setup ----------
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for(url: str, timeout: float = 60.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=2) as r:
+                if r.status == 200:
+                    return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout:.0f}s")
+
+
+def spawn(args, scratch: str):
+    """Start the Groq stub and the app against it; returns (app_url, stub_url, processes)."""
+    stub_port, app_port = free_port(), free_port()
+    stub_cmd = [sys.executable, os.path.join(ROOT, "scripts", "groq_stub_server.py"), "--port", str(stub_port),
+                "--latency", args.stub_latency, "--tokens-per-sec", str(args.stub_tokens_per_sec),
+                "--completion-tokens", str(args.stub_completion_tokens), "--error-rate", str(args.stub_error_rate),
+                "--seed", "7"] + [f"--model-latency={spec}" for spec in args.stub_model_latency]
+    stub_url = f"http://127.0.0.1:{stub_port}"
+    env = dict(os.environ, GROQ_API_KEY="stub-key", GROQ_BASE_URL=stub_url,
+               DATA_DIR=os.path.join(scratch, "data"), LOG_DIR=os.path.join(scratch, "logs"))
+    # Every simulated client shares one address, so measure capacity without the per-client limit.
+    env.setdefault("RATE_LIMIT_PER_MINUTE", "0")
+    if args.spawn == "uvicorn":
+        app_cmd = [sys.executable, "-m", "uvicorn", "asgi:app", "--host", "127.0.0.1", "--port", str(app_port),
+                   "--workers", str(args.workers), "--log-level", "warning", "--no-access-log"]
+    else:
+        app_cmd = [sys.executable, "-m", "gunicorn", "app:app", "-b", f"127.0.0.1:{app_port}",
+                   "-w", str(args.workers), "--threads", "8", "--log-level", "warning"]
+    processes = [subprocess.Popen(stub_cmd, cwd=ROOT, stdout=subprocess.DEVNULL)]
+    processes.append(subprocess.Popen(app_cmd, cwd=ROOT, env=env))
+    wait_for(stub_url + "/stub/stats")
+    app_url = f"http://127.0.0.1:{app_port}"
+    wait_for(app_url + "/_health")
+    return app_url, stub_url, processes
+
+
+def print_report(summary: dict, label: str):
+    print(f"\n{label}")
+    print(f"{summary['ok']} ok in {summary['seconds']} s = {summary['throughput_rps']} req/s"
+          + (f"; errors {summary['errors']}" if summary["errors"] else ""))
+    print(f"{'':<16}{'count':>8}{'p50 ms':>10}{'p90 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    rows = [("all", summary["latency"])] + list(summary["by_method"].items())
+    for name, row in rows:
+        print(f"{name:<16}{row['count']:>8}{row['p50_ms']:>10.1f}{row['p90_ms']:>10.1f}{row['p95_ms']:>10.1f}"
+              f"{row['p99_ms']:>10.1f}{row['max_ms']:>10.1f}")
+    if "stub" in summary:
+        stub = summary["stub"]
+        print(f"Groq stub: {stub['completions'] + stub['streams']} completions, {stub['errors']} failed, "
+              f"peak {stub['max_in_flight']} in flight, {stub['completion_tokens']} tokens out")
+        for model, seen in sorted(stub.get("by_model", {}).items()):
+            print(f"  {model}: {seen['calls']} calls, {seen['completion_tokens']} tokens out, "
+                  f"max_tokens {seen['max_tokens']}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="server to test (omit with --spawn)")
+    parser.add_argument("--spawn", choices=("uvicorn", "gunicorn"), help="start the stub and app offline")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=32, help="clients (closed loop) or max in flight")
+    parser.add_argument("--rate", type=float, help="requests per second, Poisson arrivals (open loop)")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--duration", type=float, default=0, help="stop after this many seconds")
+    parser.add_argument("--groq-share", type=float, default=0.3, help="share sent with force_model")
+    parser.add_argument("--repeat-share", type=float, default=0.1, help="share repeating an earlier dream")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--stub-latency", default="lognormal:0.35,0.5")
+    parser.add_argument("--stub-tokens-per-sec", type=float, default=200.0)
+    parser.add_argument("--stub-completion-tokens", type=int, default=300)
+    parser.add_argument("--stub-error-rate", type=float, default=0.0)
+    parser.add_argument("--stub-model-latency", action="append", default=[], metavar="MODEL=SPEC",
+                        help="per-model stub latency, to exercise model routing (repeatable)")
+    parser.add_argument("--json", help="also write the summary to this file")
+    args = parser.parse_args(argv)
+    if not args.url and not args.spawn:
+        parser.error("pass --url or --spawn")
+
+    bodies = make_requests(load_symbols(), args.requests, args.groq_share, args.repeat_share)
+    processes = []
+    scratch = tempfile.TemporaryDirectory(prefix="dreamlens-load-")
+    stub_url = None
+    try:
+        url = args.url
+        if args.spawn:
+            url, stub_url, processes = spawn(args, scratch.name)
+        deadline = time.perf_counter() + (args.duration or float("inf"))
+        if args.rate:
+            results = asyncio.run(run_open(url, bodies, args.rate, args.concurrency, deadline, args.timeout))
+        else:
+            results = asyncio.run(run_closed(url, bodies, args.concurrency, deadline, args.timeout))
+        summary = results.summary()
+        if stub_url:
+            with urllib.request.urlopen(stub_url + "/stub/stats", timeout=5) as r:
+                summary["stub"] = json.load(r)
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            try:
+                process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        scratch.cleanup()
+
+    mode = f"open loop at {args.rate:g} req/s" if args.rate else f"{args.concurrency} concurrent clients"
+    print_report(summary, f"{url} /interpret, {mode}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,68 @@
+"""Show /admin latency staying flat as model.log grows.
+
+Grows a scratch model.log through each --sizes step (MB) and times the
+/admin page, which tails the last 200 lines, against the old approach of
+reading the whole file and splitting it into lines.
+
+    python scripts/log_tail_benchmark.py [--sizes 1 100 1000]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+
+def grow(path: str, target_bytes: int):
+    record = {"ts": "2024-01-01T00:00:00", "level": "info", "component": "groq",
+              "msg": "Groq response received (1843 chars)"}
+    line = (json.dumps(record) + "\n").encode()
+    chunk = line * (4 * 1024 * 1024 // len(line))
+    with open(path, "ab") as f:
+        while f.tell() < target_bytes:
+            f.write(chunk)
+
+
+def best_ms(fn, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def read_all(path: str):
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read().splitlines()[-200:]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 100, 1000], help="log sizes in MB")
+    args = parser.parse_args(argv)
+
+    import app
+
+    with tempfile.TemporaryDirectory(prefix="log-tail-bench-") as scratch:
+        app.LOG_DIR = scratch
+        path = os.path.join(scratch, "model.log")
+        client = app.app.test_client()
+        client.get("/admin")  # template compilation, health snapshot
+        print(f"{'log size':>10}{'/admin ms':>12}{'read-all ms':>14}")
+        for size_mb in sorted(args.sizes):
+            grow(path, size_mb * 1024 * 1024)
+            admin = best_ms(lambda: client.get("/admin"))
+            legacy = best_ms(lambda: read_all(path), repeat=1 if size_mb >= 500 else 3)
+            print(f"{size_mb:>8}MB{admin:>12.2f}{legacy:>14.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+"""Measure what the /interpret timing spans cost relative to a request.
+
+Times the dataset path (the fastest /interpret, so the one where the
+instrumentation weighs most) over real HTTP, either against a running
+server or against app.py served in-process, then times the same Timer
+calls the route makes, including folding them into the histograms.
+
+    python scripts/metrics_overhead.py [--requests 500] [--url http://127.0.0.1:5000]
+"""
+
+import argparse
+import http.client
+import json
+import logging
+import os
+import statistics
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from metrics import Registry  # noqa: E402
+
+DREAM = "I dreamed about a snake in my house"
+
+
+def request_latencies(url: str, count: int) -> list:
+    parts = urlsplit(url)
+    conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=30)
+    body = json.dumps({"dream": DREAM})
+    latencies = []
+    for _ in range(count + 20):
+        started = time.perf_counter()
+        conn.request("POST", "/interpret", body, {"Content-Type": "application/json"})
+        response = conn.getresponse()
+        response.read()
+        latencies.append(time.perf_counter() - started)
+        if response.getheader("Connection", "").lower() == "close" or response.version == 10:
+            conn.close()
+            conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=30)
+    conn.close()
+    return latencies[20:]  # skip warm-up
+
+
+def instrumentation_cost(rounds: int = 100000) -> float:
+    """Seconds per dataset-path request for the Timer calls plus the drain into histograms."""
+    registry = Registry()
+    started = time.perf_counter()
+    for _ in range(rounds):
+        timer = registry.timer()
+        with timer.stage("dataset_match"):
+            pass
+        with timer.stage("history_write"):
+            pass
+        timer.finish("dataset")
+    registry.snapshot()
+    return (time.perf_counter() - started) / rounds
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--url", help="a running server; by default app.py is served in-process")
+    args = parser.parse_args(argv)
+
+    server = None
+    url = args.url
+    if url is None:
+        from werkzeug.serving import make_server
+
+        import app
+
+        app.warm_up()
+        logging.getLogger("werkzeug").setLevel(logging.ERROR)
+        server = make_server("127.0.0.1", 0, app.app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_port}"
+    try:
+        latencies = request_latencies(url, args.requests)
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    median = statistics.median(latencies)
+    cost = instrumentation_cost()
+    print(f"{args.requests} dataset-path requests to {url}")
+    print(f"median request          {median * 1000:>9.3f} ms")
+    print(f"instrumentation/request {cost * 1e6:>9.2f} us")
+    print(f"overhead                {100 * cost / median:>9.2f} %")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,75 @@
+"""Replay the history table through the near-duplicate index and report the hit rate.
+
+Each dream is looked up against the dreams that came before it, then added,
+which is what /interpret would have seen. Exact repeats (same normalized text)
+are counted separately because the interpretation cache already serves them.
+
+    python scripts/near_duplicate_report.py [path/to/history.db] [--threshold 0.8]
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from interpretation_cache import normalize_dream  # noqa: E402
+from near_duplicate import NearDuplicateIndex  # noqa: E402
+
+
+def replay(db_path: str, threshold: float, show: int = 10) -> dict:
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute("SELECT dream, response FROM history ORDER BY rowid").fetchall()
+    conn.close()
+
+    index = NearDuplicateIndex(threshold=threshold)
+    seen = set()
+    exact = near = 0
+    examples = []
+    lookup_time = 0.0
+    for dream, response in rows:
+        if not dream:
+            continue
+        normalized = normalize_dream(dream)
+        if normalized in seen:
+            exact += 1
+        else:
+            started = time.perf_counter()
+            match = index.find(dream)
+            lookup_time += time.perf_counter() - started
+            if match:
+                near += 1
+                if len(examples) < show:
+                    examples.append((dream, match["dream"], match["similarity"]))
+        seen.add(normalized)
+        if response:
+            index.add(dream, response)
+
+    total = len(rows)
+    lookups = max(total - exact, 1)
+    return {
+        "rows": total,
+        "exact_repeats": exact,
+        "near_duplicates": near,
+        "groq_calls_avoided_pct": round(100.0 * near / total, 2) if total else 0.0,
+        "mean_lookup_us": round(1e6 * lookup_time / lookups, 1),
+        "examples": examples,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Near-duplicate hit rate over the history table")
+    parser.add_argument("db", nargs="?", default=os.path.join(os.environ.get("DATA_DIR", "data"), "history.db"))
+    parser.add_argument("--threshold", type=float, default=float(os.environ.get("NEAR_DUP_THRESHOLD", "0.8")))
+    args = parser.parse_args()
+
+    report = replay(args.db, args.threshold)
+    print(f"history rows:          {report['rows']}")
+    print(f"exact repeats (cache): {report['exact_repeats']}")
+    print(f"near duplicates:       {report['near_duplicates']} "
+          f"({report['groq_calls_avoided_pct']}% of requests) at Jaccard >= {args.threshold}")
+    print(f"mean lookup:           {report['mean_lookup_us']} us")
+    for dream, match, score in report["examples"]:
+        print(f"  {score:.2f}  {dream[:60]!r} ~ {match[:60]!r}")
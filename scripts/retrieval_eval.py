@@ -0,0 +1,94 @@
+"""Recall@k of dataset retrieval on a labeled sample of dreams.
+
+Each line of the sample (default benchmarks/retrieval_labels.jsonl) is
+{"dream": ..., "symbols": [...]}, the dataset symbols a reader would accept
+for that dream. Recall@k is the share of dreams with at least one accepted
+symbol in the top k. For the two match engines it also counts dataset hits
+at the app's thresholds (answers that skip Groq) and how many of those hit
+an accepted symbol. "context" is the symbol index that RETRIEVAL=tfidf
+uses for the prompt context.
+
+    python scripts/retrieval_eval.py [--labels PATH] [--k 1 3 5 10]
+"""
+
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+from retrieval import BM25Index  # noqa: E402
+
+LABELS_PATH = os.path.join("benchmarks", "retrieval_labels.jsonl")
+ENGINES = ("bm25", "tfidf", "context")
+
+
+def load_labels(path: str = LABELS_PATH) -> list:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def rankings(engine: str, ds, bm25: BM25Index, dreams: list, k: int) -> list:
+    """The top `k` dataset rows for each dream, best first."""
+    if engine == "bm25":
+        return [rows.tolist() for rows, _ in bm25.top_k(dreams, k)]
+    if engine == "tfidf":
+        sims = (ds.vectorizer.transform([d.lower() for d in dreams]) @ ds.tfidf_matrix.T).toarray()
+        return [[row for row in (-s).argsort(kind="stable")[:k] if s[row] > 0] for s in sims]
+    index = ds.symbol_index
+    return [[index.words.index(r["word"]) for r in index.search(d, k)] for d in dreams]
+
+
+def matches(engine: str, ds, bm25: BM25Index, dreams: list) -> list:
+    """The app's dataset answer (or None) for each dream."""
+    if engine == "bm25":
+        scores = bm25.scores(dreams)
+        return [app.bm25_match(ds, d, scores, i) for i, d in enumerate(dreams)]
+    sims = (ds.vectorizer.transform([d.lower() for d in dreams]) @ ds.tfidf_matrix.T).toarray()
+    return [app.best_match(ds, d.lower(), s) for d, s in zip(dreams, sims)]
+
+
+def evaluate(labels: list, ks=(1, 3, 5, 10)) -> dict:
+    """{engine: {"recall": {k: share}, "hits": n, "correct": n}} over the labeled sample."""
+    ds = app.get_dataset()
+    bm25 = ds.bm25 or BM25Index.from_frame(ds.df)
+    words = [str(w) for w in ds.df["Word"]]
+    dreams = [item["dream"] for item in labels]
+    accepted = [set(item["symbols"]) for item in labels]
+    report = {}
+    for engine in ENGINES:
+        ranked = rankings(engine, ds, bm25, dreams, max(ks))
+        result = {"recall": {
+            k: sum(1 for rows, ok in zip(ranked, accepted) if any(words[r] in ok for r in rows[:k])) / len(labels)
+            for k in ks
+        }}
+        if engine != "context":
+            found = matches(engine, ds, bm25, dreams)
+            result["hits"] = sum(1 for m in found if m)
+            result["correct"] = sum(1 for m, ok in zip(found, accepted) if m and m["symbol"] in ok)
+        report[engine] = result
+    return report
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--labels", default=LABELS_PATH, help="JSON lines of {dream, symbols}")
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 5, 10], help="cutoffs to report")
+    args = parser.parse_args(argv)
+
+    labels = load_labels(args.labels)
+    report = evaluate(labels, tuple(args.k))
+    print(f"{len(labels)} labeled dreams\n")
+    print(f"{'engine':<10}" + "".join(f"{f'recall@{k}':>11}" for k in args.k) + f"{'hits':>8}{'correct':>9}")
+    for engine, result in report.items():
+        line = f"{engine:<10}" + "".join(f"{result['recall'][k]:>11.3f}" for k in args.k)
+        if "hits" in result:
+            line += f"{result['hits']:>8}{result['correct']:>9}"
+        print(line)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
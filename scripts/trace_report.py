@@ -0,0 +1,94 @@
+"""Latency report over request trace files (LOG_DIR/trace.jsonl and its rotations).
+
+Streams every span once, so multi-GB traces are read in constant memory,
+and prints p50/p95/p99 per stage, per meta.method and per hour, mean Groq
+tokens per call by hour and by model, then the slowest requests. For the
+slowest, a second pass over the files adds the per-stage breakdown
+(skipped when reading stdin).
+
+    python scripts/trace_report.py [logs/trace.jsonl logs/trace.jsonl.1 ...] [--top 20]
+    zcat old-traces.gz | python scripts/trace_report.py -
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tracing import TRACE_FILE, TraceReport, read_lines, read_spans  # noqa: E402
+
+STAGE_ORDER = ("dataset_match", "context_search", "reuse_prior", "groq", "history_write", "total")
+
+
+def default_paths() -> list:
+    base = os.path.join(os.environ.get("LOG_DIR", "logs"), TRACE_FILE)
+    rotated = [p for p in glob.glob(base + ".*") if p.rsplit(".", 1)[-1].isdigit()]
+    # Oldest rotation first, so spans are read in roughly chronological order.
+    rotated.sort(key=lambda p: int(p.rsplit(".", 1)[-1]), reverse=True)
+    return rotated + ([base] if os.path.exists(base) else [])
+
+
+def table(title: str, rows) -> list:
+    lines = [f"\n{title:<24}{'count':>10}{'p50 ms':>11}{'p95 ms':>11}{'p99 ms':>11}{'max ms':>11}"]
+    for name, stats in rows:
+        lines.append(f"{name:<24}{stats.count:>10}{stats.percentile(0.5):>11.2f}{stats.percentile(0.95):>11.2f}"
+                     f"{stats.percentile(0.99):>11.2f}{stats.max_ms:>11.2f}")
+    return lines
+
+
+def token_table(title: str, kind: str, report: TraceReport) -> list:
+    rows = sorted((name, stats) for (k, name), stats in report.tokens.items() if k == kind)
+    if not rows:
+        return []
+    lines = [f"\n{title:<24}{'calls':>10}{'prompt':>11}{'complete':>11}{'total':>11}{'est/real':>11}"]
+    for name, stats in rows:
+        ratio = stats.estimate_ratio()
+        lines.append(f"{name:<24}{stats.calls:>10}{stats.mean('prompt'):>11.1f}{stats.mean('completion'):>11.1f}"
+                     f"{stats.mean('prompt') + stats.mean('completion'):>11.1f}"
+                     f"{'-' if ratio is None else f'{ratio:.2f}':>11}")
+    return lines
+
+
+def render(report: TraceReport, breakdown: dict = None) -> str:
+    order = {name: i for i, name in enumerate(STAGE_ORDER)}
+    lines = [f"{report.spans} spans" + (f", {report.skipped} unreadable lines skipped" if report.skipped else "")]
+    lines += table("stage", sorted(report.stages.items(), key=lambda kv: (order.get(kv[0], len(order)), kv[0])))
+    lines += table("method (total)", sorted(report.methods.items()))
+    lines += table("hour UTC (total)", sorted(report.hours.items()))
+    lines += token_table("hour UTC (groq tokens)", "hour", report)
+    lines += token_table("model (groq tokens)", "model", report)
+    lines.append(f"\nslowest {len(report.slowest)} requests")
+    for ms, trace, start, method, model in report.slowest_first():
+        when = datetime.fromtimestamp(start or 0, timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+        line = f"{ms:>10.1f} ms  {when}  {trace}  {method}" + (f" ({model})" if model else "")
+        stages = (breakdown or {}).get(trace)
+        if stages:
+            line += "  " + " ".join(f"{name}={ms:.1f}" for name, ms in stages.items() if ms is not None)
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("paths", nargs="*", help="trace files (.gz ok, - for stdin); default LOG_DIR/trace.jsonl*")
+    parser.add_argument("--top", type=int, default=20, help="how many of the slowest requests to list")
+    parser.add_argument("--route", help="only spans of this route (interpret, interpret_stream)")
+    args = parser.parse_args(argv)
+
+    paths = args.paths or default_paths()
+    if not paths:
+        parser.error("no trace files found; pass paths explicitly")
+    started = time.perf_counter()
+    report = TraceReport(top=args.top, route=args.route).feed(read_spans(paths))
+    breakdown = None if "-" in paths else report.breakdown(read_lines(paths))
+    print(render(report, breakdown))
+    print(f"\nread in {time.perf_counter() - started:.1f} s", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
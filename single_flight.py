@@ -0,0 +1,139 @@
+"""
+DREAMLENS AI - Single Flight
+Coalesces identical in-flight Groq requests. Within a worker, concurrent
+callers with the same key wait on one upstream call and share its result.
+Across workers, the leader holds a striped lock file while it calls Groq, so
+another worker's leader for the same key waits and then finds the answer in
+the shared interpretation cache.
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process coalescing only
+    fcntl = None
+
+LOCK_STRIPES = 4096
+
+
+class _Call:
+    __slots__ = ("event", "result", "error", "followers")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.followers = 0
+
+
+class SingleFlight:
+    """Per-key deduplication of concurrent calls within a process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._counters = {"leaders": 0, "coalesced": 0, "follower_timeouts": 0, "leader_abandoned": 0,
+                          "cross_worker_waits": 0, "cross_worker_reused": 0}
+
+    def join(self, key: str):
+        """Return (call, is_leader). The leader must call `finish()` exactly once."""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.followers += 1
+                self._counters["coalesced"] += 1
+                return call, False
+            call = _Call()
+            self._calls[key] = call
+            self._counters["leaders"] += 1
+            return call, True
+
+    def finish(self, key: str, call: _Call, result=None, error: BaseException = None):
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+        call.result = result
+        call.error = error
+        call.event.set()
+
+    def wait(self, call: _Call, timeout: float = None):
+        """Block until the leader finishes; returns None if `timeout` passes first."""
+        if not call.event.wait(timeout):
+            self.count("follower_timeouts")
+            return None
+        if call.error is not None:
+            raise call.error
+        if call.result is None:
+            # The leader was abandoned (e.g. a streaming client disconnected).
+            self.count("leader_abandoned")
+            return None
+        return dict(call.result) if isinstance(call.result, dict) else call.result
+
+    def do(self, key: str, fn, timeout: float = None):
+        """Run `fn()` once for all concurrent callers of `key` and share the result."""
+        call, leader = self.join(key)
+        if not leader:
+            result = self.wait(call, timeout)
+            if result is not None:
+                return result
+            return fn()
+        try:
+            result = fn()
+        except BaseException as e:
+            self.finish(key, call, error=e)
+            raise
+        self.finish(key, call, result=result)
+        return result
+
+    def count(self, name: str, amount: int = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+            counters["in_flight"] = len(self._calls)
+        return counters
+
+
+@contextmanager
+def worker_lock(lock_dir: str, key: str, timeout: float, poll: float = 0.05):
+    """Cross-process lock for `key` using one of LOCK_STRIPES lock files.
+
+    Yields True if the lock had to be waited for (another worker held it),
+    False otherwise. Gives up waiting after `timeout` seconds and proceeds
+    unlocked rather than failing the request. No-op without fcntl.
+    """
+    if fcntl is None or not lock_dir:
+        yield False
+        return
+    stripe = int(key[:8], 16) % LOCK_STRIPES
+    try:
+        os.makedirs(lock_dir, exist_ok=True)
+        fd = os.open(os.path.join(lock_dir, f"{stripe:04x}.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+    except OSError:
+        # Read-only or missing data dir: coalesce within the worker only.
+        yield False
+        return
+    locked = waited = False
+    try:
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                locked = True
+                break
+            except BlockingIOError:
+                waited = True
+                if time.monotonic() >= deadline:
+                    break
+                time.sleep(poll)
+        yield waited
+    finally:
+        if locked:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
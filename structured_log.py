@@ -0,0 +1,229 @@
+"""
+DREAMLENS AI - Structured Log
+Buffered JSON-lines writer shared by every module in a process, plus a
+reverse-seek tail reader.
+
+Records are buffered in memory and written by one write() per flush (when
+the buffer fills, on a short interval from a background thread, and at
+exit). The file rotates by size and at UTC midnight into path.1 ... path.N.
+Rotation and writes take a lock file, so gunicorn workers appending to the
+same log never rotate it twice or write into a file another worker just
+renamed.
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+try:
+    import fcntl
+except ImportError:  # Windows: rotation is then only safe with a single process
+    fcntl = None
+
+LOG_MAX_BYTES = int(os.environ.get("LOG_MAX_BYTES", str(50 * 1024 * 1024)))
+LOG_BACKUPS = int(os.environ.get("LOG_BACKUPS", "5"))
+LOG_FLUSH_INTERVAL = float(os.environ.get("LOG_FLUSH_INTERVAL", "1.0"))
+LOG_ROTATE_DAILY = os.environ.get("LOG_ROTATE_DAILY", "on").strip().lower() not in ("0", "off", "false", "no")
+
+
+@contextmanager
+def _file_lock(path: str):
+    if fcntl is None:
+        yield
+        return
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+
+class JsonLinesWriter:
+    """Thread-safe, buffered, rotating JSON-lines file."""
+
+    def __init__(self, path: str, max_bytes: int = LOG_MAX_BYTES, backups: int = LOG_BACKUPS,
+                 flush_interval: float = LOG_FLUSH_INTERVAL, buffer_bytes: int = 64 * 1024,
+                 rotate_daily: bool = LOG_ROTATE_DAILY):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.flush_interval = flush_interval
+        self.buffer_bytes = buffer_bytes
+        self.rotate_daily = rotate_daily
+        self._lock = threading.Lock()
+        self._buffer = []
+        self._buffered = 0
+        self._fd = None
+        self._pid = None
+        self._flusher = None
+        atexit.register(self.flush)
+
+    def write(self, record: dict):
+        """Queue one record; it reaches the file within `flush_interval` seconds."""
+        self.write_many((record,))
+
+    def write_many(self, records):
+        """Queue several records at once; they are written together, in order."""
+        self.write_lines("".join(json.dumps(record, ensure_ascii=False, default=str) + "\n" for record in records))
+
+    def write_lines(self, lines: str):
+        """Queue already-serialized JSON lines (each ending in a newline)."""
+        flush_now = False
+        with self._lock:
+            if self._pid != os.getpid():
+                self._start_in_process()
+            self._buffer.append(lines)
+            self._buffered += len(lines)
+            flush_now = self._buffered >= self.buffer_bytes or self.flush_interval <= 0
+        if flush_now:
+            self.flush()
+
+    def _start_in_process(self):
+        # First write in this process. A forked worker drops the parent's buffer
+        # (the parent flushes it) and file descriptor, and needs its own flusher.
+        self._buffer, self._buffered = [], 0
+        self._fd = None
+        self._pid = os.getpid()
+        if self.flush_interval > 0:
+            self._flusher = threading.Thread(target=self._flush_loop, name="log-flusher", daemon=True)
+            self._flusher.start()
+
+    def _flush_loop(self):
+        pid = os.getpid()
+        while self._pid == pid:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            if not self._buffer or self._pid != os.getpid():
+                return
+            data = "".join(self._buffer).encode("utf-8")
+            self._buffer, self._buffered = [], 0
+            try:
+                self._write(data)
+            except OSError as e:
+                # Best-effort logging: a read-only or full disk must not break requests.
+                print(f"LOG FAIL ({e}): {data[:200]!r}")
+
+    def _write(self, data: bytes):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with _file_lock(self.path + ".lock"):
+            self._reopen_if_moved()
+            size = os.fstat(self._fd).st_size
+            if size and (size + len(data) > self.max_bytes or self._from_earlier_day()):
+                self._rotate()
+            os.write(self._fd, data)
+
+    def _reopen_if_moved(self):
+        # Another worker may have rotated the file away from under our descriptor.
+        try:
+            current = os.stat(self.path).st_ino
+        except FileNotFoundError:
+            current = None
+        if self._fd is not None and current == os.fstat(self._fd).st_ino:
+            return
+        if self._fd is not None:
+            os.close(self._fd)
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+    def _from_earlier_day(self) -> bool:
+        if not self.rotate_daily:
+            return False
+        modified = datetime.fromtimestamp(os.fstat(self._fd).st_mtime, timezone.utc).date()
+        return modified < datetime.now(timezone.utc).date()
+
+    def _rotate(self):
+        for n in range(self.backups - 1, 0, -1):
+            older = f"{self.path}.{n}"
+            if os.path.exists(older):
+                os.replace(older, f"{self.path}.{n + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.truncate(self.path, 0)
+        os.close(self._fd)
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def get_writer(path: str, **options) -> JsonLinesWriter:
+    """The process-wide writer for `path`, so every module shares one buffer per file.
+
+    `options` (JsonLinesWriter arguments) apply when the writer is created.
+    """
+    path = os.path.abspath(path)
+    writer = _writers.get(path)
+    if writer is None:
+        with _writers_lock:
+            writer = _writers.get(path)
+            if writer is None:
+                writer = _writers[path] = JsonLinesWriter(path, **options)
+    return writer
+
+
+def log_event(log_dir: str, component: str, msg: str, level: str = "info", **fields):
+    """Append one record to LOG_DIR/model.log."""
+    record = {"ts": datetime.utcnow().isoformat(), "level": level, "component": component, "msg": msg}
+    record.update(fields)
+    get_writer(os.path.join(log_dir, "model.log")).write(record)
+
+
+# --------------- Reading ---------------
+
+def _tail_file(path: str, n: int, block: int = 64 * 1024) -> list:
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        data = b""
+        # Read backwards until the chunk holds more than n line breaks.
+        while pos > 0 and data.count(b"\n") <= n:
+            step = min(block, pos)
+            pos -= step
+            f.seek(pos)
+            data = f.read(step) + data
+    lines = data.splitlines()
+    if pos > 0:
+        lines = lines[1:]  # the first line may be cut mid-way
+    return [line.decode("utf-8", "replace") for line in lines[-n:]]
+
+
+def tail_lines(path: str, n: int = 200) -> list:
+    """The last `n` lines of `path`, continuing into path.1 after a recent rotation.
+
+    Cost depends on `n` and line length, not on the size of the file.
+    """
+    lines = []
+    for candidate in (path, f"{path}.1"):
+        if len(lines) >= n:
+            break
+        try:
+            lines = _tail_file(candidate, n - len(lines)) + lines
+        except FileNotFoundError:
+            continue
+    return lines
+
+
+def format_line(line: str) -> str:
+    """Render a JSON log record as `ts [component] msg`; other lines pass through."""
+    if not line.startswith("{"):
+        return line
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return line
+    text = f"{record.get('ts', '')} [{record.get('component', '-')}] {record.get('msg', '')}"
+    if record.get("level", "info") != "info":
+        text += f" ({record['level']})"
+    return text
@@ -0,0 +1,107 @@
+"""
+DREAMLENS AI - Symbol Index
+Inverted index over the dataset's `Word` column, built once at load time so
+the per-request context search never scans every row.
+
+A dream word `w` matches a row symbol `word` when `w in word or word in w`:
+
+* `w in word`  -> looked up in a map of every substring of every symbol.
+* `word in w`  -> every substring of `w` is looked up in the exact-symbol map.
+"""
+
+from collections import defaultdict
+from functools import lru_cache
+
+import numpy as np
+
+
+class SymbolIndex:
+    """Substring-aware symbol -> row id index."""
+
+    def __init__(self, words, interpretations):
+        self.words = [str(w) for w in words]
+        self.interpretations = [str(i) for i in interpretations]
+        self._exact = defaultdict(list)
+        self._substrings = defaultdict(list)
+        self._max_len = 0
+
+        for row_id, word in enumerate(self.words):
+            key = word.lower()
+            self._exact[key].append(row_id)
+            self._max_len = max(self._max_len, len(key))
+            seen = set()
+            for i in range(len(key)):
+                for j in range(i + 1, len(key) + 1):
+                    sub = key[i:j]
+                    if sub not in seen:
+                        seen.add(sub)
+                        self._substrings[sub].append(row_id)
+
+        self._exact = dict(self._exact)
+        self._substrings = dict(self._substrings)
+        # Dream vocabulary is small and repetitive, so memoize per-word row sets.
+        self._rows_cached = lru_cache(maxsize=4096)(self._rows_for)
+
+    @classmethod
+    def from_frame(cls, df):
+        """Build the index from a DataFrame with `Word` and `Interpretation` columns."""
+        if df is None or df.empty:
+            return cls([], [])
+        return cls(df["Word"].tolist(), df["Interpretation"].tolist())
+
+    def __len__(self):
+        return len(self.words)
+
+    def _rows_for(self, w: str) -> np.ndarray:
+        """Row ids whose symbol contains `w` or is contained in `w`."""
+        rows = set(self._substrings.get(w, ()))
+        # Symbols longer than the index's longest entry cannot be substrings of `w`.
+        limit = min(len(w), self._max_len)
+        rows.update(self._exact.get("", ()))
+        for i in range(len(w)):
+            for j in range(i + 1, min(len(w), i + limit) + 1):
+                hit = self._exact.get(w[i:j])
+                if hit:
+                    rows.update(hit)
+        return np.fromiter(rows, dtype=np.intp, count=len(rows))
+
+    def rows_for_symbol(self, symbol: str) -> list:
+        """Row ids whose symbol equals `symbol` (case-insensitive)."""
+        return list(self._exact.get(symbol.lower(), ()))
+
+    def search(self, dream_text: str, limit: int = 3, priority=()) -> list:
+        """Return the top `limit` rows as dicts with word, interpretation and relevance.
+
+        Ordering matches a stable sort on relevance over dataset order. Rows
+        whose symbol is listed in `priority` (e.g. phrase hits from the symbol
+        matcher) are ranked ahead of everything else, in the order given.
+        """
+        if not self.words:
+            return []
+        counts = np.zeros(len(self.words), dtype=np.int64)
+        for w in dream_text.lower().split():
+            counts[self._rows_cached(w)] += 1
+        ranked = [row for row in np.argsort(-counts, kind="stable")[:limit] if counts[row] > 0]
+        if priority:
+            pinned = [row for symbol in priority for row in self.rows_for_symbol(symbol)]
+            pinned = list(dict.fromkeys(pinned))
+            ranked = (pinned + [row for row in ranked if row not in pinned])[:limit]
+        return [
+            {
+                "word": self.words[row_id],
+                "interpretation": self.interpretations[row_id][:150],
+                "relevance": int(counts[row_id]),
+            }
+            for row_id in ranked
+        ]
+
+    def context(self, dream_text: str, limit: int = 3, priority=()) -> str:
+        """Format the top matches as the prompt context block sent to Groq."""
+        return "\n".join(
+            f"- {r['word']}: {r['interpretation']}..."
+            for r in self.search(dream_text, limit, priority=priority)
+        )
+
+    def context_for_rows(self, rows) -> str:
+        """The same context block for rows ranked elsewhere (e.g. by retrieval.BM25Index)."""
+        return "\n".join(f"- {self.words[row]}: {self.interpretations[row][:150]}..." for row in rows)
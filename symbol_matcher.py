@@ -0,0 +1,144 @@
+"""
+DREAMLENS AI - Symbol Matcher
+Aho-Corasick automaton over every `Word` entry of the dream datasets, so
+multi-word symbols ("job interview", "black magic") are found in a single
+linear pass over the dream text.
+"""
+
+import csv
+from collections import deque, namedtuple
+
+DATASET_PATHS = (
+    "project/cleaned_dream_interpretations.csv",
+    "project/dream_interpretations_10k.csv",
+)
+
+SymbolHit = namedtuple("SymbolHit", ["start", "end", "symbol", "sources"])
+
+
+class SymbolMatcher:
+    """Compiled multi-pattern matcher; patterns are matched case-insensitively."""
+
+    def __init__(self, symbols=()):
+        # Trie stored as parallel lists indexed by state id; state 0 is the root.
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+        self._sources = {}
+        for symbol in symbols:
+            self.add(symbol)
+        self._built = False
+
+    @classmethod
+    def from_csv(cls, paths=DATASET_PATHS):
+        """Build a matcher from the `Word` column of each dataset CSV that exists."""
+        matcher = cls()
+        for path in paths:
+            try:
+                with open(path, "r", encoding="utf-8", newline="") as f:
+                    for row in csv.DictReader(f):
+                        word = (row.get("Word") or "").strip()
+                        if word:
+                            matcher.add(word, source=path)
+            except (OSError, csv.Error) as e:
+                print(f"Symbol matcher skipped {path}: {e}")
+        return matcher.build()
+
+    @classmethod
+    def from_frame(cls, df, min_words: int = 1, source: str = None):
+        """Build a matcher from a loaded dataset's `Word` column, keeping symbols of at least `min_words` words."""
+        matcher = cls()
+        for word in df["Word"].astype(str).str.strip():
+            if word and len(word.split()) >= min_words:
+                matcher.add(word, source=source)
+        return matcher.build()
+
+    def __len__(self):
+        return len(self._sources)
+
+    def __contains__(self, symbol):
+        return symbol.lower() in self._sources
+
+    def add(self, symbol: str, source: str = None):
+        """Insert a pattern; call `build()` again before matching."""
+        key = symbol.lower()
+        if not key:
+            return self
+        if key not in self._sources:
+            state = 0
+            for ch in key:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                state = nxt
+            self._out[state].append(key)
+            self._sources[key] = []
+        if source and source not in self._sources[key]:
+            self._sources[key].append(source)
+        self._built = False
+        return self
+
+    def build(self):
+        """Compute failure links breadth-first and merge output sets."""
+        queue = deque()
+        for nxt in self._goto[0].values():
+            self._fail[nxt] = 0
+            queue.append(nxt)
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[nxt] = self._goto[fallback].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + [
+                    p for p in self._out[self._fail[nxt]] if p not in self._out[nxt]
+                ]
+        self._built = True
+        return self
+
+    def iter_hits(self, text: str, whole_words: bool = True):
+        """Yield a SymbolHit for every pattern occurrence in `text`.
+
+        Offsets index into `text.lower()`. With `whole_words`, hits must start
+        and end on a word boundary so "ant" does not fire inside "elephant".
+        """
+        if not self._built:
+            self.build()
+        lowered = text.lower()
+        state = 0
+        for pos, ch in enumerate(lowered):
+            while state and ch not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(ch, 0)
+            for symbol in self._out[state]:
+                start = pos - len(symbol) + 1
+                end = pos + 1
+                if whole_words and not _on_boundary(lowered, start, end):
+                    continue
+                yield SymbolHit(start, end, symbol, tuple(self._sources[symbol]))
+
+    def find_all(self, text: str, whole_words: bool = True) -> list:
+        """Return all hits ordered by end offset, longest first on ties."""
+        return list(self.iter_hits(text, whole_words=whole_words))
+
+    def symbols(self, text: str, whole_words: bool = True, source: str = None) -> list:
+        """Distinct matched symbols in order of first appearance."""
+        seen = []
+        for hit in sorted(self.iter_hits(text, whole_words=whole_words)):
+            if source and source not in hit.sources:
+                continue
+            if hit.symbol not in seen:
+                seen.append(hit.symbol)
+        return seen
+
+
+def _on_boundary(text: str, start: int, end: int) -> bool:
+    before = text[start - 1] if start > 0 else " "
+    after = text[end] if end < len(text) else " "
+    return not before.isalnum() and not after.isalnum()
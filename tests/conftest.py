@@ -0,0 +1,23 @@
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# app.py resolves the dataset relative to the working directory and creates its
+# log/data folders at import, so point those at a scratch dir before any import.
+_SCRATCH = tempfile.mkdtemp(prefix="dreamlens-tests-")
+os.environ.setdefault("DATA_DIR", os.path.join(_SCRATCH, "data"))
+os.environ.setdefault("LOG_DIR", os.path.join(_SCRATCH, "logs"))
+# Tests drive hundreds of requests from one address; tests/test_admission.py
+# turns the per-client limit and the Groq slot cap back on where it needs them.
+os.environ.setdefault("RATE_LIMIT_PER_MINUTE", "0")
+os.environ.setdefault("GROQ_CONCURRENCY", "0")
+# Pin every request to GROQ_MODEL; tests/test_routing.py covers the tiers.
+os.environ.setdefault("GROQ_ROUTING", "off")
+os.chdir(ROOT)
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+# tests/test_interpret.py is a manual script that posts to a running server.
+collect_ignore = ["test_interpret.py"]
@@ -0,0 +1,19 @@
+"""scripts/groq_stub_server.py set up for tests: a fixed reply, instant output, every request recorded."""
+
+from scripts.groq_stub_server import StubGroq, serve
+
+
+class GroqStub(StubGroq):
+    def __init__(self, reply="A calm, reflective interpretation.", model="llama-3.3-70b-versatile", delay=0.0):
+        super().__init__(model=model, latency=f"fixed:{delay}", tokens_per_sec=0, reply=reply, record=True)
+        self.server = None
+        self.url = None
+
+    def __enter__(self):
+        self.server = serve(self)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,179 @@
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+
+import app
+import groq_client
+import metrics
+from admission import BATCH, INTERACTIVE, ClientBuckets, ConcurrencyGate, client_key
+from groq_stub import GroqStub
+from single_flight import SingleFlight
+
+
+def test_bucket_allows_a_burst_then_refills(tmp_path):
+    buckets = ClientBuckets(str(tmp_path / "rate_limit.db"), per_minute=60, burst=3)
+    now = 1_760_000_000.0
+    assert [buckets.take("ip:1.2.3.4", now) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert buckets.take("ip:1.2.3.4", now) == pytest.approx(1.0)
+    assert buckets.take("ip:5.6.7.8", now) == 0.0
+    assert buckets.take("ip:1.2.3.4", now + 0.5) == pytest.approx(0.5)
+    assert buckets.take("ip:1.2.3.4", now + 1.0) == 0.0
+
+
+def test_buckets_are_shared_through_the_file(tmp_path):
+    path = str(tmp_path / "rate_limit.db")
+    worker_a, worker_b = ClientBuckets(path, 60, 2), ClientBuckets(path, 60, 2)
+    now = 1_760_000_000.0
+    assert worker_a.take("ip:1.2.3.4", now) == 0.0
+    assert worker_b.take("ip:1.2.3.4", now) == 0.0
+    assert worker_a.take("ip:1.2.3.4", now) > 0
+    worker_a.close()
+    worker_b.close()
+
+
+def test_client_key_hashes_api_keys():
+    assert client_key("secret-key", "10.0.0.1").startswith("key:")
+    assert "secret" not in client_key("secret-key")
+    assert client_key(None, "10.0.0.1") == "ip:10.0.0.1"
+
+
+def test_slots_are_shared_across_gates_on_one_directory(tmp_path):
+    worker_a = ConcurrencyGate(1, str(tmp_path / "slots"))
+    worker_b = ConcurrencyGate(1, str(tmp_path / "slots"))
+    slot = worker_a.acquire(timeout=0)
+    assert slot is not None
+    assert worker_b.acquire(timeout=0.05) is None
+    worker_a.release(slot)
+    slot = worker_b.acquire(timeout=0.05)
+    assert slot is not None
+    worker_b.release(slot)
+    assert worker_b.stats()["timed_out"] == 1
+
+
+def test_interactive_waiters_go_before_batch(tmp_path):
+    gate = ConcurrencyGate(1, str(tmp_path / "slots"), poll=0.005)
+    held = gate.acquire()
+    order = []
+
+    def wait(priority, name):
+        slot = gate.acquire(priority, timeout=5)
+        order.append(name)
+        gate.release(slot)
+
+    threads = [threading.Thread(target=wait, args=(BATCH, "batch"))]
+    threads[0].start()
+    while gate.stats()["waiting"] < 1:
+        time.sleep(0.001)
+    threads.append(threading.Thread(target=wait, args=(INTERACTIVE, "chat")))
+    threads[1].start()
+    while gate.stats()["waiting"] < 2:
+        time.sleep(0.001)
+    gate.release(held)
+    for t in threads:
+        t.join()
+    assert order == ["chat", "batch"]
+
+
+def test_full_queue_sheds_at_once(tmp_path):
+    gate = ConcurrencyGate(1, str(tmp_path / "slots"), queue_max=0)
+    held = gate.acquire()
+    started = time.perf_counter()
+    assert gate.acquire(timeout=5) is None
+    assert time.perf_counter() - started < 0.1
+    assert asyncio.run(gate.acquire_async(timeout=5)) is None
+    assert gate.stats()["queue_full"] == 2
+    gate.release(held)
+
+
+@pytest.fixture()
+def stub(monkeypatch, tmp_path):
+    with GroqStub(reply="Your mind may be exploring freedom and change.") as server:
+        monkeypatch.setattr(groq_client, "GROQ_API_KEY", "test-key")
+        monkeypatch.setattr(groq_client, "GROQ_BASE_URL", server.url)
+        monkeypatch.setattr(groq_client, "CACHE_PATH", str(tmp_path / "cache.db"))
+        monkeypatch.setattr(groq_client, "_flights", SingleFlight())
+        monkeypatch.setattr(app, "DATA_DIR", str(tmp_path / "data"))
+        monkeypatch.setattr(app, "NEAR_DUPLICATES", False)
+        monkeypatch.setattr(app, "RATE_LIMIT_PER_MINUTE", 6)
+        monkeypatch.setattr(app, "RATE_LIMIT_BURST", 2)
+        monkeypatch.setattr(app, "_rate_limiter", None)
+        groq_client.reset_client()
+        yield server
+    groq_client.reset_client()
+
+
+def unmatched(i):
+    return {"dream": f"glorp vimble {i} zanthor quibbled", "force_model": True}
+
+
+def limited():
+    for n, l, value in metrics.REGISTRY.collect()["counters"]:
+        if n == "dreamlens_rate_limited_total" and l == [["route", "interpret"]]:
+            return value
+    return 0
+
+
+def test_client_over_its_limit_gets_429_with_retry_after(stub):
+    client = app.app.test_client()
+    before = limited()
+    assert [client.post("/interpret", json=unmatched(i)).status_code for i in range(2)] == [200, 200]
+    resp = client.post("/interpret", json=unmatched(2))
+    assert resp.status_code == 429
+    # One token per 10 s at 6 per minute.
+    assert 1 <= int(resp.headers["Retry-After"]) <= 10
+    assert resp.get_json()["retry_after"] == int(resp.headers["Retry-After"])
+    assert limited() == before + 1
+
+    # Dataset answers don't touch Groq, so they aren't limited; other clients have their own bucket.
+    assert client.post("/interpret", json={"dream": "I dreamed about a snake in my house"}).status_code == 200
+    assert client.post("/interpret", json=unmatched(3), headers={"X-API-Key": "other"}).status_code == 200
+    assert client.post("/interpret/stream", json=unmatched(4)).status_code == 429
+
+
+def test_forwarded_clients_get_their_own_bucket_behind_a_trusted_proxy(stub, monkeypatch):
+    client = app.app.test_client()
+    proxy = {"REMOTE_ADDR": "10.0.0.2"}
+
+    def post(i, forwarded):
+        return client.post("/interpret", json=unmatched(i), environ_base=proxy,
+                           headers={"X-Forwarded-For": forwarded}).status_code
+
+    # Untrusted, the header is ignored: everyone behind the proxy shares its bucket.
+    assert [post(i, f"203.0.113.{i}") for i in range(3)] == [200, 200, 429]
+    monkeypatch.setattr(app, "TRUSTED_PROXIES", 1)
+    assert [post(3 + i, f"198.51.100.7, 203.0.113.{10 + i}") for i in range(3)] == [200, 200, 200]
+    # Entries left of the trusted hop are client-written, so spoofing them doesn't buy a new bucket.
+    assert [post(6 + i, f"192.0.2.{i}, 203.0.113.10") for i in range(2)] == [200, 429]
+    assert app.client_address("10.0.0.2", "203.0.113.5") == "203.0.113.5"
+    monkeypatch.setattr(app, "TRUSTED_PROXIES", 2)
+    assert app.client_address("10.0.0.2", "203.0.113.5") == "10.0.0.2"
+
+
+def test_asgi_route_is_limited_per_client(stub):
+    from test_asgi import call
+
+    statuses = [asyncio.run(call("POST", "/interpret", unmatched(i)))[0] for i in range(3)]
+    assert statuses == [200, 200, 429]
+    status, headers, chunks = asyncio.run(call("POST", "/interpret/batch", {"dreams": [unmatched(9)["dream"]]}))
+    assert status == 429
+    assert 1 <= int(headers[b"retry-after"]) <= 10
+
+
+def test_saturated_gate_degrades_to_fallback(stub, monkeypatch, tmp_path):
+    gate = ConcurrencyGate(1, str(tmp_path / "slots"), queue_max=4)
+    monkeypatch.setattr(groq_client, "_gate", gate)
+    monkeypatch.setattr(groq_client, "GROQ_DEADLINE", 0.3)
+    held = gate.acquire()
+    try:
+        started = time.perf_counter()
+        body = app.app.test_client().post("/interpret", json=unmatched(0)).get_json()
+        assert time.perf_counter() - started < 1.5
+    finally:
+        gate.release(held)
+    assert body["meta"]["method"] == "fallback"
+    assert body["meta"]["groq_error"] == groq_client.SHED_ERROR
+    assert json.loads(app.app.test_client().get("/_admission_stats").data)["timed_out"] == 1
+    assert stub.requests == []
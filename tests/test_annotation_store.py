@@ -0,0 +1,99 @@
+import csv
+import io
+import sqlite3
+import threading
+
+import pytest
+
+import app
+from annotation_store import AnnotationStore
+
+
+@pytest.fixture()
+def store(tmp_path):
+    return AnnotationStore(str(tmp_path / "annotations.db"))
+
+
+def test_recent_is_newest_first_and_bounded(store):
+    for i in range(50):
+        store.add(f"dream {i}", ["fear"] if i % 2 else ["joy"], f"note {i}")
+    recent = store.recent(5)
+    assert [r["dream"] for r in recent] == ["dream 49", "dream 48", "dream 47", "dream 46", "dream 45"]
+    older = store.recent(5, before=recent[-1]["id"])
+    assert older[0]["dream"] == "dream 44"
+
+
+def test_label_filter_uses_label_index(store):
+    store.add("a", ["fear", "water"])
+    store.add("b", ["joy"])
+    store.add("c", ["water"])
+    assert [r["dream"] for r in store.recent(10, label="water")] == ["c", "a"]
+    assert store.recent(10, label="water")[1]["labels"] == ["fear", "water"]
+
+    plan = " ".join(row[3] for row in store._conn().execute(
+        "EXPLAIN QUERY PLAN SELECT annotation_id FROM annotation_labels WHERE label = ? "
+        "ORDER BY annotation_id DESC LIMIT 20", ("water",)))
+    assert "USING PRIMARY KEY" in plan and "TEMP B-TREE" not in plan
+
+
+def test_csv_is_imported_once(store, tmp_path):
+    legacy = tmp_path / "annotations.csv"
+    with open(legacy, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["2024-01-01T00:00:00", "flying, over \"the\" city", "freedom|joy", "first"])
+        writer.writerow(["2024-01-02T00:00:00", "a snake", "", ""])
+        writer.writerow(["2024-01-03T00:00:00", "", "fear", "skipped: no dream"])
+    assert store.import_csv(str(legacy)) == 2
+    assert store.import_csv(str(legacy)) == 0
+    assert AnnotationStore(store.path).import_csv(str(legacy)) == 0
+    rows = store.recent(10)
+    assert [r["dream"] for r in rows] == ["a snake", 'flying, over "the" city']
+    assert rows[1]["labels"] == ["freedom", "joy"] and rows[1]["ts"] == "2024-01-01T00:00:00"
+    assert [r["dream"] for r in store.recent(10, label="joy")] == ['flying, over "the" city']
+
+
+def test_export_streams_every_row(store):
+    for i in range(1200):
+        store.add(f"dream {i}", ["sleep"], "")
+    chunks = list(store.export_csv())
+    assert len(chunks) > 2
+    rows = list(csv.reader(io.StringIO("".join(chunks))))
+    assert rows[0] == ["ts", "dream", "labels", "note"]
+    assert [r[1] for r in rows[1:]] == [f"dream {i}" for i in range(1200)]
+    assert sum(1 for _ in store.export_rows(label="none")) == 0
+
+
+def test_concurrent_adds_from_threads(store):
+    def writer(n):
+        for i in range(50):
+            store.add(f"dream {n}-{i}", ["x"])
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    conn = sqlite3.connect(store.path)
+    assert conn.execute("SELECT COUNT(*) FROM annotations").fetchone()[0] == 400
+    assert conn.execute("SELECT COUNT(*) FROM annotation_labels").fetchone()[0] == 400
+    conn.close()
+
+
+def test_annotation_routes(tmp_path, monkeypatch):
+    legacy = tmp_path / "annotations.csv"
+    legacy.write_text("2024-01-01T00:00:00,an old dream,fear,\n", encoding="utf-8")
+    monkeypatch.setattr(app, "ANNOTATION_DB", str(tmp_path / "annotations.db"))
+    monkeypatch.setattr(app, "ANNOTATION_FILE", str(legacy))
+    client = app.app.test_client()
+
+    assert client.post("/annotations", json={"dream": "  "}).status_code == 400
+    created = client.post("/annotations", json={"dream": "a new dream", "labels": ["joy"], "note": "n"})
+    assert created.get_json()["success"]
+    recent = client.get("/annotations/recent").get_json()["recent"]
+    assert [r["dream"] for r in recent] == ["a new dream", "an old dream"]
+    assert [r["dream"] for r in client.get("/annotations/recent?label=fear").get_json()["recent"]] == ["an old dream"]
+
+    resp = client.get("/annotations/export")
+    assert resp.mimetype == "text/csv"
+    assert resp.get_data(as_text=True).splitlines()[1:] == [
+        "2024-01-01T00:00:00,an old dream,fear,", recent[0]["ts"] + ",a new dream,joy,n"]
@@ -0,0 +1,204 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import pytest
+
+import app
+import asgi
+import groq_client
+from groq_stub import GroqStub
+from scripts.groq_stub_server import parse_latency
+from single_flight import SingleFlight
+
+
+async def call(method, path, payload=None, headers=()):
+    """Drive asgi.app in-process; returns (status, headers, [body chunks])."""
+    body = json.dumps(payload).encode() if payload is not None else b""
+    scope = {
+        "type": "http", "http_version": "1.1", "method": method, "path": path, "root_path": "",
+        "scheme": "http", "query_string": b"", "server": ("testserver", 80), "client": ("127.0.0.1", 5000),
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()),
+                    *headers],
+    }
+    received = False
+
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await asyncio.Event().wait()
+
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    await asgi.app(scope, receive, send)
+    start = messages[0]
+    chunks = [m.get("body", b"") for m in messages[1:]]
+    return start["status"], dict(start["headers"]), chunks
+
+
+def post_json(path, payload):
+    status, _, chunks = asyncio.run(call("POST", path, payload))
+    return status, json.loads(b"".join(chunks))
+
+
+def history_count():
+    app.get_history().flush()
+    conn = sqlite3.connect(os.path.join(app.DATA_DIR, "history.db"))
+    try:
+        return conn.execute("SELECT COUNT(*) FROM history").fetchone()[0]
+    finally:
+        conn.close()
+
+
+@pytest.fixture()
+def stub(monkeypatch, tmp_path):
+    with GroqStub(reply="Your mind may be exploring freedom and change.", delay=0.5) as server:
+        monkeypatch.setattr(groq_client, "GROQ_API_KEY", "test-key")
+        monkeypatch.setattr(groq_client, "GROQ_BASE_URL", server.url)
+        monkeypatch.setattr(groq_client, "CACHE_PATH", str(tmp_path / "cache.db"))
+        monkeypatch.setattr(groq_client, "_flights", SingleFlight())
+        monkeypatch.setattr(app, "DATA_DIR", str(tmp_path / "data"))
+        monkeypatch.setattr(app, "NEAR_DUPLICATES", False)
+        groq_client.reset_client()
+        yield server
+    groq_client.reset_client()
+
+
+def completions(stub):
+    return [r for r in stub.requests if r[0] == "POST"]
+
+
+def test_dataset_match_matches_flask_route():
+    dream = "I dreamed about a snake in my house"
+    trace = "asgi-flask-parity"
+    expected = app.app.test_client().post(
+        "/interpret", json={"dream": dream}, headers={"X-Trace-Id": trace}).get_json()
+    status, headers, chunks = asyncio.run(
+        call("POST", "/interpret", {"dream": dream}, [(b"x-trace-id", trace.encode())]))
+    payload = json.loads(b"".join(chunks))
+    assert status == 200
+    assert payload == expected
+    assert payload["meta"]["method"] == "dataset"
+    assert headers[b"x-trace-id"] == trace.encode()
+
+
+def test_empty_dream_is_rejected():
+    assert post_json("/interpret", {"dream": "  "}) == (
+        400, {"success": False, "message": "Please provide a dream text."})
+
+
+def test_groq_path_uses_async_client(stub):
+    status, payload = post_json("/interpret", {"dream": "I was flying above a neon city", "force_model": True})
+    assert status == 200
+    assert payload["interpretation"] == stub.reply
+    assert payload["meta"].pop("trace_id")
+    assert payload["meta"] == {"method": "groq", "model": groq_client.GROQ_MODEL, "tier": "standard", "forced": True}
+    assert len(completions(stub)) == 1
+    assert history_count() == 1
+
+
+def test_other_routes_are_served_by_flask():
+    status, headers, chunks = asyncio.run(call("GET", "/_single_flight_stats"))
+    assert status == 200
+    assert "leaders" in json.loads(b"".join(chunks))
+    status, _, _ = asyncio.run(call("GET", "/no-such-page"))
+    assert status == 404
+
+
+def test_stream_route_keeps_streaming_through_bridge(stub):
+    stub.sample_latency = parse_latency("fixed:0")
+    status, headers, chunks = asyncio.run(
+        call("POST", "/interpret/stream", {"dream": "a lantern drifting over water", "force_model": True}))
+    assert status == 200
+    assert headers[b"content-type"].startswith(b"text/event-stream")
+    text = b"".join(chunks).decode()
+    assert text.count("event: token") > 1 and "event: done" in text
+    assert len([c for c in chunks if c]) > 2
+
+
+def test_stream_client_disconnect_stops_the_bridged_stream(stub):
+    stub.sample_latency = parse_latency("fixed:0")
+    stub.tokens_per_sec = 10
+    body = json.dumps({"dream": "a lantern drifting over water", "force_model": True}).encode()
+    scope = {
+        "type": "http", "http_version": "1.1", "method": "POST", "path": "/interpret/stream", "root_path": "",
+        "scheme": "http", "query_string": b"", "server": ("testserver", 80), "client": ("127.0.0.1", 5000),
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+    }
+    threads = set()
+
+    async def run():
+        first_chunk = asyncio.Event()
+        messages = iter([{"type": "http.request", "body": body, "more_body": False}])
+
+        async def receive():
+            message = next(messages, None)
+            if message:
+                return message
+            await first_chunk.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            threads.update(t.name for t in threading.enumerate() if t.name.startswith("wsgi-bridge"))
+            if message.get("body"):
+                first_chunk.set()
+
+        await asgi.app(scope, receive, send)
+
+    started = time.perf_counter()
+    asyncio.run(run())
+    # The reply takes 0.8 s to stream in full; the bridge gave up after the first token.
+    assert time.perf_counter() - started < 0.6
+    assert threads
+    assert groq_client.admission_stats()["in_use"] == 0
+
+
+def test_concurrent_requests_overlap_without_a_thread_each(stub):
+    n = 200
+    threads_before = threading.active_count()
+    peak = [threads_before]
+
+    async def load():
+        async def watch():
+            while True:
+                peak[0] = max(peak[0], threading.active_count())
+                await asyncio.sleep(0.05)
+
+        watcher = asyncio.create_task(watch())
+        results = await asyncio.gather(*(
+            call("POST", "/interpret", {"dream": f"dream number {i} about a door", "force_model": True})
+            for i in range(n)
+        ))
+        watcher.cancel()
+        return results
+
+    started = time.perf_counter()
+    results = asyncio.run(load())
+    elapsed = time.perf_counter() - started
+
+    assert all(status == 200 for status, _, _ in results)
+    assert len(completions(stub)) == n
+    # Serially this is n * 0.5s = 100s; concurrently it is about one upstream delay.
+    assert elapsed < 10
+    # The stub spawns a thread per connection; subtract those to count ours.
+    assert peak[0] - threads_before - n < 50
+    assert history_count() == n
+
+
+def test_identical_async_requests_share_one_groq_call(stub):
+    async def burst():
+        return await asyncio.gather(*(
+            groq_client.interpret_dream_async("a viral dream", use_cache=False) for _ in range(10)))
+
+    results = asyncio.run(burst())
+    assert all(r["success"] for r in results)
+    assert len(completions(stub)) == 1
+    assert groq_client.single_flight_stats()["coalesced"] == 9
@@ -0,0 +1,39 @@
+import json
+
+from benchmarks import harness
+
+
+def test_compare_flags_slowdowns_relative_to_the_reference():
+    baseline = {"seconds": 0.002, "relative": 0.2}
+    # Twice as slow on a machine that is also twice as slow: no change.
+    assert harness.compare(0.004, 0.02, baseline) == ("ok", 0.0)
+    status, change = harness.compare(0.003, 0.01, baseline, threshold=0.3)
+    assert status == "regressed" and round(change, 2) == 0.5
+    assert harness.compare(0.001, 0.01, baseline, threshold=0.3)[0] == "faster"
+    assert harness.compare(0.001, 0.01, None) == ("new", None)
+
+
+def test_save_keeps_benchmarks_that_were_not_rerun(tmp_path):
+    path = str(tmp_path / "baselines.json")
+    harness.save_baselines({"a[2k]": (0.002, 0.01), "b[2k]": (0.5, 0.01)}, path=path)
+    harness.save_baselines({"a[2k]": (0.004, 0.01)}, path=path)
+    saved = harness.load_baselines(path)["benchmarks"]
+    assert saved == {"a[2k]": {"seconds": 0.004, "relative": 0.4}, "b[2k]": {"seconds": 0.5, "relative": 50.0}}
+    with open(path, encoding="utf-8") as f:
+        assert json.load(f)["threshold"] == harness.THRESHOLD
+
+
+def test_synthetic_frame_and_dream():
+    df = harness.synthetic_frame(3000)
+    assert len(df) == 3000
+    assert not df["Interpretation"].isna().any()
+    dream = harness.synthetic_dream(df, 60)
+    assert len(dream.split()) == 60
+    assert dream == harness.synthetic_dream(df, 60)
+
+
+def test_measure_loops_fast_calls():
+    calls = []
+    seconds = harness.measure(lambda: calls.append(1), min_time=0.01, repeat=3)
+    assert seconds < 0.001
+    assert len(calls) > 100
@@ -0,0 +1,52 @@
+import threading
+
+import pytest
+
+import groq_client
+from groq_stub import GroqStub
+
+
+@pytest.fixture()
+def stub(monkeypatch, tmp_path):
+    with GroqStub() as server:
+        monkeypatch.setattr(groq_client, "GROQ_API_KEY", "test-key")
+        monkeypatch.setattr(groq_client, "GROQ_BASE_URL", server.url)
+        monkeypatch.setattr(groq_client, "CACHE_PATH", str(tmp_path / "cache.db"))
+        groq_client.reset_client()
+        yield server
+    groq_client.reset_client()
+
+
+def test_connections_are_reused_across_calls(stub):
+    first = groq_client.interpret_dream("I was flying over the sea")
+    second = groq_client.interpret_dream("A snake in the garden")
+    health = groq_client.check_groq_health()
+
+    assert first["success"] and second["success"]
+    assert health["connected"] and health["model_available"]
+    assert len([r for r in stub.requests if r[0] == "POST"]) == 2
+    assert len(stub.connections) == 1
+
+
+def test_client_is_shared_across_threads(stub):
+    clients = []
+    threads = [threading.Thread(target=lambda: clients.append(groq_client._client())) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len({id(c) for c in clients}) == 1
+
+
+def test_client_rebuilt_in_forked_child(stub, monkeypatch):
+    parent = groq_client._client()
+    monkeypatch.setattr(groq_client, "_shared_pid", -1)
+    assert groq_client._client() is not parent
+
+
+def test_timeouts_are_split_by_stage(stub, monkeypatch):
+    monkeypatch.setattr(groq_client, "GROQ_CONNECT_TIMEOUT", 1.5)
+    monkeypatch.setattr(groq_client, "GROQ_READ_TIMEOUT", 30.0)
+    groq_client.reset_client()
+    timeout = groq_client._client().timeout
+    assert timeout.connect == 1.5 and timeout.read == 30.0
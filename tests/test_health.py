@@ -0,0 +1,123 @@
+import time
+
+import pytest
+
+import app
+from health import HealthMonitor
+
+
+class CountingCheck:
+    def __init__(self, result=None, error=None):
+        self.calls = 0
+        self.result = result or {"connected": True, "models": ["m"]}
+        self.error = error
+
+    def __call__(self):
+        self.calls += 1
+        if self.error:
+            raise self.error
+        return dict(self.result)
+
+
+@pytest.fixture()
+def monitor(monkeypatch):
+    check = CountingCheck()
+    monitor = HealthMonitor(check, interval=60, name="Groq status")
+    # Tests drive refresh() themselves instead of racing the refresher thread.
+    monkeypatch.setattr(monitor, "start", lambda: None)
+    monkeypatch.setattr(app, "groq_health", monitor)
+    return monitor
+
+
+def test_snapshot_before_first_check_is_not_ready():
+    snap = HealthMonitor(CountingCheck(), interval=60).snapshot(start=False)
+    assert snap["stale"] and snap["checked_at"] is None
+
+
+def test_refresh_records_result_and_age():
+    check = CountingCheck()
+    monitor = HealthMonitor(check, interval=60)
+    snap = monitor.refresh()
+    assert snap["connected"] and not snap["stale"]
+    assert snap["age_seconds"] < 1
+    assert monitor.snapshot(start=False)["connected"]
+    assert check.calls == 1
+
+
+def test_check_errors_are_captured():
+    monitor = HealthMonitor(CountingCheck(error=RuntimeError("boom")), interval=60, name="Groq status")
+    assert monitor.refresh()["error"] == "Groq status check failed: boom"
+
+
+def test_background_thread_refreshes_on_interval():
+    check = CountingCheck()
+    monitor = HealthMonitor(check, interval=0.05)
+    monitor.start()
+    time.sleep(0.3)
+    assert check.calls >= 3
+
+
+def test_request_refresh_wakes_the_refresher():
+    check = CountingCheck()
+    monitor = HealthMonitor(check, interval=60)
+    monitor.refresh()
+    monitor.start()
+    time.sleep(0.05)
+    assert check.calls == 1  # a fresh snapshot is not re-checked at start
+    monitor.request_refresh()
+    time.sleep(0.1)
+    assert check.calls == 2
+
+
+def test_status_pages_serve_cached_snapshot(monitor):
+    monitor.refresh()
+    client = app.app.test_client()
+    for path in ("/_model_status", "/_env_check", "/admin", "/_ready"):
+        assert client.get(path).status_code in (200, 503)
+    assert client.get("/_model_status").get_json()["connected"] is True
+    assert monitor.check.calls == 1
+
+
+def test_admin_reload_forces_a_check(monitor):
+    monitor.refresh()
+    resp = app.app.test_client().post("/admin/reload_models")
+    assert resp.get_json()["status"]["connected"] is True
+    assert monitor.check.calls == 2
+
+
+def test_liveness_never_checks_groq_and_is_fast(monkeypatch):
+    monkeypatch.setattr(app, "groq_health", HealthMonitor(lambda: pytest.fail("checked Groq")))
+    client = app.app.test_client()
+    assert client.get("/_health").get_json()["status"] == "ok"
+
+    with app.app.test_request_context("/_health"):
+        started = time.perf_counter()
+        for _ in range(1000):
+            app.health_check()
+        per_call = (time.perf_counter() - started) / 1000
+    assert per_call < 0.001
+
+
+def test_readiness_needs_dataset_and_groq(monitor, monkeypatch):
+    client = app.app.test_client()
+    resp = client.get("/_ready")
+    assert resp.status_code == 503  # Groq never checked yet
+
+    monitor.refresh()
+    monkeypatch.setattr(app, "_dataset", None)
+    resp = client.get("/_ready")
+    assert resp.status_code == 503
+    assert resp.get_json()["checks"] == {"dataset_loaded": False, "groq_connected": True}
+
+    app.warm_up()
+    resp = client.get("/_ready")
+    assert resp.status_code == 200 and resp.get_json()["status"] == "ready"
+
+
+def test_readiness_fails_when_groq_is_down(monitor):
+    monitor.check.result = {"connected": False, "error": "Groq health check failed: 401"}
+    monitor.refresh()
+    app.warm_up()
+    resp = app.app.test_client().get("/_ready")
+    assert resp.status_code == 503
+    assert resp.get_json()["checks"]["groq_connected"] is False
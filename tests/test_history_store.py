@@ -0,0 +1,198 @@
+import sqlite3
+import threading
+
+import app
+from history_store import HistoryStore
+
+
+def count(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM history").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_rows_are_committed_in_batches(tmp_path):
+    path = str(tmp_path / "history.db")
+    store = HistoryStore(path, batch_size=100)
+    for i in range(1000):
+        store.add(f"dream {i}", f"reading {i}", "groq")
+    assert store.flush()
+    assert count(path) == 1000
+    stats = store.stats()
+    assert stats["written"] == 1000 and stats["queued"] == 0
+    assert stats["batches"] < 1000 and stats["largest_batch"] <= 100
+    store.close()
+
+
+def test_concurrent_writers_lose_nothing(tmp_path):
+    path = str(tmp_path / "history.db")
+    store = HistoryStore(path)
+
+    def writer(n):
+        for i in range(250):
+            store.add(f"dream {n}-{i}", "reading")
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    store.close()
+    assert count(path) == 2000
+
+
+def test_close_flushes_pending_rows(tmp_path):
+    path = str(tmp_path / "history.db")
+    store = HistoryStore(path)
+    store.add("a last dream", "reading")
+    store.close()
+    assert count(path) == 1
+    # The store restarts its writer on the next add.
+    store.add("another dream", "reading")
+    store.close()
+    assert count(path) == 2
+
+
+def test_wal_mode_and_legacy_schema_migration(tmp_path):
+    path = str(tmp_path / "history.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE history (ts TEXT, dream TEXT, response TEXT)")
+    conn.execute("INSERT INTO history VALUES ('2024-01-01', 'old dream', 'old reading')")
+    conn.commit()
+    conn.close()
+
+    store = HistoryStore(path)
+    store.add("new dream", "new reading", "dataset")
+    store.close()
+    conn = sqlite3.connect(path)
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    rows = conn.execute("SELECT dream, method FROM history ORDER BY rowid").fetchall()
+    conn.close()
+    assert rows == [("old dream", None), ("new dream", "dataset")]
+
+
+def test_full_queue_drops_instead_of_blocking_forever(tmp_path):
+    path = str(tmp_path / "history.db")
+    store = HistoryStore(path, max_queue=2, put_timeout=0.05)
+    store.add("warm", "up")
+    store.flush()
+
+    # Hold the write lock so the writer stalls on its next batch.
+    blocker = sqlite3.connect(path, isolation_level=None)
+    blocker.execute("BEGIN IMMEDIATE")
+    try:
+        results = [store.add(f"dream {i}", "reading") for i in range(6)]
+    finally:
+        blocker.execute("COMMIT")
+        blocker.close()
+    assert results[:2] == [True, True]
+    assert not all(results)
+    store.close()
+    assert count(path) == 1 + sum(results)
+    assert store.stats()["dropped"] == results.count(False)
+
+
+def test_recent_sees_committed_rows(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, "DATA_DIR", str(tmp_path))
+    app.save_history("I was flying", "Flight reading", "groq")
+    app.save_history("I was falling", "Fall reading", "groq")
+    app.get_history().flush()
+    items = app.app.test_client().get("/history/recent").get_json()["items"]
+    assert [i["dream"] for i in items] == ["I was falling", "I was flying"]
+    assert app.app.test_client().get("/_history_stats").get_json()["written"] == 2
+
+
+def fill(store, rows):
+    for dream, response in rows:
+        store.add(dream, response, "groq")
+    store.flush()
+
+
+def test_reads_do_not_wait_for_the_writer(tmp_path, monkeypatch):
+    store = HistoryStore(str(tmp_path / "h.db"))
+    fill(store, [("a lighthouse at dusk", "reading")])
+    store.add("a second lighthouse", "reading", "groq")
+
+    def flush(timeout=5.0):
+        raise AssertionError("reads must not flush the writer queue")
+
+    monkeypatch.setattr(store, "flush", flush)
+    assert store.page()["items"][-1]["dream"] == "a lighthouse at dusk"
+    assert store.search("lighthouse")["items"]
+    monkeypatch.undo()
+    store.close()
+
+
+def test_keyset_pages_cover_every_row_once(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.db"))
+    fill(store, [(f"dream {i}", f"reading {i}") for i in range(53)])
+    seen, before = [], None
+    while True:
+        page = store.page(before, limit=10)
+        seen += [item["dream"] for item in page["items"]]
+        before = page["next_before"]
+        if before is None:
+            break
+    assert seen == [f"dream {i}" for i in reversed(range(53))]
+    store.close()
+
+
+def test_search_ranks_and_highlights(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.db"))
+    fill(store, [
+        ("I was chased by a snake", "Snakes often stand for hidden fears."),
+        ("Flying over the sea", "Freedom, with a passing snake in the water."),
+        ("My teeth fell out", "Worry about appearance <b>and</b> control."),
+    ])
+    result = store.search("snake")
+    assert [item["dream_snippet"] for item in result["items"]][0] == "I was chased by a <mark>snake</mark>"
+    assert len(result["items"]) == 2
+    # Stemming matches "Snakes"; stored text is escaped before highlighting.
+    assert "<mark>Snakes</mark>" in result["items"][0]["response_snippet"]
+    teeth = store.search('teeth" (')["items"][0]  # FTS syntax characters are ignored
+    assert "&lt;b&gt;and&lt;/b&gt;" in teeth["response_snippet"]
+    store.close()
+
+
+def test_search_index_tracks_updates_and_deletes(tmp_path):
+    path = str(tmp_path / "history.db")
+    store = HistoryStore(path)
+    fill(store, [("a red balloon", "reading"), ("a blue balloon", "reading")])
+    conn = sqlite3.connect(path)
+    conn.execute("UPDATE history SET dream = 'a green kite' WHERE dream = 'a red balloon'")
+    conn.execute("DELETE FROM history WHERE dream = 'a blue balloon'")
+    conn.commit()
+    conn.close()
+    assert store.search("balloon")["items"] == []
+    assert len(store.search("kite")["items"]) == 1
+    store.close()
+
+
+def test_existing_rows_are_backfilled_into_search_index(tmp_path):
+    path = str(tmp_path / "history.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE history (ts TEXT, dream TEXT, response TEXT, method TEXT)")
+    conn.execute("INSERT INTO history VALUES ('2024-01-01', 'an old lighthouse', 'reading', 'groq')")
+    conn.commit()
+    conn.close()
+    store = HistoryStore(path)
+    assert store.search("lighthouse")["items"][0]["id"] == 1
+    store.close()
+
+
+def test_history_routes(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, "DATA_DIR", str(tmp_path))
+    for i in range(30):
+        app.save_history(f"dream {i} about a lantern", "reading", "groq")
+    app.get_history().flush()
+    client = app.app.test_client()
+    first = client.get("/history/recent?limit=20").get_json()
+    assert len(first["items"]) == 20
+    second = client.get(f"/history/recent?before={first['next_before']}&limit=20").get_json()
+    assert len(second["items"]) == 10 and second["next_before"] is None
+
+    found = client.get("/history/search?q=lantern&limit=5").get_json()
+    assert len(found["items"]) == 5 and found["next_offset"] == 5
+    assert client.get("/history/search?q=").status_code == 400
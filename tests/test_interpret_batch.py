@@ -0,0 +1,109 @@
+import asyncio
+import json
+import os
+import sqlite3
+
+import pandas as pd
+import pytest
+
+import app
+import groq_client
+from scripts import groq_stub_server
+from single_flight import SingleFlight
+from test_asgi import call
+
+DATASET_DREAMS = ["I dreamed about a snake in my house", "My childhood home was on fire"]
+
+
+@pytest.fixture()
+def upstream(monkeypatch, tmp_path):
+    stub = groq_stub_server.StubGroq(latency="fixed:0.1", tokens_per_sec=0, completion_tokens=20, seed=1)
+    server = groq_stub_server.serve(stub)
+    monkeypatch.setattr(groq_client, "GROQ_API_KEY", "test-key")
+    monkeypatch.setattr(groq_client, "GROQ_BASE_URL", f"http://127.0.0.1:{server.server_address[1]}")
+    monkeypatch.setattr(groq_client, "CACHE_PATH", str(tmp_path / "cache.db"))
+    monkeypatch.setattr(groq_client, "_flights", SingleFlight())
+    monkeypatch.setattr(app, "DATA_DIR", str(tmp_path / "data"))
+    monkeypatch.setattr(app, "NEAR_DUPLICATES", False)
+    monkeypatch.setattr(app, "BATCH_CONCURRENCY", 3)
+    groq_client.reset_client()
+    yield stub
+    server.shutdown()
+    groq_client.reset_client()
+
+
+def batch_body(count):
+    dreams = [f"glorp vimble {i} zanthor quibbled" for i in range(count)]
+    return {"dreams": DATASET_DREAMS + [{"id": f"g{i}", "dream": d} for i, d in enumerate(dreams)] + ["  "]}
+
+
+def check_lines(lines, count):
+    done = lines.pop()
+    assert done["done"] is True and done["count"] == len(lines) == count + 3
+    assert sorted(line["index"] for line in lines) == list(range(count + 3))
+    by_index = {line["index"]: line for line in lines}
+    assert by_index[0]["meta"]["method"] == "dataset" and by_index[1]["meta"]["method"] == "dataset"
+    assert by_index[count + 2] == {"index": count + 2, "success": False, "message": "Please provide a dream text."}
+    groq = [by_index[i + 2] for i in range(count)]
+    assert [line["id"] for line in groq] == [f"g{i}" for i in range(count)]
+    assert {line["meta"]["method"] for line in groq} == {"groq"}
+    assert {line["meta"]["trace_id"] for line in lines if "meta" in line} == {
+        f"{done['trace_id']}.{line['index']}" for line in lines if "meta" in line}
+    # Dataset answers are ready before any Groq call returns.
+    assert {lines[1]["index"], lines[2]["index"]} == {0, 1}
+
+
+def history_batches():
+    store = app.get_history()
+    store.flush()
+    conn = sqlite3.connect(os.path.join(app.DATA_DIR, "history.db"))
+    try:
+        return conn.execute("SELECT COUNT(*) FROM history").fetchone()[0], store.stats()
+    finally:
+        conn.close()
+
+
+def test_flask_batch_streams_ndjson_with_bounded_fanout(upstream):
+    resp = app.app.test_client().post("/interpret/batch", json=batch_body(9), headers={"X-Trace-Id": "batch-0001"})
+    assert resp.mimetype == "application/x-ndjson"
+    assert resp.headers["X-Trace-Id"] == "batch-0001"
+    check_lines([json.loads(line) for line in resp.get_data(as_text=True).splitlines()], 9)
+    stats = upstream.snapshot()
+    assert stats["completions"] == 9
+    assert stats["max_in_flight"] == 3
+
+    rows, store = history_batches()
+    assert rows == 11
+    assert store["largest_batch"] == 11
+
+
+def test_asgi_batch_matches_flask(upstream):
+    status, headers, chunks = asyncio.run(call("POST", "/interpret/batch", batch_body(9)))
+    assert status == 200 and headers[b"content-type"] == b"application/x-ndjson"
+    lines = [json.loads(line) for line in b"".join(chunks).decode().splitlines()]
+    check_lines(lines, 9)
+    assert upstream.snapshot()["max_in_flight"] == 3
+    assert history_batches()[0] == 11
+
+
+@pytest.mark.parametrize("body, message", [
+    ({"dreams": []}, "Please provide a list of dreams."),
+    ({"dream": "one dream"}, "Please provide a list of dreams."),
+    ({"dreams": ["x"] * (app.BATCH_MAX + 1)}, f"A batch holds at most {app.BATCH_MAX} dreams."),
+])
+def test_batch_rejects_bad_bodies(body, message):
+    resp = app.app.test_client().post("/interpret/batch", json=body)
+    assert resp.status_code == 400 and resp.get_json()["message"] == message
+    status, _, chunks = asyncio.run(call("POST", "/interpret/batch", body))
+    assert status == 400 and json.loads(b"".join(chunks))["message"] == message
+
+
+def test_vectorized_matching_agrees_with_single_matches():
+    words = pd.read_csv(app.DATASET_PATH)["Word"].astype(str).tolist()
+    texts = [f"last night i saw a {w.lower()} near the {words[-i].lower()}" for i, w in enumerate(words[::37])]
+    texts += ["nothing in here matches at all qqq", "my childhood home was on fire"]
+    batched = app.find_best_matches(texts)
+    single = [app.find_best_match_simple(t) for t in texts]
+    assert [m and m["symbol"] for m in batched] == [m and m["symbol"] for m in single]
+    assert [m and m["score"] for m in batched] == [m and pytest.approx(m["score"]) for m in single]
+    assert sum(1 for match in batched if match) > len(texts) // 2
@@ -0,0 +1,111 @@
+import json
+import os
+import sqlite3
+
+import pytest
+
+import app
+import groq_client
+import metrics
+from groq_stub import GroqStub
+
+
+def parse_sse(body: str) -> list:
+    events = []
+    for frame in body.strip().split("\n\n"):
+        name, data = None, None
+        for line in frame.splitlines():
+            if line.startswith("event:"):
+                name = line[6:].strip()
+            elif line.startswith("data:"):
+                data = json.loads(line[5:].strip())
+        events.append((name, data))
+    return events
+
+
+def history_rows():
+    app.get_history().flush()
+    conn = sqlite3.connect(os.path.join(app.DATA_DIR, "history.db"))
+    try:
+        return conn.execute("SELECT dream, response FROM history").fetchall()
+    finally:
+        conn.close()
+
+
+@pytest.fixture()
+def client():
+    return app.app.test_client()
+
+
+@pytest.fixture()
+def stub(monkeypatch, tmp_path):
+    with GroqStub(reply="Your mind may be exploring freedom and change.") as server:
+        monkeypatch.setattr(groq_client, "GROQ_API_KEY", "test-key")
+        monkeypatch.setattr(groq_client, "GROQ_BASE_URL", server.url)
+        monkeypatch.setattr(groq_client, "CACHE_PATH", str(tmp_path / "cache.db"))
+        groq_client.reset_client()
+        yield server
+    groq_client.reset_client()
+
+
+def test_groq_path_streams_tokens_then_done(client, stub):
+    dream = "I was flying above a neon city at night"
+    resp = client.post("/interpret/stream", json={"dream": dream, "force_model": True})
+    assert resp.mimetype == "text/event-stream"
+    events = parse_sse(resp.get_data(as_text=True))
+
+    tokens = [data["text"] for name, data in events if name == "token"]
+    assert len(tokens) > 1
+    name, done = events[-1]
+    assert name == "done"
+    assert done["meta"].pop("trace_id")
+    assert done["meta"] == {"method": "groq", "model": groq_client.GROQ_MODEL, "tier": "standard", "forced": True}
+    assert "".join(tokens).strip() == done["interpretation"]
+    assert stub.requests[-1][2]["stream"] is True
+    assert (dream, done["interpretation"]) in history_rows()
+
+
+def cancelled_calls():
+    for name, labels, value in metrics.REGISTRY.collect()["counters"]:
+        if name == "dreamlens_groq_requests_total" and dict(map(tuple, labels)) == {"outcome": "cancelled"}:
+            return value
+    return 0
+
+
+def test_client_going_away_closes_the_groq_stream(stub, monkeypatch):
+    completions = groq_client._client().chat.completions
+    real_create = completions.create
+    closed = []
+
+    def create(**kwargs):
+        stream = real_create(**kwargs)
+        real_close = stream.close
+        stream.close = lambda: (closed.append(True), real_close())
+        return stream
+
+    monkeypatch.setattr(completions, "create", create)
+    before = cancelled_calls()
+    events = groq_client.interpret_dream_stream("a lantern drifting over water", use_cache=False)
+    assert next(events)["event"] == "token"
+    events.close()
+    assert closed == [True]
+    assert cancelled_calls() == before + 1
+    assert groq_client.admission_stats()["in_use"] == 0
+
+
+def test_dataset_match_emits_single_event(client):
+    events = parse_sse(client.post("/interpret/stream", json={"dream": "snake"}).get_data(as_text=True))
+    assert [name for name, _ in events] == ["done"]
+    assert events[0][1]["meta"]["method"] == "dataset"
+
+
+def test_fallback_emits_single_event(client, monkeypatch):
+    monkeypatch.setattr(groq_client, "GROQ_API_KEY", None)
+    resp = client.post("/interpret/stream", json={"dream": "a quiet zzyzx", "force_model": True})
+    events = parse_sse(resp.get_data(as_text=True))
+    assert [name for name, _ in events] == ["done"]
+    assert events[0][1]["meta"]["method"] == "fallback"
+
+
+def test_empty_dream_rejected(client):
+    assert client.post("/interpret/stream", json={"dream": " "}).status_code == 400
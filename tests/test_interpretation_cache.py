@@ -0,0 +1,105 @@
+import sqlite3
+import time
+
+import pytest
+
+import app
+import interpretation_cache
+import groq_client
+from groq_stub import GroqStub
+from interpretation_cache import InterpretationCache, make_key, normalize_dream
+
+
+@pytest.fixture()
+def stub(monkeypatch, tmp_path):
+    with GroqStub() as server:
+        monkeypatch.setattr(groq_client, "GROQ_API_KEY", "test-key")
+        monkeypatch.setattr(groq_client, "GROQ_BASE_URL", server.url)
+        monkeypatch.setattr(groq_client, "CACHE_PATH", str(tmp_path / "cache.db"))
+        groq_client.reset_client()
+        yield server
+    groq_client.reset_client()
+
+
+def completions(stub):
+    return [r for r in stub.requests if r[0] == "POST"]
+
+
+def test_normalization_ignores_case_punctuation_and_spacing():
+    assert normalize_dream("  I was FALLING...  down!") == "i was falling down"
+    assert make_key("I was falling.", "m", "v1") == make_key("i   was falling", "m", "v1")
+    assert make_key("I was falling", "m", "v1") != make_key("I was falling", "m", "v2")
+    assert make_key("I was falling", "m", "v1") != make_key("I was falling", "other", "v1")
+
+
+def test_ttl_expiry(tmp_path, monkeypatch):
+    cache = InterpretationCache(str(tmp_path / "c.db"), ttl=60)
+    cache.put("k", "m", "text")
+    assert cache.get("k")["interpretation"] == "text"
+    later = time.time() + 61
+    monkeypatch.setattr(interpretation_cache.time, "time", lambda: later)
+    assert cache.get("k") is None
+    assert cache.stats()["expired"] == 1
+
+
+def test_size_bound_evicts_least_recently_used(tmp_path):
+    cache = InterpretationCache(str(tmp_path / "c.db"), max_entries=2)
+    cache.put("a", "m", "A")
+    cache.put("b", "m", "B")
+    assert cache.get("a")["interpretation"] == "A"
+    cache.put("c", "m", "C")
+    assert cache.get("b") is None
+    stats = cache.stats()
+    assert stats["entries"] == 2 and stats["evictions"] == 1
+
+
+def test_shared_between_instances(tmp_path):
+    path = str(tmp_path / "c.db")
+    InterpretationCache(path).put("k", "m", "shared")
+    assert InterpretationCache(path).get("k")["interpretation"] == "shared"
+
+
+def test_hits_do_not_wait_for_the_write_lock(tmp_path):
+    path = str(tmp_path / "c.db")
+    cache = InterpretationCache(path, flush_interval=3600)
+    cache.put("k", "m", "text")
+    writer = sqlite3.connect(path, timeout=5)
+    writer.execute("BEGIN IMMEDIATE")
+    try:
+        started = time.perf_counter()
+        assert [cache.get("k")["interpretation"] for _ in range(3)] == ["text"] * 3
+        assert cache.get("missing") is None
+        assert time.perf_counter() - started < 1
+    finally:
+        writer.rollback()
+        writer.close()
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (3, 1)
+    assert cache._conn().execute("SELECT hits FROM interpretation_cache WHERE key = 'k'").fetchone()[0] == 3
+
+
+def test_repeated_dream_skips_groq(stub):
+    first = groq_client.interpret_dream("I was falling", db_context="ctx")
+    second = groq_client.interpret_dream("i was falling!", db_context="ctx")
+    assert first["cached"] is False and second["cached"] is True
+    assert second["interpretation"] == first["interpretation"]
+    assert len(completions(stub)) == 1
+    stats = groq_client.cache_stats()
+    assert stats["hits"] == 1 and stats["misses"] == 1
+
+
+def test_bypass_flag_forces_fresh_call(stub):
+    client = app.app.test_client()
+    body = {"dream": "teeth falling out in a zzyzx", "force_model": True}
+    assert client.post("/interpret", json=body).get_json()["meta"].get("cached") is None
+    assert client.post("/interpret", json=body).get_json()["meta"]["cached"] is True
+    fresh = client.post("/interpret", json=dict(body, no_cache=True)).get_json()
+    assert fresh["meta"]["method"] == "groq" and "cached" not in fresh["meta"]
+    assert len(completions(stub)) == 2
+
+
+def test_failures_are_not_cached(monkeypatch, tmp_path):
+    monkeypatch.setattr(groq_client, "GROQ_API_KEY", None)
+    monkeypatch.setattr(groq_client, "CACHE_PATH", str(tmp_path / "cache.db"))
+    assert groq_client.interpret_dream("I was falling")["success"] is False
+    assert groq_client.cache_stats()["entries"] == 0
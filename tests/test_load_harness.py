@@ -0,0 +1,91 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from groq import Groq, InternalServerError
+from werkzeug.serving import make_server
+
+import app
+import groq_client
+from scripts import groq_stub_server, load_test
+from single_flight import SingleFlight
+
+
+@pytest.fixture()
+def stub():
+    state = groq_stub_server.StubGroq(latency="fixed:0.01", tokens_per_sec=0, completion_tokens=40, seed=3)
+    server = groq_stub_server.serve(state)
+    state.url = f"http://127.0.0.1:{server.server_address[1]}"
+    yield state
+    server.shutdown()
+
+
+def test_stub_speaks_the_groq_api(stub):
+    client = Groq(api_key="stub-key", base_url=stub.url, max_retries=0)
+    assert [m.id for m in client.models.list().data] == [stub.model]
+
+    messages = [{"role": "user", "content": "I dreamed about a snake"}]
+    completion = client.chat.completions.create(model=stub.model, messages=messages, max_tokens=8)
+    assert completion.choices[0].message.content.endswith(".")
+    assert completion.usage.completion_tokens <= 8
+    assert completion.usage.prompt_tokens > 0
+
+    chunks = list(client.chat.completions.create(model=stub.model, messages=messages, stream=True))
+    text = "".join(c.choices[0].delta.content or "" for c in chunks)
+    assert chunks[-1].x_groq.usage.completion_tokens == len(text.split())
+
+    stats = stub.snapshot()
+    assert (stats["completions"], stats["streams"], stats["in_flight"]) == (1, 1, 0)
+
+
+def test_stub_error_rate_and_latency():
+    state = groq_stub_server.StubGroq(latency="fixed:0.2", tokens_per_sec=0, error_rate=1.0, seed=1)
+    server = groq_stub_server.serve(state)
+    try:
+        client = Groq(api_key="stub-key", base_url=f"http://127.0.0.1:{server.server_address[1]}", max_retries=0)
+        started = time.perf_counter()
+        with pytest.raises(InternalServerError):
+            client.chat.completions.create(model=state.model, messages=[{"role": "user", "content": "x"}])
+        assert time.perf_counter() - started >= 0.2
+        assert state.snapshot()["errors"] == 1
+    finally:
+        server.shutdown()
+    with pytest.raises(ValueError):
+        groq_stub_server.parse_latency("pareto:1")
+
+
+def test_request_mix_uses_corpus_symbols():
+    symbols = load_test.load_symbols()
+    assert "snake" in symbols
+    bodies = list(load_test.make_requests(symbols, 500, groq_share=0.3, repeat_share=0.2))
+    forced = sum(1 for b in bodies if b.get("force_model"))
+    distinct = len({b["dream"] for b in bodies})
+    assert len(bodies) == 500
+    assert 0.15 < forced / 500 < 0.4
+    assert 0.6 < distinct / 500 < 0.85
+
+
+def test_load_run_against_app_and_stub(stub, monkeypatch, tmp_path):
+    monkeypatch.setattr(groq_client, "GROQ_API_KEY", "stub-key")
+    monkeypatch.setattr(groq_client, "GROQ_BASE_URL", stub.url)
+    monkeypatch.setattr(groq_client, "CACHE_PATH", str(tmp_path / "cache.db"))
+    monkeypatch.setattr(groq_client, "_flights", SingleFlight())
+    monkeypatch.setattr(app, "DATA_DIR", str(tmp_path / "data"))
+    monkeypatch.setattr(app, "NEAR_DUPLICATES", False)
+    groq_client.reset_client()
+    server = make_server("127.0.0.1", 0, app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        bodies = load_test.make_requests(load_test.load_symbols(), 60, groq_share=0.5, repeat_share=0.1)
+        results = asyncio.run(load_test.run_closed(f"http://127.0.0.1:{server.server_port}", bodies,
+                                                   concurrency=8, deadline=float("inf"), timeout=30))
+    finally:
+        server.shutdown()
+        groq_client.reset_client()
+
+    summary = results.summary()
+    assert summary["ok"] == 60 and not summary["errors"]
+    assert summary["by_method"]["groq"]["count"] > 10
+    assert summary["latency"]["p50_ms"] <= summary["latency"]["p99_ms"] <= summary["latency"]["max_ms"]
+    assert stub.snapshot()["completions"] >= 10
@@ -0,0 +1,236 @@
+import glob
+import http.client
+import json
+import multiprocessing
+import os
+import statistics
+import threading
+import time
+
+import pytest
+from werkzeug.serving import make_server
+
+import app
+import groq_client
+import metrics
+from groq_stub import GroqStub
+from metrics import Registry
+from single_flight import SingleFlight
+
+
+def counter(name, registry=metrics.REGISTRY, **labels):
+    wanted = sorted((k, str(v)) for k, v in labels.items())
+    for n, l, value in registry.collect()["counters"]:
+        if n == name and sorted(map(tuple, l)) == wanted:
+            return value
+    return 0
+
+
+def stage_count(stage):
+    for n, l, counts, _ in metrics.REGISTRY.snapshot()["histograms"]:
+        if n == "dreamlens_stage_seconds" and l == [["stage", stage]]:
+            return sum(counts)
+    return 0
+
+
+def test_quantiles_are_within_one_bucket():
+    registry = Registry()
+    for ms in range(1, 1001):
+        registry.observe("dreamlens_stage_seconds", ms / 1000, stage="groq")
+    (_, _, counts, total), = registry.snapshot()["histograms"]
+    assert total == pytest.approx(500.5)
+    # Buckets are 2**0.25 (~19%) apart.
+    for q, exact in ((0.5, 0.5), (0.95, 0.95), (0.99, 0.99)):
+        assert metrics.quantile(counts, q) == pytest.approx(exact, rel=0.19)
+
+
+def test_render_is_prometheus_text():
+    registry = Registry()
+    with registry.span(stage="dataset_match"):
+        pass
+    registry.inc("dreamlens_interpretations_total", method="dataset")
+    registry.inc("dreamlens_groq_tokens_total", 42, kind="prompt")
+    text = registry.render()
+    assert "# TYPE dreamlens_stage_seconds histogram" in text
+    assert 'dreamlens_stage_seconds_bucket{stage="dataset_match",le="+Inf"} 1' in text
+    assert 'dreamlens_stage_seconds_count{stage="dataset_match"} 1' in text
+    assert 'dreamlens_stage_quantile_seconds{stage="dataset_match",quantile="0.99"}' in text
+    assert 'dreamlens_interpretations_total{method="dataset"} 1' in text
+    assert 'dreamlens_groq_tokens_total{kind="prompt"} 42' in text
+    assert text.endswith("\n")
+
+
+def test_render_keeps_large_and_fractional_values_exact():
+    registry = Registry()
+    registry.inc("dreamlens_groq_tokens_total", 1234567, kind="prompt")
+    registry.inc("dreamlens_groq_tokens_total", 12345678901, kind="completion")
+    registry.set("dreamlens_groq_breaker_open", 0.125)
+    text = registry.render()
+    assert 'dreamlens_groq_tokens_total{kind="prompt"} 1234567\n' in text
+    assert 'dreamlens_groq_tokens_total{kind="completion"} 12345678901\n' in text
+    assert "dreamlens_groq_breaker_open 0.125\n" in text
+
+
+def _record_in_child(directory):
+    registry = Registry(directory)
+    registry.inc("dreamlens_interpretations_total", 3, method="groq")
+    registry.observe("dreamlens_stage_seconds", 0.2, stage="groq")
+    registry.set("dreamlens_groq_breaker_open", 1)
+    registry.flush()
+
+
+def _age(path, seconds):
+    then = time.time() - seconds
+    os.utime(path, (then, then))
+
+
+def test_workers_are_merged_and_survive_exit(tmp_path):
+    directory = str(tmp_path / "metrics")
+    ctx = multiprocessing.get_context("fork")
+    children = [ctx.Process(target=_record_in_child, args=(directory,)) for _ in range(2)]
+    for child in children:
+        child.start()
+    for child in children:
+        child.join()
+
+    registry = Registry(directory)
+    registry.inc("dreamlens_interpretations_total", method="groq")
+    assert counter("dreamlens_interpretations_total", registry, method="groq") == 7
+    assert "dreamlens_stage_seconds_count{stage=\"groq\"} 2" in registry.render()
+    assert "dreamlens_groq_breaker_open 2\n" in registry.render()
+
+    # No server hook reports the exit: the snapshot just stops updating. A sweep folds it
+    # into the archive; totals don't move and its gauges are gone.
+    stale = sorted(glob.glob(os.path.join(directory, f"metrics-{children[0].pid}-*.json")))
+    assert len(stale) == 1
+    _age(stale[0], registry.stale_after + 1)
+    registry.sweep()
+    assert not os.path.exists(stale[0])
+    assert counter("dreamlens_interpretations_total", registry, method="groq") == 7
+    assert "dreamlens_groq_breaker_open 1\n" in registry.render()
+
+    # A new server (no live worker left) starts from zero.
+    for path in glob.glob(os.path.join(directory, "metrics-*.json")):
+        _age(path, registry.stale_after + 1)
+    fresh = Registry(directory)
+    fresh.start()
+    fresh._flusher = None
+    assert counter("dreamlens_interpretations_total", fresh, method="groq") == 0
+
+
+def test_same_pid_workers_keep_separate_snapshots(tmp_path):
+    # Container pids get reused across restarts; a new worker must not overwrite an old one's file.
+    directory = str(tmp_path / "metrics")
+    old, new = Registry(directory), Registry(directory)
+    old.inc("dreamlens_interpretations_total", 5, method="dataset")
+    old.flush()
+    new.inc("dreamlens_interpretations_total", 2, method="dataset")
+    new.flush()
+    assert counter("dreamlens_interpretations_total", new, method="dataset") == 7
+
+    new.close()
+    assert counter("dreamlens_interpretations_total", old, method="dataset") == 7
+    assert len(glob.glob(os.path.join(directory, "metrics-*.json"))) == 2   # old's file and the archive
+
+
+def test_worker_swept_while_stalled_does_not_double_count(tmp_path):
+    directory = str(tmp_path / "metrics")
+    stalled, other = Registry(directory), Registry(directory)
+    stalled.inc("dreamlens_interpretations_total", 4, method="groq")
+    stalled.set("dreamlens_groq_breaker_open", 1)
+    stalled.flush()
+    _age(stalled._path(), other.stale_after + 1)
+    other.sweep()
+
+    stalled.inc("dreamlens_interpretations_total", method="groq")
+    stalled.flush()
+    assert counter("dreamlens_interpretations_total", other, method="groq") == 5
+    assert "dreamlens_groq_breaker_open 1\n" in other.render()
+
+
+def test_forked_child_starts_from_zero(tmp_path):
+    registry = Registry()
+    registry.inc("dreamlens_interpretations_total", method="dataset")
+    ctx = multiprocessing.get_context("fork")
+    queue = ctx.Queue()
+    child = ctx.Process(target=lambda: queue.put(registry.snapshot()))
+    child.start()
+    snapshot = queue.get(timeout=10)
+    child.join()
+    assert snapshot == {"histograms": [], "counters": [], "gauges": []}
+    assert registry.snapshot()["counters"]
+
+
+def test_interpret_records_stages_and_method():
+    before = counter("dreamlens_interpretations_total", method="dataset")
+    matched = stage_count("dataset_match")
+    resp = app.app.test_client().post("/interpret", json={"dream": "I dreamed about a snake in my house"})
+    assert resp.get_json()["meta"]["method"] == "dataset"
+    assert counter("dreamlens_interpretations_total", method="dataset") == before + 1
+    assert stage_count("dataset_match") == matched + 1
+
+    scrape = app.app.test_client().get("/metrics")
+    assert scrape.status_code == 200
+    assert scrape.mimetype == "text/plain"
+    assert 'dreamlens_stage_seconds_count{stage="total"}' in scrape.get_data(as_text=True)
+
+
+@pytest.fixture()
+def stub(monkeypatch, tmp_path):
+    with GroqStub(reply="Your mind may be exploring freedom and change.") as server:
+        monkeypatch.setattr(groq_client, "GROQ_API_KEY", "test-key")
+        monkeypatch.setattr(groq_client, "GROQ_BASE_URL", server.url)
+        monkeypatch.setattr(groq_client, "CACHE_PATH", str(tmp_path / "cache.db"))
+        monkeypatch.setattr(groq_client, "_flights", SingleFlight())
+        monkeypatch.setattr(app, "DATA_DIR", str(tmp_path / "data"))
+        monkeypatch.setattr(app, "NEAR_DUPLICATES", False)
+        groq_client.reset_client()
+        yield server
+    groq_client.reset_client()
+
+
+def test_groq_calls_record_tokens_and_outcome(stub):
+    prompt = counter("dreamlens_groq_tokens_total", kind="prompt")
+    completion = counter("dreamlens_groq_tokens_total", kind="completion")
+    ok = counter("dreamlens_groq_requests_total", outcome="success")
+    groq = stage_count("groq")
+    resp = app.app.test_client().post("/interpret", json={"dream": "I was flying above a neon city",
+                                                          "force_model": True})
+    assert resp.get_json()["meta"]["method"] == "groq"
+    assert counter("dreamlens_groq_tokens_total", kind="prompt") == prompt + stub.stats["prompt_tokens"]
+    assert counter("dreamlens_groq_tokens_total", kind="completion") == completion + stub.stats["completion_tokens"]
+    assert counter("dreamlens_groq_requests_total", outcome="success") == ok + 1
+    assert stage_count("groq") == groq + 1
+
+
+def test_instrumentation_is_under_one_percent_of_a_dataset_request():
+    # The dataset path is the fastest /interpret, so the instrumentation weighs most there.
+    app.warm_up()
+    server = make_server("127.0.0.1", 0, app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    body = json.dumps({"dream": "I dreamed about a snake in my house"})
+    requests = []
+    try:
+        for _ in range(60):
+            conn = http.client.HTTPConnection("127.0.0.1", server.server_port, timeout=10)
+            started = time.perf_counter()
+            conn.request("POST", "/interpret", body, {"Content-Type": "application/json"})
+            conn.getresponse().read()
+            requests.append(time.perf_counter() - started)
+            conn.close()
+    finally:
+        server.shutdown()
+
+    registry = Registry()
+    rounds = 20000
+    started = time.perf_counter()
+    for _ in range(rounds):
+        timer = registry.timer()
+        with timer.stage("dataset_match"):
+            pass
+        with timer.stage("history_write"):
+            pass
+        timer.finish("dataset")
+    registry.snapshot()
+    per_request = (time.perf_counter() - started) / rounds
+    assert per_request < 0.01 * statistics.median(requests[10:])
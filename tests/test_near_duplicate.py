@@ -0,0 +1,100 @@
+import random
+import time
+
+import pytest
+
+import app
+from near_duplicate import MERGE_AT, NearDuplicateIndex, features
+
+
+@pytest.fixture()
+def isolated_history(monkeypatch, tmp_path):
+    monkeypatch.setattr(app, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(app, "_near_duplicates", None)
+    return tmp_path
+
+
+def test_rewordings_share_features():
+    assert features("I was chased by a snake") == features("A snake was chasing me!")
+    assert features("I dreamt of flying over mountains") == features("flying over a mountain")
+
+
+def test_negations_are_features():
+    assert features("I could not fly") != features("I could fly")
+    assert features("I could not fly") == features("I couldn't fly") == features("I never fly")
+    index = NearDuplicateIndex(threshold=0.8)
+    index.add("I could fly high over the old city at night with my brother and sister", "Flying reading")
+    assert index.find("I could fly high over the old city with my brother and sister")
+    assert index.find("I could not fly high over the old city with my brother and sister") is None
+
+
+def test_find_respects_threshold():
+    index = NearDuplicateIndex(threshold=0.8)
+    index.add("I was chased by a snake through the forest", "Snake meaning")
+    assert index.find("a snake was chasing me through a forest")["interpretation"] == "Snake meaning"
+    assert index.find("I was swimming with dolphins") is None
+
+
+def test_lookup_is_sub_millisecond():
+    rng = random.Random(3)
+    vocab = [f"word{i}" for i in range(3000)]
+    index = NearDuplicateIndex(threshold=0.8)
+    for i in range(10000):
+        index.add(" ".join(rng.sample(vocab, 8)), f"interpretation {i}")
+    query = "snake chasing me through an old dark forest"
+    index.find(query)
+    started = time.perf_counter()
+    for _ in range(200):
+        index.find(query)
+    assert (time.perf_counter() - started) / 200 < 1e-3
+
+
+def test_refresh_reads_history_and_skips_fallbacks(isolated_history):
+    app.save_history("I was chased by a snake", "Groq snake reading", "groq")
+    app.save_history("My teeth were falling out", "Template text", "fallback")
+    app.get_history().flush()
+    index = app.get_near_duplicates()
+    # Lookups never read the whole table themselves; the first one only starts a background build.
+    index.refresh(force=True)
+    assert index.find("a snake chased me")["interpretation"] == "Groq snake reading"
+    assert index.find("my teeth fell out, falling teeth") is None
+
+    app.save_history("A flood filled my house", "Flood reading", "groq")
+    app.get_history().flush()
+    index.refresh(force=True)
+    assert index.find("a flood filled the house")["interpretation"] == "Flood reading"
+
+
+def test_interpret_serves_near_duplicate(isolated_history, monkeypatch):
+    app.save_history("I was chased by a zzyzx creature", "Stored reading", "groq")
+    app.get_history().flush()
+    app.get_near_duplicates().refresh(force=True)
+    monkeypatch.setattr(app, "groq_interpret", lambda *a, **k: pytest.fail("Groq called"))
+    body = app.app.test_client().post(
+        "/interpret", json={"dream": "a zzyzx creature was chasing me", "force_model": True}).get_json()
+    assert body["interpretation"] == "Stored reading"
+    assert body["meta"]["method"] == "near_duplicate"
+    assert body["meta"]["similarity"] >= app.NEAR_DUP_THRESHOLD
+
+
+def test_index_keeps_rowids_not_text(isolated_history):
+    for i in range(MERGE_AT + 10):
+        app.save_history(f"I was chased by creature{i} through tunnel{i}", f"Reading {i}", "groq")
+    app.get_history().flush()
+    index = app.get_near_duplicates()
+    index.refresh(force=True)
+    assert len(index) == MERGE_AT + 10 and not index._texts
+    assert index.find("creature7 chased me through tunnel7")["interpretation"] == "Reading 7"
+    assert index.find(f"creature{MERGE_AT + 5} was chasing me through tunnel{MERGE_AT + 5}")
+
+
+def test_first_lookup_builds_in_the_background(isolated_history):
+    app.save_history("I was chased by a qwxv monster", "Monster reading", "groq")
+    app.get_history().flush()
+    index = app.get_near_duplicates()
+    index.find("a qwxv monster chased me")
+    for _ in range(200):
+        if len(index):
+            break
+        time.sleep(0.01)
+    assert index.find("a qwxv monster chased me")["interpretation"] == "Monster reading"
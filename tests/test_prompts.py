@@ -0,0 +1,130 @@
+import pytest
+
+import app
+import groq_client
+import metrics
+from groq_stub import GroqStub
+from prompts import INSTRUCTION, MESSAGE_OVERHEAD, REPLY_OVERHEAD, PromptBuilder, count_tokens, parse_snippets
+from single_flight import SingleFlight
+
+SYSTEM = "You are a dream interpreter. Be warm and specific."
+CONTEXT = "\n".join([
+    "- Falling: Falling dreams are extremely common and usually mean a loss of control in waking life...",
+    "- Snake: A snake stands for hidden fears, or for healing and renewal when it sheds its skin...",
+    "- House: The house is the self; each room is a different part of your mind and memories...",
+])
+
+
+def test_count_tokens_approximates_words_digits_and_symbols():
+    assert count_tokens("") == 0
+    assert count_tokens("I was flying") == 3
+    assert count_tokens("interpretations") == 2
+    assert count_tokens("year 2024!") == 4
+    assert count_tokens("a\n\nb") == 3
+    assert count_tokens("🌙") == 2
+
+
+def test_prefix_is_byte_stable_and_tokens_add_up():
+    builder = PromptBuilder(SYSTEM)
+    first = builder.build("I was falling off a tall house", CONTEXT)
+    second = builder.build("a snake", "")
+    assert first["messages"][0] == second["messages"][0] == {"role": "system", "content": SYSTEM}
+    assert first["messages"][1]["content"].startswith(INSTRUCTION + "\n\n")
+    assert second["messages"][1]["content"].startswith(INSTRUCTION + "\n\n")
+    assert first["messages"][1]["content"].endswith('Dream: "I was falling off a tall house"')
+    for prompt in (first, second):
+        counted = sum(count_tokens(m["content"]) for m in prompt["messages"])
+        assert prompt["tokens"] == counted + 2 * MESSAGE_OVERHEAD + REPLY_OVERHEAD
+    assert (first["snippets"], first["trimmed"], first["dropped"]) == (3, 0, 0)
+
+
+def test_snippets_the_dream_names_rank_first():
+    prompt = PromptBuilder(SYSTEM).build("a snake in the garden", CONTEXT)
+    lines = prompt["messages"][1]["content"].splitlines()
+    assert [line.split(":")[0] for line in lines if line.startswith("- ")] == ["- Snake", "- Falling", "- House"]
+
+
+def test_tight_budget_trims_then_drops_the_lowest_ranked_snippets():
+    dream = "I was falling"
+    full = PromptBuilder(SYSTEM).build(dream, CONTEXT)["tokens"]
+    trimmed = PromptBuilder(SYSTEM, budget=full - 5).build(dream, CONTEXT)
+    assert (trimmed["snippets"], trimmed["trimmed"], trimmed["dropped"]) == (2, 1, 0)
+    assert trimmed["tokens"] <= full - 5
+    house = [line for line in trimmed["messages"][1]["content"].splitlines() if line.startswith("- House")][0]
+    assert house.endswith("...") and len(house) < len(CONTEXT.splitlines()[-1])
+
+    bare = PromptBuilder(SYSTEM, budget=1)
+    prompt = bare.build(dream, CONTEXT)
+    assert (prompt["snippets"], prompt["dropped"]) == (0, 3)
+    assert prompt["messages"][1]["content"] == f'{INSTRUCTION}\n\nDream: "{dream}"'
+    assert prompt["messages"][0]["content"] == SYSTEM
+    assert prompt["tokens"] == bare.build(dream)["tokens"]
+
+
+def test_parse_snippets_reads_symbol_index_context():
+    context = app.search_database_context("I dreamed about a snake in my house")
+    assert len(parse_snippets(context)) == len(context.splitlines()) > 0
+    assert parse_snippets("no bullet here") == []
+
+
+def test_budget_is_part_of_the_prompt_version():
+    assert PromptBuilder(SYSTEM, budget=800).version != PromptBuilder(SYSTEM, budget=900).version
+    assert PromptBuilder(SYSTEM).version == PromptBuilder(SYSTEM).version
+
+
+@pytest.fixture()
+def stub(monkeypatch, tmp_path):
+    with GroqStub(reply="Your mind may be exploring freedom and change.") as server:
+        monkeypatch.setattr(groq_client, "GROQ_API_KEY", "test-key")
+        monkeypatch.setattr(groq_client, "GROQ_BASE_URL", server.url)
+        monkeypatch.setattr(groq_client, "CACHE_PATH", str(tmp_path / "cache.db"))
+        monkeypatch.setattr(groq_client, "_flights", SingleFlight())
+        monkeypatch.setattr(app, "DATA_DIR", str(tmp_path / "data"))
+        monkeypatch.setattr(app, "NEAR_DUPLICATES", False)
+        groq_client.reset_client()
+        yield server
+    groq_client.reset_client()
+
+
+def counter(name, **labels):
+    wanted = sorted((k, str(v)) for k, v in labels.items())
+    for n, l, value in metrics.REGISTRY.collect()["counters"]:
+        if n == name and sorted(map(tuple, l)) == wanted:
+            return value
+    return 0
+
+
+def test_groq_gets_the_budgeted_prompt_and_usage_is_recorded(stub, monkeypatch):
+    builder = PromptBuilder(groq_client.DREAM_SYSTEM_PROMPT, budget=1)
+    monkeypatch.setattr(groq_client, "_prompts", builder)
+    # Routing is off in tests, so every call gets the standard budget and its length instruction.
+    sent = groq_client.prompts_for({"max_tokens": groq_client.GROQ_MAX_TOKENS})
+    dropped = counter("dreamlens_prompt_snippets_total", outcome="dropped")
+    estimated = counter("dreamlens_prompt_tokens_estimated_total")
+
+    dream = "I was falling off a snake house"
+    body = app.app.test_client().post("/interpret", json={"dream": dream, "force_model": True}).get_json()
+    assert body["meta"]["method"] == "groq"
+    messages = stub.requests[-1][2]["messages"]
+    assert messages[0]["content"] == groq_client.DREAM_SYSTEM_PROMPT + groq_client.length_instruction(
+        groq_client.GROQ_MAX_TOKENS)
+    assert messages[1]["content"] == f'{INSTRUCTION}\n\nDream: "{dream}"'
+
+    before = dict(stub.stats)
+    result = groq_client.interpret_dream("glorp vimble zanthor", use_cache=False)
+    assert result["usage"] == {"prompt_tokens": stub.stats["prompt_tokens"] - before["prompt_tokens"],
+                               "completion_tokens": stub.stats["completion_tokens"] - before["completion_tokens"],
+                               "estimated_prompt_tokens": sent.build("glorp vimble zanthor")["tokens"]}
+    assert counter("dreamlens_prompt_snippets_total", outcome="dropped") > dropped
+    assert counter("dreamlens_prompt_tokens_estimated_total") == estimated + sum(
+        sent.build(d)["tokens"] for d in (dream, "glorp vimble zanthor"))
+
+
+def test_each_budget_asks_for_a_length_it_can_finish():
+    fast, standard = groq_client.length_instruction(600), groq_client.length_instruction(1024)
+    assert fast == "\nLength: 200-350 words.\n" and standard == "\nLength: 400-600 words.\n"
+    # A long dream on the standard model with the fast budget (upstream slow) is cached apart from a full answer.
+    full = {"model": "llama-3.3-70b-versatile", "tier": "standard", "max_tokens": 1024}
+    reduced = dict(full, max_tokens=600)
+    assert groq_client._route_key("a dream", "", full) != groq_client._route_key("a dream", "", reduced)
+    assert groq_client.prompts_for(reduced).system_prompt.endswith(fast)
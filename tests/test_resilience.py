@@ -0,0 +1,188 @@
+import time
+
+import pytest
+
+import app
+import groq_client
+import metrics
+from resilience import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, RetryBudget, backoff
+from scripts.groq_stub_server import StubGroq, serve
+from single_flight import SingleFlight
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def counter(name, **labels):
+    wanted = sorted((k, str(v)) for k, v in labels.items())
+    for n, l, value in metrics.REGISTRY.collect()["counters"]:
+        if n == name and sorted(map(tuple, l)) == wanted:
+            return value
+    return 0
+
+
+def test_breaker_opens_on_failure_ratio_and_probes_after_cooldown():
+    clock = FakeClock()
+    changes = []
+    breaker = CircuitBreaker(window=30, min_calls=10, failure_ratio=0.5, open_seconds=15, clock=clock,
+                             on_change=lambda old, new: changes.append(new))
+    for i in range(9):
+        breaker.record(success=i % 2 == 0)
+    assert breaker.state == CLOSED    # 4 of 9 failed, and below min_calls
+    breaker.record(success=False)
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    assert breaker.snapshot()["rejected"] == 1
+
+    clock.now += 15
+    assert breaker.allow()            # the probe
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()        # only one at a time
+    breaker.record(success=False)
+    assert breaker.state == OPEN
+
+    clock.now += 15
+    assert breaker.allow()
+    breaker.record(success=True)
+    assert breaker.state == CLOSED
+    assert changes == [OPEN, HALF_OPEN, OPEN, HALF_OPEN, CLOSED]
+    assert breaker.snapshot()["calls_in_window"] == 0
+
+
+def test_breaker_forgets_failures_outside_the_window():
+    clock = FakeClock()
+    breaker = CircuitBreaker(window=30, min_calls=4, failure_ratio=0.5, clock=clock)
+    for _ in range(3):
+        breaker.record(success=False)
+    clock.now += 31
+    breaker.record(success=False)
+    assert breaker.state == CLOSED
+    assert breaker.snapshot()["failures_in_window"] == 1
+
+
+def test_lost_probe_does_not_wedge_the_breaker():
+    clock = FakeClock()
+    breaker = CircuitBreaker(min_calls=1, open_seconds=5, clock=clock)
+    breaker.record(success=False)
+    clock.now += 5
+    assert breaker.allow()
+    clock.now += 4
+    assert not breaker.allow()
+    clock.now += 1
+    assert breaker.allow()
+
+
+def test_retry_budget_is_a_share_of_recent_requests():
+    clock = FakeClock()
+    budget = RetryBudget(ratio=0.2, minimum=1, window=10, clock=clock)
+    for _ in range(10):
+        budget.request()
+    assert [budget.spend() for _ in range(4)] == [True, True, True, False]
+    clock.now += 11
+    assert budget.spend()
+    assert budget.snapshot() == {"requests_in_window": 0, "retries_in_window": 1}
+
+
+def test_backoff_is_jittered_and_capped():
+    waits = [backoff(attempt, base=0.1, cap=0.5) for attempt in range(8) for _ in range(50)]
+    assert all(0 <= w <= 0.5 for w in waits)
+    assert len(set(waits)) > 100
+
+
+@pytest.fixture()
+def faulty(monkeypatch, tmp_path):
+    """A fault-injecting Groq stub and a fresh breaker and retry budget. Call it with StubGroq kwargs."""
+    servers = []
+
+    def start(breaker_min_calls=4, retry_ratio=0.0, retry_minimum=0, **stub_kwargs):
+        stub = StubGroq(tokens_per_sec=0, completion_tokens=20, seed=3, **stub_kwargs)
+        server = serve(stub)
+        servers.append(server)
+        monkeypatch.setattr(groq_client, "GROQ_API_KEY", "test-key")
+        monkeypatch.setattr(groq_client, "GROQ_BASE_URL", f"http://127.0.0.1:{server.server_address[1]}")
+        monkeypatch.setattr(groq_client, "CACHE_PATH", str(tmp_path / "cache.db"))
+        monkeypatch.setattr(groq_client, "_flights", SingleFlight())
+        monkeypatch.setattr(groq_client, "_breaker", CircuitBreaker(
+            min_calls=breaker_min_calls, open_seconds=60, on_change=groq_client._breaker_changed))
+        monkeypatch.setattr(groq_client, "_retry_budget", RetryBudget(ratio=retry_ratio, minimum=retry_minimum))
+        monkeypatch.setattr(app, "DATA_DIR", str(tmp_path / "data"))
+        monkeypatch.setattr(app, "NEAR_DUPLICATES", False)
+        groq_client.reset_client()
+        return stub
+
+    yield start
+    groq_client.reset_client()
+    for server in servers:
+        server.shutdown()
+
+
+def post(dream):
+    return app.app.test_client().post("/interpret", json={"dream": dream, "force_model": True}).get_json()
+
+
+def test_open_breaker_serves_the_fallback_without_calling_groq(faulty):
+    stub = faulty(latency="fixed:0", error_rate=1.0)
+    short_circuits = counter("dreamlens_groq_requests_total", outcome="short_circuit")
+    for i in range(4):
+        assert post(f"glorp vimble {i} zanthor quibbled")["meta"]["method"] == "fallback"
+    assert stub.snapshot()["errors"] == 4
+    assert groq_client.resilience_stats()["breaker"]["state"] == OPEN
+
+    started = time.perf_counter()
+    body = post("glorp vimble 9 zanthor quibbled")
+    assert time.perf_counter() - started < 0.5
+    assert body["meta"]["method"] == "fallback"
+    assert "circuit breaker open" in body["meta"]["groq_error"]
+    assert stub.snapshot()["errors"] == 4
+    assert counter("dreamlens_groq_requests_total", outcome="short_circuit") == short_circuits + 1
+
+    client = app.app.test_client()
+    assert client.get("/_health").get_json()["groq_breaker"] == OPEN
+    assert client.get("/_ready").get_json()["groq_resilience"]["breaker"]["rejected"] == 1
+    text = client.get("/metrics").get_data(as_text=True)
+    assert "dreamlens_groq_breaker_open 1" in text
+    assert 'dreamlens_groq_breaker_transitions_total{state="open"}' in text
+
+
+def test_deadline_bounds_a_slow_groq(faulty, monkeypatch):
+    faulty(latency="fixed:2")
+    monkeypatch.setattr(groq_client, "GROQ_DEADLINE", 0.5)
+    started = time.perf_counter()
+    body = post("glorp vimble slow zanthor quibbled")
+    assert time.perf_counter() - started < 1.5
+    assert body["meta"]["method"] == "fallback"
+    assert groq_client.resilience_stats()["breaker"]["failures_in_window"] == 1
+
+
+def test_deep_mode_has_its_own_deadline(faulty, monkeypatch):
+    faulty(latency="fixed:1")
+    monkeypatch.setattr(groq_client, "GROQ_DEADLINE", 0.5)
+    monkeypatch.setattr(groq_client, "GROQ_DEEP_DEADLINE", 5)
+    assert post("glorp vimble quick zanthor quibbled")["meta"]["method"] == "fallback"
+    body = app.app.test_client().post("/interpret", json={
+        "dream": "glorp vimble deep zanthor quibbled", "force_model": True, "mode": "deep"}).get_json()
+    assert body["meta"]["method"] == "groq"
+    assert groq_client.request_deadline("deep") - groq_client.request_deadline() == pytest.approx(4.5, abs=0.1)
+
+
+def test_retries_recover_from_transient_errors_within_the_budget(faulty, monkeypatch):
+    # Seeded: with this error rate the first attempt fails and a retry succeeds.
+    stub = faulty(latency="fixed:0", error_rate=0.5, retry_ratio=1.0, retry_minimum=5)
+    monkeypatch.setattr(groq_client, "GROQ_MAX_RETRIES", 5)
+    retries = counter("dreamlens_groq_retries_total")
+    assert post("glorp vimble retry zanthor quibbled")["meta"]["method"] == "groq"
+    seen = stub.snapshot()
+    assert seen["errors"] >= 1 and seen["completions"] == 1
+    assert counter("dreamlens_groq_retries_total") == retries + seen["errors"]
+
+
+def test_spent_retry_budget_stops_retrying(faulty, monkeypatch):
+    stub = faulty(latency="fixed:0", error_rate=1.0, breaker_min_calls=100)
+    monkeypatch.setattr(groq_client, "GROQ_MAX_RETRIES", 5)
+    assert post("glorp vimble budget zanthor quibbled")["meta"]["method"] == "fallback"
+    assert stub.snapshot()["errors"] == 1
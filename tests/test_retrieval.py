@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import app
+from retrieval import BM25Index, stem, tokenize
+from scripts.retrieval_eval import evaluate, load_labels
+
+DOCS = pd.DataFrame({
+    "Word": ["Ocean", "Swimming", "Snake", "House"],
+    "Interpretation": [
+        "The sea stands for the unconscious; deep dark water is what you cannot see yet.",
+        "Swimming shows how you move through emotions; struggling in water means feeling overwhelmed.",
+        "A snake is a hidden fear or a healing change, like skin that is shed.",
+        "The house is the self, and its rooms are parts of your mind, some near the ocean of memory.",
+    ],
+})
+
+
+@pytest.fixture(scope="module")
+def index():
+    return BM25Index.from_frame(DOCS)
+
+
+def test_stemming_folds_common_inflections():
+    assert [stem(t) for t in ("dogs", "swimming", "flies", "chased", "glass", "bus")] == \
+        ["dog", "swim", "fly", "chas", "glass", "bus"]
+    assert tokenize("I was Swimming in a dark Ocean!") == ["was", "swim", "in", "dark", "ocean"]
+
+
+def test_symbol_name_outweighs_a_mention_in_the_body(index):
+    rows, scores = index.top_k(["a dark ocean"], k=4)[0]
+    assert rows[0] == 0 and list(rows).index(3) > 0
+    assert np.all(np.diff(scores) <= 0)
+    assert 0 < scores[0] < 1
+
+
+def test_top_k_agrees_with_a_full_sort(index):
+    texts = ["swimming in deep water", "snake", "the house by the ocean", "qqq zzz"]
+    dense = index.scores(texts).toarray()
+    for (rows, scores), row_scores in zip(index.top_k(texts, k=2), dense):
+        expected = [r for r in np.argsort(-row_scores, kind="stable")[:2] if row_scores[r] > 0]
+        assert rows.tolist() == expected
+        assert scores.tolist() == pytest.approx(row_scores[expected].tolist())
+    assert index.top_k(["qqq zzz"])[0][0].size == 0
+
+
+def test_batched_scores_equal_single_scores(index):
+    texts = ["swimming in deep water", "a snake in the house", "glorp vimble"]
+    batched = index.scores(texts).toarray()
+    for i, text in enumerate(texts):
+        assert batched[i] == pytest.approx(index.scores([text]).toarray()[0])
+
+
+def test_bm25_beats_tfidf_on_the_labeled_sample():
+    report = evaluate(load_labels())
+    bm25, tfidf = report["bm25"], report["tfidf"]
+    assert bm25["recall"][1] > tfidf["recall"][1]
+    assert bm25["recall"][5] >= tfidf["recall"][5]
+    assert bm25["recall"][5] >= 0.85
+    assert bm25["correct"] > tfidf["correct"]
+    assert report["context"]["recall"][3] < bm25["recall"][3]
+
+
+def test_app_matches_on_interpretation_text(monkeypatch):
+    # RETRIEVAL=bm25
+    ds = app.get_dataset()
+    monkeypatch.setattr(ds, "bm25", BM25Index.from_frame(ds.df))
+    app.find_best_match_simple.cache_clear()
+    match = app.find_best_match_simple("i was swimming in a dark ocean")
+    assert match["symbol"] in ("Ocean", "Swimming")
+    assert app.find_best_match_simple("glorp vimble 3 zanthor quibbled") is None
+    context = app.search_database_context("I was chased by a snake through an alley")
+    assert {line.split(":")[0] for line in context.splitlines()} >= {"- Snake", "- Alley"}
+    app.find_best_match_simple.cache_clear()
+
+
+def test_tfidf_is_the_default_matcher():
+    assert app.RETRIEVAL == "tfidf" and app.get_dataset().bm25 is None
+    assert app.find_best_match_simple("falling off stairs")["symbol"] == "Falling"
@@ -0,0 +1,122 @@
+import time
+
+import pytest
+
+import app
+import groq_client
+import metrics
+from routing import DEEP, FAST, STANDARD, RoutingPolicy, count_symbols
+from scripts.groq_stub_server import StubGroq, serve
+from single_flight import SingleFlight
+
+FAST_MODEL = "llama-3.1-8b-instant"
+MODELS = {FAST: FAST_MODEL, STANDARD: "llama-3.3-70b-versatile", DEEP: "llama-3.3-70b-versatile"}
+BUDGETS = {FAST: 600, STANDARD: 1024, DEEP: 2048}
+
+
+def policy(**kwargs):
+    return RoutingPolicy(MODELS, BUDGETS, **{"fast_max_words": 10, "fast_max_symbols": 1, **kwargs})
+
+
+def dream(words):
+    return " ".join(["glorp"] * words)
+
+
+def test_short_simple_dreams_go_to_the_fast_tier():
+    router = policy()
+    route = router.route("falling off stairs", symbols=1)
+    assert (route["tier"], route["model"], route["max_tokens"], route["reason"]) == (FAST, FAST_MODEL, 600, "short")
+    assert router.route("falling off stairs", symbols=2)["tier"] == STANDARD
+    assert router.route(dream(11))["tier"] == STANDARD
+
+
+def test_deep_mode_and_routing_off():
+    deep = policy().route("falling", mode=DEEP)
+    assert (deep["tier"], deep["max_tokens"], deep["reason"]) == (DEEP, 2048, "deep_mode")
+    off = policy(enabled=False).route("falling")
+    assert (off["tier"], off["reason"]) == (STANDARD, "routing_off")
+    no_fast_model = RoutingPolicy(dict(MODELS, fast=""), BUDGETS)
+    assert not no_fast_model.enabled
+    assert policy(enabled=False).route("falling", mode=DEEP)["tier"] == DEEP
+
+
+def test_slow_standard_tier_shifts_medium_dreams_and_trims_long_ones():
+    router = policy(slow_seconds=2.0)
+    assert router.route(dream(15))["tier"] == STANDARD
+    for _ in range(3):
+        router.observe(STANDARD, 5.0)
+    medium = router.route(dream(15))
+    assert (medium["tier"], medium["reason"]) == (FAST, "upstream_slow")
+    long = router.route(dream(40))
+    assert (long["tier"], long["max_tokens"], long["reason"]) == (STANDARD, 600, "upstream_slow")
+    assert router.stats()["latency_seconds"][STANDARD] == pytest.approx(5.0)
+
+
+def test_count_symbols_reads_context_lines():
+    assert count_symbols("") == 0
+    assert count_symbols("- snake: hidden fears...\n- house: the self...") == 2
+    context = app.search_database_context("I dreamed about a snake in my house")
+    assert count_symbols(context) == len(context.splitlines()) > 0
+
+
+@pytest.fixture()
+def tiers(monkeypatch, tmp_path):
+    stub = StubGroq(latency="fixed:0", tokens_per_sec=0, completion_tokens=20, seed=5,
+                    model_latency={FAST_MODEL: "fixed:0"})
+    server = serve(stub)
+    monkeypatch.setattr(groq_client, "GROQ_API_KEY", "test-key")
+    monkeypatch.setattr(groq_client, "GROQ_BASE_URL", f"http://127.0.0.1:{server.server_address[1]}")
+    monkeypatch.setattr(groq_client, "CACHE_PATH", str(tmp_path / "cache.db"))
+    monkeypatch.setattr(groq_client, "_flights", SingleFlight())
+    monkeypatch.setattr(groq_client, "_router", policy(slow_seconds=0.2))
+    monkeypatch.setattr(app, "DATA_DIR", str(tmp_path / "data"))
+    monkeypatch.setattr(app, "NEAR_DUPLICATES", False)
+    groq_client.reset_client()
+    yield stub
+    groq_client.reset_client()
+    server.shutdown()
+
+
+def post(text, **extra):
+    return app.app.test_client().post("/interpret", json={"dream": text, "force_model": True, **extra}).get_json()
+
+
+def routes(tier, reason):
+    for n, l, value in metrics.REGISTRY.collect()["counters"]:
+        if n == "dreamlens_groq_routes_total" and sorted(map(tuple, l)) == [("reason", reason), ("tier", tier)]:
+            return value
+    return 0
+
+
+def test_requests_are_sent_with_the_routed_model_and_budget(tiers):
+    before = routes(FAST, "short")
+    meta = post("glorp vimble")["meta"]
+    assert (meta["tier"], meta["model"]) == (FAST, FAST_MODEL)
+    assert routes(FAST, "short") == before + 1
+
+    # Deep mode isn't answered from the fast tier's cache entry.
+    meta = post("glorp vimble", mode="deep")["meta"]
+    assert (meta["tier"], meta["model"]) == (DEEP, MODELS[DEEP])
+    assert post("glorp vimble", mode="deep")["meta"]["cached"] is True
+
+    seen = tiers.snapshot()["by_model"]
+    assert seen[FAST_MODEL]["max_tokens"] == [600]
+    assert (seen[MODELS[DEEP]]["calls"], seen[MODELS[DEEP]]["max_tokens"]) == (1, [2048])
+
+
+def test_slow_upstream_moves_medium_dreams_to_the_fast_tier(tiers):
+    tiers.model_latency[MODELS[STANDARD]] = lambda rng: 0.3
+    assert post(dream(15) + " one")["meta"]["tier"] == STANDARD
+    assert groq_client.routing_stats()["latency_seconds"][STANDARD] >= 0.3
+    assert post(dream(15) + " two")["meta"]["tier"] == FAST
+    assert app.app.test_client().get("/_routing_stats").get_json()["enabled"] is True
+
+
+def test_only_completed_calls_feed_the_routing_average(tiers):
+    route = {"tier": STANDARD}
+    groq_client._record_call("complete", time.perf_counter() - 0.001, "error", route=route)
+    # A stream's time includes how fast the client reads it.
+    groq_client._record_call("stream", time.perf_counter() - 5.0, "success", route=route)
+    assert STANDARD not in groq_client.routing_stats()["latency_seconds"]
+    groq_client._record_call("complete", time.perf_counter() - 0.5, "success", route=route)
+    assert groq_client.routing_stats()["latency_seconds"][STANDARD] >= 0.5
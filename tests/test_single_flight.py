@@ -0,0 +1,118 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+import groq_client
+from groq_stub import GroqStub
+from interpretation_cache import make_key
+from single_flight import SingleFlight
+
+
+def run_concurrently(n, target):
+    results = [None] * n
+    barrier = threading.Barrier(n)
+
+    def worker(i):
+        barrier.wait()
+        results[i] = target()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+@pytest.fixture()
+def stub(monkeypatch, tmp_path):
+    with GroqStub(delay=0.3) as server:
+        monkeypatch.setattr(groq_client, "GROQ_API_KEY", "test-key")
+        monkeypatch.setattr(groq_client, "GROQ_BASE_URL", server.url)
+        monkeypatch.setattr(groq_client, "CACHE_PATH", str(tmp_path / "cache.db"))
+        monkeypatch.setattr(groq_client, "LOCK_DIR", str(tmp_path / "locks"))
+        monkeypatch.setattr(groq_client, "_flights", SingleFlight())
+        groq_client.reset_client()
+        yield server
+    groq_client.reset_client()
+
+
+def completions(stub):
+    return [r for r in stub.requests if r[0] == "POST"]
+
+
+def test_do_runs_function_once_for_concurrent_callers():
+    flights = SingleFlight()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        time.sleep(0.2)
+        return {"value": 42}
+
+    results = run_concurrently(10, lambda: flights.do("k", slow))
+    assert calls == [1]
+    assert all(r == {"value": 42} for r in results)
+    assert flights.stats()["coalesced"] == 9
+
+
+def test_leader_error_propagates_to_followers():
+    flights = SingleFlight()
+
+    def boom():
+        time.sleep(0.1)
+        raise RuntimeError("upstream down")
+
+    def call():
+        try:
+            flights.do("k", boom)
+        except RuntimeError as e:
+            return str(e)
+
+    assert run_concurrently(4, call) == ["upstream down"] * 4
+
+
+def test_identical_dreams_share_one_groq_call(stub):
+    results = run_concurrently(8, lambda: groq_client.interpret_dream("a viral dream", use_cache=False))
+    assert all(r["success"] for r in results)
+    assert len(completions(stub)) == 1
+    assert groq_client.single_flight_stats()["coalesced"] == 7
+
+
+def test_streams_join_in_flight_request(stub):
+    def consume():
+        return [e["event"] for e in groq_client.interpret_dream_stream("a viral dream", use_cache=False)]
+
+    events = run_concurrently(4, consume)
+    assert len(completions(stub)) == 1
+    assert sorted(len(e) for e in events)[:3] == [1, 1, 1]
+    assert all(e[-1] == "done" for e in events)
+
+
+def test_other_worker_holding_lock_is_reused_from_cache(stub, tmp_path):
+    route = groq_client.route_request("a viral dream", "")
+    key = make_key("a viral dream", groq_client.GROQ_MODEL, groq_client.prompts_for(route).version, "")
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    script = (
+        "import sys, time\n"
+        "from single_flight import worker_lock\n"
+        "from interpretation_cache import InterpretationCache\n"
+        f"with worker_lock({groq_client.LOCK_DIR!r}, {key!r}, 5):\n"
+        "    print('locked', flush=True)\n"
+        "    time.sleep(0.5)\n"
+        f"    InterpretationCache({groq_client.CACHE_PATH!r}).put({key!r}, 'm', 'from the other worker')\n"
+    )
+    other = subprocess.Popen([sys.executable, "-c", script], cwd=root, stdout=subprocess.PIPE, text=True)
+    try:
+        assert other.stdout.readline().strip() == "locked"
+        result = groq_client.interpret_dream("a viral dream", use_cache=False)
+    finally:
+        other.wait(timeout=10)
+    assert result["interpretation"] == "from the other worker"
+    assert completions(stub) == []
+    stats = groq_client.single_flight_stats()
+    assert stats["cross_worker_waits"] == 1 and stats["cross_worker_reused"] == 1
@@ -0,0 +1,51 @@
+import importlib.util
+import os
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _import_report():
+    spec = importlib.util.spec_from_file_location(
+        "import_time_report", os.path.join(ROOT, "scripts", "import_time_report.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope="module")
+def report():
+    return _import_report()
+
+
+@pytest.fixture(scope="module")
+def app_import(report):
+    return report.measure("app")
+
+
+def test_cold_import_within_budget(report, app_import):
+    assert app_import["total_ms"] <= report.DEFAULT_BUDGET_MS, app_import["packages"]
+
+
+def test_heavy_dependencies_are_not_imported_eagerly(report, app_import):
+    eager = [m for m in report.HEAVY_MODULES if m in app_import["loaded"]]
+    assert eager == []
+
+
+def test_warm_up_loads_dataset_once():
+    import app
+
+    dataset = app.warm_up()
+    assert dataset is app.get_dataset()
+    assert not dataset.df.empty
+    assert dataset.tfidf_matrix.shape[0] == len(dataset.df)
+
+
+def test_light_pages_do_not_touch_dataset(monkeypatch):
+    import app
+
+    monkeypatch.setattr(app, "get_dataset", lambda: pytest.fail("dataset loaded"))
+    client = app.app.test_client()
+    for path in ("/", "/about", "/history", "/contact", "/_health"):
+        assert client.get(path).status_code == 200
@@ -0,0 +1,105 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+import app
+from structured_log import JsonLinesWriter, format_line, tail_lines
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def read_records(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_records_are_buffered_until_flush(tmp_path):
+    path = str(tmp_path / "model.log")
+    writer = JsonLinesWriter(path, flush_interval=60)
+    writer.write({"msg": "one"})
+    writer.write({"msg": "two"})
+    assert not os.path.exists(path)
+    writer.flush()
+    assert [r["msg"] for r in read_records(path)] == ["one", "two"]
+
+
+def test_background_flush_interval(tmp_path):
+    path = str(tmp_path / "model.log")
+    writer = JsonLinesWriter(path, flush_interval=0.05)
+    writer.write({"msg": "soon"})
+    time.sleep(0.3)
+    assert read_records(path) == [{"msg": "soon"}]
+
+
+def test_rotates_by_size_and_keeps_backups(tmp_path):
+    path = str(tmp_path / "model.log")
+    writer = JsonLinesWriter(path, max_bytes=1000, backups=2, flush_interval=0)
+    for i in range(200):
+        writer.write({"msg": f"line {i:04d}"})
+    assert sorted(os.listdir(tmp_path)) == ["model.log", "model.log.1", "model.log.2", "model.log.lock"]
+    assert all(os.path.getsize(tmp_path / name) <= 1000 for name in ("model.log", "model.log.1"))
+    assert read_records(path)[-1]["msg"] == "line 0199"
+
+
+def test_rotates_at_day_boundary(tmp_path):
+    path = str(tmp_path / "model.log")
+    writer = JsonLinesWriter(path, flush_interval=0)
+    writer.write({"msg": "yesterday"})
+    two_days_ago = time.time() - 2 * 86400
+    os.utime(path, (two_days_ago, two_days_ago))
+    writer.write({"msg": "today"})
+    assert read_records(path + ".1") == [{"msg": "yesterday"}]
+    assert read_records(path) == [{"msg": "today"}]
+
+
+def test_processes_share_one_rotating_file(tmp_path):
+    path = str(tmp_path / "model.log")
+    script = (
+        "import sys\n"
+        "from structured_log import JsonLinesWriter\n"
+        f"w = JsonLinesWriter({path!r}, max_bytes=20000, backups=50, flush_interval=0)\n"
+        "for i in range(500):\n"
+        "    w.write({'worker': sys.argv[1], 'i': i})\n"
+    )
+    procs = [subprocess.Popen([sys.executable, "-c", script, str(n)], cwd=ROOT) for n in range(4)]
+    for p in procs:
+        assert p.wait(timeout=60) == 0
+    records = []
+    for name in os.listdir(tmp_path):
+        if name.startswith("model.log") and not name.endswith(".lock"):
+            records += read_records(tmp_path / name)
+    assert len(records) == 2000
+    assert len({(r["worker"], r["i"]) for r in records}) == 2000
+
+
+def test_tail_reads_only_the_end(tmp_path):
+    path = str(tmp_path / "model.log")
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(100000):
+            f.write(f"line {i}\n")
+    assert tail_lines(path, 3) == ["line 99997", "line 99998", "line 99999"]
+    assert len(tail_lines(path, 5000)) == 5000
+    assert tail_lines(str(tmp_path / "missing.log"), 10) == []
+
+
+def test_tail_continues_into_previous_file(tmp_path):
+    path = str(tmp_path / "model.log")
+    (tmp_path / "model.log.1").write_text("old 1\nold 2\n", encoding="utf-8")
+    (tmp_path / "model.log").write_text("new 1\n", encoding="utf-8")
+    assert tail_lines(path, 2) == ["old 2", "new 1"]
+    assert tail_lines(path, 10) == ["old 1", "old 2", "new 1"]
+
+
+def test_format_line_handles_json_and_legacy_lines():
+    assert format_line('{"ts": "t", "component": "groq", "msg": "hi"}') == "t [groq] hi"
+    assert format_line('{"ts": "t", "component": "app", "msg": "x", "level": "error"}') == "t [app] x (error)"
+    assert format_line("2024-01-01T00:00:00 legacy text") == "2024-01-01T00:00:00 legacy text"
+
+
+def test_admin_shows_latest_log_records(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, "LOG_DIR", str(tmp_path))
+    app.log_model("admin can see this")
+    page = app.app.test_client().get("/admin").get_data(as_text=True)
+    assert "[app] admin can see this" in page
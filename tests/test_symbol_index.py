@@ -0,0 +1,94 @@
+import random
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from symbol_index import SymbolIndex
+
+
+def reference_context(df, dream_text):
+    """The original row-scan implementation of app.search_database_context."""
+    if df.empty:
+        return ""
+    dream_words = dream_text.lower().split()
+    results = []
+    for _, row in df.iterrows():
+        word = str(row["Word"]).lower()
+        matches = sum(1 for w in dream_words if w in word or word in w)
+        if matches > 0:
+            results.append({
+                "word": row["Word"],
+                "interpretation": str(row["Interpretation"])[:150],
+                "relevance": matches
+            })
+    results.sort(key=lambda x: x["relevance"], reverse=True)
+    if not results:
+        return ""
+    return "\n".join(f"- {r['word']}: {r['interpretation']}..." for r in results[:3])
+
+
+@pytest.fixture(scope="module")
+def dreams_df():
+    return pd.read_csv("project/cleaned_dream_interpretations.csv")
+
+
+@pytest.fixture(scope="module")
+def index(dreams_df):
+    return SymbolIndex.from_frame(dreams_df)
+
+
+def _sample_dreams():
+    dreams = [
+        "I was flying over the city and felt free",
+        "I was chased by a snake through an alley",
+        "My childhood home was burning and I couldn't get out",
+        "teeth teeth falling out falling",
+        "a",
+        "",
+        "Zzzz qqqq",
+        "I fell into an ocean and felt anxious",
+        "supercalifragilisticexpialidocious-abandonmentabbey",
+    ]
+    try:
+        conn = sqlite3.connect("data/history.db")
+        dreams += [r[0] for r in conn.execute("SELECT dream FROM history")]
+        conn.close()
+    except sqlite3.Error:
+        pass
+    vocab = pd.read_csv("project/dream_interpretations_10k.csv")["Word"].unique().tolist()
+    rng = random.Random(7)
+    for _ in range(40):
+        dreams.append(" ".join(rng.choice(vocab) for _ in range(rng.randint(1, 8))))
+    return dreams
+
+
+@pytest.mark.parametrize("dream", _sample_dreams())
+def test_index_matches_row_scan(dreams_df, index, dream):
+    assert index.context(dream) == reference_context(dreams_df, dream)
+
+
+def test_relevance_counts_repeated_words(index):
+    top = index.search("ocean ocean ocean")
+    assert top[0]["relevance"] == 3
+
+
+def test_empty_index():
+    index = SymbolIndex.from_frame(pd.DataFrame(columns=["Word", "Interpretation"]))
+    assert index.search("snake") == []
+    assert index.context("snake") == ""
+
+
+def test_app_uses_index(dreams_df, monkeypatch):
+    import app
+
+    # RETRIEVAL=tfidf: context comes from this index rather than BM25.
+    monkeypatch.setattr(app.get_dataset(), "bm25", None)
+    dream = "I was chased by a snake through an alley"
+    assert app.search_database_context(dream) == reference_context(dreams_df, dream)
+
+
+def test_context_for_rows_matches_context(index):
+    dream = "a snake in the ocean"
+    rows = [index.words.index(r["word"]) for r in index.search(dream)]
+    assert index.context_for_rows(rows) == index.context(dream)
@@ -0,0 +1,75 @@
+from symbol_matcher import SymbolMatcher
+
+
+def test_reports_overlapping_hits_with_offsets():
+    matcher = SymbolMatcher(["he", "she", "his", "hers"]).build()
+    hits = [(h.start, h.end, h.symbol) for h in matcher.find_all("ushers", whole_words=False)]
+    assert hits == [(1, 4, "she"), (2, 4, "he"), (2, 6, "hers")]
+
+
+def test_whole_words_skips_embedded_hits():
+    matcher = SymbolMatcher(["ant", "elephant"]).build()
+    assert [h.symbol for h in matcher.find_all("An elephant, not an ant.")] == ["elephant", "ant"]
+
+
+def test_multi_word_symbols_from_datasets():
+    matcher = SymbolMatcher.from_csv()
+    text = "I went to a job interview at my Childhood Home"
+    hits = {h.symbol: h for h in matcher.find_all(text)}
+    assert "job interview" in hits and "childhood home" in hits
+    hit = hits["childhood home"]
+    assert text.lower()[hit.start:hit.end] == "childhood home"
+    assert "project/cleaned_dream_interpretations.csv" in hit.sources
+    assert "project/dream_interpretations_10k.csv" in hits["job interview"].sources
+
+
+def test_symbols_filters_by_source():
+    matcher = SymbolMatcher.from_csv()
+    text = "a job interview"
+    assert "job interview" not in matcher.symbols(text, source="project/cleaned_dream_interpretations.csv")
+
+
+def test_context_ranks_phrase_hits_first():
+    import app
+
+    context = app.search_database_context("the air balloon drifted over a river and a river")
+    assert context.splitlines()[0].startswith("- Air Balloon:")
+
+
+def test_app_matcher_holds_only_phrases_it_can_resolve():
+    import app
+
+    ds = app.get_dataset()
+    phrases = {w.lower() for w in ds.df["Word"].astype(str).str.strip() if len(w.split()) >= 2}
+    assert len(ds.symbol_matcher) == len(phrases)
+    assert all(ds.symbol_index.rows_for_symbol(p) for p in phrases)
+    # Only in the 10k dataset, which the app does not load.
+    assert "job interview" not in ds.symbol_matcher
+    assert app.match_phrases("my childhood home before a job interview") == ["childhood home"]
+
+
+def test_best_match_prefers_phrase_hit():
+    import app
+
+    result = app.find_best_match_simple("my childhood home with a snake")
+    assert result is not None
+    assert result["symbol"] == "Childhood Home"
+
+
+def test_phrase_hit_must_pass_the_threshold_and_be_near_the_top():
+    import numpy as np
+
+    import app
+
+    ds = app.get_dataset()
+    text = "my childhood home with a snake"
+    home = ds.symbol_index.rows_for_symbol("childhood home")[0]
+    snake = ds.symbol_index.rows_for_symbol("snake")[0]
+    sims = np.zeros(len(ds.df))
+    sims[snake], sims[home] = 0.9, 0.2
+    assert app.best_match(ds, text, sims)["symbol"] == "Snake"
+    sims[home] = 0.5
+    assert app.best_match(ds, text, sims) == app.dataset_row(ds, snake, 0.9)
+    sims[home] = 0.8
+    assert app.best_match(ds, text, sims)["symbol"] == "Childhood Home"
+    assert app.best_match(ds, text, sims)["score"] == 0.8
@@ -0,0 +1,61 @@
+import shutil
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import tfidf_artifact
+
+DATASET = "project/cleaned_dream_interpretations.csv"
+
+
+def _is_mapped(array):
+    while array is not None:
+        if isinstance(array, np.memmap):
+            return True
+        array = getattr(array, "base", None)
+    return False
+
+
+@pytest.fixture()
+def dataset(tmp_path):
+    path = tmp_path / "dreams.csv"
+    shutil.copy(DATASET, path)
+    return str(path)
+
+
+def test_roundtrip_matches_fresh_fit(dataset, tmp_path):
+    df = pd.read_csv(dataset)
+    out = str(tmp_path / "tfidf")
+    tfidf_artifact.build(df, dataset, out)
+    assert tfidf_artifact.stale_reason(dataset, out) is None
+
+    vectorizer, matrix = tfidf_artifact.load(out)
+    fresh_vectorizer, fresh_matrix = tfidf_artifact.fit(df)
+    assert _is_mapped(matrix.data) and _is_mapped(matrix.indices)
+    assert (matrix != fresh_matrix).nnz == 0
+    query = ["I was chased by a snake through the old house"]
+    assert (vectorizer.transform(query) != fresh_vectorizer.transform(query)).nnz == 0
+
+
+def test_dataset_edit_marks_artifact_stale(dataset, tmp_path):
+    df = pd.read_csv(dataset)
+    out = str(tmp_path / "tfidf")
+    tfidf_artifact.build(df, dataset, out)
+    with open(dataset, "a", encoding="utf-8") as f:
+        f.write('Z,Zeppelin,"A zeppelin drifting overhead."\n')
+    assert tfidf_artifact.stale_reason(dataset, out) == "dataset changed"
+
+    edited = pd.read_csv(dataset)
+    logs = []
+    _, matrix = tfidf_artifact.load_or_fit(edited, dataset, out, log=logs.append)
+    assert matrix.shape[0] == len(edited)
+    assert logs and "dataset changed" in logs[0]
+
+
+def test_missing_artifact_falls_back_to_fit(dataset, tmp_path):
+    df = pd.read_csv(dataset)
+    logs = []
+    vectorizer, matrix = tfidf_artifact.load_or_fit(df, dataset, str(tmp_path / "absent"), log=logs.append)
+    assert matrix.shape[0] == len(df)
+    assert "missing" in logs[0]
@@ -0,0 +1,152 @@
+import gzip
+import json
+import os
+
+import pytest
+
+import app
+import groq_client
+import tracing
+from groq_stub import GroqStub
+from single_flight import SingleFlight
+from structured_log import get_writer
+from tracing import TraceReport, read_lines, read_spans
+
+
+def spans_for(trace):
+    path = os.path.join(app.LOG_DIR, tracing.TRACE_FILE)
+    get_writer(path).flush()
+    with open(path, encoding="utf-8") as f:
+        return [span for span in map(json.loads, f) if span["trace_id"] == trace]
+
+
+def test_trace_id_is_returned_and_spans_are_written():
+    resp = app.app.test_client().post("/interpret", json={"dream": "I dreamed about a snake in my house"})
+    body = resp.get_json()
+    trace = resp.headers["X-Trace-Id"]
+    assert body["meta"]["trace_id"] == trace
+
+    spans = spans_for(trace)
+    assert [s["span"] for s in spans] == ["dataset_match", "history_write", "total"]
+    total = spans[-1]
+    assert total["method"] == "dataset"
+    assert total["route"] == "interpret"
+    assert total["dream_chars"] == len("I dreamed about a snake in my house")
+    assert total["response_chars"] == len(body["interpretation"])
+    assert all(s["duration_ms"] <= total["duration_ms"] for s in spans)
+    assert all(s["start"] >= total["start"] for s in spans)
+
+
+def test_caller_trace_id_is_kept_when_valid():
+    client = app.app.test_client()
+    payload = {"dream": "I dreamed about a snake in my house"}
+    resp = client.post("/interpret", json=payload, headers={"X-Trace-Id": "edge-4f2a9c1d"})
+    assert resp.headers["X-Trace-Id"] == "edge-4f2a9c1d"
+    assert resp.get_json()["meta"]["trace_id"] == "edge-4f2a9c1d"
+
+    resp = client.post("/interpret", json=payload, headers={"X-Trace-Id": 'bad", "x": "y'})
+    assert resp.headers["X-Trace-Id"] != 'bad", "x": "y'
+    assert len(resp.headers["X-Trace-Id"]) == 16
+
+
+@pytest.fixture()
+def stub(monkeypatch, tmp_path):
+    with GroqStub(reply="Your mind may be exploring freedom and change.") as server:
+        monkeypatch.setattr(groq_client, "GROQ_API_KEY", "test-key")
+        monkeypatch.setattr(groq_client, "GROQ_BASE_URL", server.url)
+        monkeypatch.setattr(groq_client, "CACHE_PATH", str(tmp_path / "cache.db"))
+        monkeypatch.setattr(groq_client, "_flights", SingleFlight())
+        monkeypatch.setattr(app, "DATA_DIR", str(tmp_path / "data"))
+        monkeypatch.setattr(app, "NEAR_DUPLICATES", False)
+        groq_client.reset_client()
+        yield server
+    groq_client.reset_client()
+
+
+def test_groq_span_carries_model_and_tokens(stub):
+    resp = app.app.test_client().post("/interpret", json={"dream": "I was flying above a neon city",
+                                                          "force_model": True})
+    spans = {s["span"]: s for s in spans_for(resp.headers["X-Trace-Id"])}
+    assert set(spans) == {"dataset_match", "context_search", "reuse_prior", "groq", "history_write", "total"}
+    assert spans["groq"]["model"] == groq_client.GROQ_MODEL
+    assert (spans["groq"]["prompt_tokens"], spans["groq"]["completion_tokens"]) == (
+        stub.stats["prompt_tokens"], stub.stats["completion_tokens"])
+    assert spans["groq"]["estimated_prompt_tokens"] > 0
+    assert "prompt_tokens" not in spans["total"]
+
+
+def test_stream_returns_trace_id(stub):
+    resp = app.app.test_client().post("/interpret/stream", json={"dream": "I was flying above a neon city",
+                                                                 "force_model": True})
+    trace = resp.headers["X-Trace-Id"]
+    done = json.loads(resp.get_data(as_text=True).split("event: done\ndata: ")[1])
+    assert done["meta"]["trace_id"] == trace
+    spans = spans_for(trace)
+    assert "total" not in {s["span"] for s in spans}
+    assert {s["route"] for s in spans} == {"interpret_stream"}
+
+
+def write_trace(path, requests):
+    opener = gzip.open if str(path).endswith(".gz") else open
+    with opener(path, "wt", encoding="utf-8") as f:
+        for trace, start, method, stages in requests:
+            for name, ms in stages + [("total", sum(ms for _, ms in stages))]:
+                f.write(json.dumps({"trace_id": trace, "span": name, "start": start, "duration_ms": ms,
+                                    "route": "interpret", "method": method}) + "\n")
+
+
+def test_report_percentiles_methods_hours_and_slowest(tmp_path):
+    requests = [(f"t{i:04d}", 1_759_996_800 + i * 10, "dataset", [("dataset_match", 1.0 + i % 10)])
+                for i in range(1000)]
+    requests += [(f"g{i:04d}", 1_759_996_800 + i * 10, "groq", [("context_search", 3.0), ("groq", 100.0 * (i + 1))])
+                 for i in range(50)]
+    path = tmp_path / "trace.jsonl"
+    write_trace(path, requests)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write("not json\n")
+
+    report = TraceReport(top=3).feed(read_spans([str(path)]))
+    assert report.skipped == 1
+    assert report.stages["dataset_match"].count == 1000
+    assert report.stages["dataset_match"].percentile(0.5) == pytest.approx(5.5, rel=0.2)
+    assert report.stages["groq"].percentile(0.99) == pytest.approx(5000, rel=0.2)
+    assert report.methods["groq"].count == 50
+    assert sum(s.count for s in report.hours.values()) == 1050
+    assert len(report.hours) == 3  # 10 000 s of requests
+
+    slowest = report.slowest_first()
+    assert [entry[1] for entry in slowest] == ["g0049", "g0048", "g0047"]
+    breakdown = report.breakdown(read_lines([str(path)]))
+    assert breakdown["g0049"] == {"context_search": 3.0, "groq": 5000.0}
+
+
+def test_report_reads_gzip_and_filters_route(tmp_path):
+    path = tmp_path / "trace.jsonl.gz"
+    write_trace(path, [("a1b2c3d4", 1_760_000_000, "dataset", [("dataset_match", 2.0)])])
+    report = TraceReport(route="interpret").feed(read_spans([str(path)]))
+    assert report.spans == 2
+    assert TraceReport(route="interpret_stream").feed(read_spans([str(path)])).spans == 0
+
+
+def test_report_trends_groq_tokens_per_hour_and_model(tmp_path):
+    path = tmp_path / "trace.jsonl"
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(6):
+            span = {"trace_id": f"g{i:04d}", "span": "groq", "start": 1_760_000_000 + i * 1800, "duration_ms": 900.0,
+                    "route": "interpret", "method": "groq", "model": "small" if i % 2 else "large",
+                    "prompt_tokens": 1000, "completion_tokens": 300 + 100 * i}
+            if i < 3:
+                span["estimated_prompt_tokens"] = 900
+            f.write(json.dumps(span) + "\n")
+        f.write(json.dumps({"trace_id": "d0000", "span": "groq", "start": 1_760_000_000, "duration_ms": 1.0}) + "\n")
+
+    report = TraceReport().feed(read_spans([str(path)]))
+    large = report.tokens[("model", "large")]
+    assert (large.calls, large.mean("prompt"), large.mean("completion")) == (3, 1000, 500)
+    assert report.tokens[("model", "small")].estimate_ratio() == pytest.approx(0.9)
+    assert sum(stats.calls for (kind, _), stats in report.tokens.items() if kind == "hour") == 6
+
+    from scripts.trace_report import render
+    text = render(report)
+    assert "model (groq tokens)" in text
+    assert "0.90" in text
@@ -0,0 +1,154 @@
+"""
+DREAMLENS AI - TF-IDF Artifact
+Serializes the fitted TF-IDF vocabulary, IDF weights and CSR matrix to disk
+so app workers memory-map a prebuilt index instead of refitting at import.
+
+Layout of the artifact directory:
+
+    manifest.json   format version, dataset hash, sklearn version, shape
+    terms.json      vocabulary ordered by column index
+    idf.npy         IDF weights
+    data.npy, indices.npy, indptr.npy   CSR buffers of the document matrix
+
+Build it with `python scripts/build_tfidf_artifact.py`.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import scipy.sparse as sp
+import sklearn
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+ARTIFACT_VERSION = 1
+ARTIFACT_DIR = os.environ.get("TFIDF_ARTIFACT_DIR", os.path.join("project", "tfidf"))
+TEXT_COLUMN = "Word"
+
+_BUFFERS = ("idf", "data", "indices", "indptr")
+
+
+def dataset_fingerprint(dataset_path: str) -> str:
+    """sha256 of the dataset file; any edit to the CSV makes the artifact stale."""
+    digest = hashlib.sha256()
+    with open(dataset_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def fit(df):
+    """Fit the vectorizer on the dataset symbols, as the app always has."""
+    vectorizer = TfidfVectorizer()
+    matrix = vectorizer.fit_transform(df[TEXT_COLUMN].astype(str))
+    return vectorizer, matrix
+
+
+def build(df, dataset_path: str, artifact_dir: str = ARTIFACT_DIR) -> dict:
+    """Fit on `df` and atomically replace the artifact at `artifact_dir`."""
+    vectorizer, matrix = fit(df)
+    matrix = sp.csr_matrix(matrix)
+    terms = [None] * len(vectorizer.vocabulary_)
+    for term, col in vectorizer.vocabulary_.items():
+        terms[col] = term
+
+    manifest = {
+        "version": ARTIFACT_VERSION,
+        "dataset_sha256": dataset_fingerprint(dataset_path),
+        "sklearn_version": sklearn.__version__,
+        "text_column": TEXT_COLUMN,
+        "shape": list(matrix.shape),
+        "nnz": int(matrix.nnz),
+    }
+
+    parent = os.path.dirname(os.path.abspath(artifact_dir))
+    os.makedirs(parent, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=".tfidf-", dir=parent)
+    try:
+        os.chmod(staging, 0o755)
+        np.save(os.path.join(staging, "idf.npy"), np.asarray(vectorizer.idf_))
+        np.save(os.path.join(staging, "data.npy"), matrix.data)
+        np.save(os.path.join(staging, "indices.npy"), matrix.indices)
+        np.save(os.path.join(staging, "indptr.npy"), matrix.indptr)
+        with open(os.path.join(staging, "terms.json"), "w", encoding="utf-8") as f:
+            json.dump(terms, f, ensure_ascii=False)
+        # Manifest goes last so a half-written directory is never considered valid.
+        with open(os.path.join(staging, "manifest.json"), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        if os.path.isdir(artifact_dir):
+            shutil.rmtree(artifact_dir)
+        os.replace(staging, artifact_dir)
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    return manifest
+
+
+def read_manifest(artifact_dir: str = ARTIFACT_DIR):
+    try:
+        with open(os.path.join(artifact_dir, "manifest.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def stale_reason(dataset_path: str, artifact_dir: str = ARTIFACT_DIR):
+    """Why the artifact can't be used for `dataset_path`, or None when it is current."""
+    manifest = read_manifest(artifact_dir)
+    if manifest is None:
+        return "missing"
+    if manifest.get("version") != ARTIFACT_VERSION:
+        return f"format version {manifest.get('version')} != {ARTIFACT_VERSION}"
+    if manifest.get("sklearn_version") != sklearn.__version__:
+        return f"built with scikit-learn {manifest.get('sklearn_version')}"
+    try:
+        if manifest.get("dataset_sha256") != dataset_fingerprint(dataset_path):
+            return "dataset changed"
+    except OSError as e:
+        return f"dataset unreadable: {e}"
+    return None
+
+
+def load(artifact_dir: str = ARTIFACT_DIR):
+    """Memory-map the artifact and rebuild a ready-to-transform vectorizer.
+
+    The CSR buffers stay backed by the on-disk files, so every worker on the
+    host shares the same pages through the OS page cache.
+    """
+    manifest = read_manifest(artifact_dir)
+    if manifest is None:
+        raise FileNotFoundError(f"No TF-IDF artifact in {artifact_dir}")
+    arrays = {
+        name: np.load(os.path.join(artifact_dir, f"{name}.npy"), mmap_mode="r")
+        for name in _BUFFERS
+    }
+    with open(os.path.join(artifact_dir, "terms.json"), "r", encoding="utf-8") as f:
+        terms = json.load(f)
+
+    vectorizer = TfidfVectorizer()
+    vectorizer.vocabulary_ = {term: col for col, term in enumerate(terms)}
+    vectorizer.idf_ = np.asarray(arrays["idf"])
+    matrix = sp.csr_matrix(
+        (arrays["data"], arrays["indices"], arrays["indptr"]),
+        shape=tuple(manifest["shape"]),
+        copy=False,
+    )
+    return vectorizer, matrix
+
+
+def load_or_fit(df, dataset_path: str, artifact_dir: str = ARTIFACT_DIR, log=print):
+    """Use the prebuilt artifact when current, otherwise fit in-process."""
+    reason = stale_reason(dataset_path, artifact_dir)
+    if reason is None:
+        try:
+            vectorizer, matrix = load(artifact_dir)
+            if matrix.shape[0] == len(df):
+                return vectorizer, matrix
+            reason = f"row count {matrix.shape[0]} != {len(df)}"
+        except Exception as e:
+            reason = f"failed to load: {e}"
+    log(f"TF-IDF artifact not used ({reason}); fitting in-process")
+    return fit(df)
@@ -0,0 +1,250 @@
+"""
+DREAMLENS AI - Request Tracing
+Trace IDs for /interpret requests and one span record per stage in a
+JSON-lines trace file (LOG_DIR/trace.jsonl), plus the streaming analysis
+behind scripts/trace_report.py.
+
+A span record looks like:
+
+    {"trace_id": "9f0c...", "span": "groq", "start": 1760000000.123456,
+     "duration_ms": 812.4, "route": "interpret", "method": "groq",
+     "model": "llama-3.3-70b-versatile", "dream_chars": 64,
+     "response_chars": 1290, "prompt_tokens": 310, "completion_tokens": 402,
+     "estimated_prompt_tokens": 298}
+
+`start` is Unix time in seconds. The "total" span covers the whole request
+(the streaming route has none: its length depends on the client). Token
+counts appear on the groq span of requests that called Groq, with the
+prompt builder's estimate (prompts.py) beside Groq's reported count.
+"""
+
+import bisect
+import gzip
+import heapq
+import json
+import os
+import re
+import secrets
+import sys
+from datetime import datetime, timezone
+
+from metrics import BUCKETS, quantile
+from structured_log import LOG_BACKUPS, get_writer
+
+TRACING = os.environ.get("TRACING", "on").strip().lower() not in ("0", "off", "false", "no")
+TRACE_MAX_BYTES = int(os.environ.get("TRACE_MAX_BYTES", str(256 * 1024 * 1024)))
+TRACE_FILE = "trace.jsonl"
+TRACE_HEADER = "X-Trace-Id"
+
+_VALID_ID = re.compile(r"[A-Za-z0-9._:-]{8,64}")
+
+
+def trace_id(incoming: str = None) -> str:
+    """The caller's X-Trace-Id when it looks like one (so traces join up across services), else a new id."""
+    if incoming and _VALID_ID.fullmatch(incoming):
+        return incoming
+    return secrets.token_hex(8)
+
+
+def record(log_dir: str, trace: str, timer, route: str, meta: dict, dream: str, response: str, usage: dict = None):
+    """Write one span per stage of a finished `metrics.Timer` to LOG_DIR/trace.jsonl."""
+    if not TRACING:
+        return
+    # The fields every span shares are serialized once; trace ids and stage
+    # names never need escaping (see _VALID_ID), so each line is a format.
+    shared = json.dumps({
+        "route": route,
+        "method": meta.get("method"),
+        "model": meta.get("model"),
+        "dream_chars": len(dream),
+        "response_chars": len(response or ""),
+    })[1:-1]
+    tokens = "".join(f',"{k}":{int(v)}' for k, v in (usage or {}).items())
+    lines = "".join(
+        f'{{"trace_id":"{trace}","span":"{name}","start":{timer.wall + offset:.6f},'
+        f'"duration_ms":{seconds * 1000:.3f},{shared}{tokens if name == "groq" else ""}}}\n'
+        for name, offset, seconds in timer.stages
+    )
+    try:
+        get_writer(os.path.join(log_dir, TRACE_FILE), max_bytes=TRACE_MAX_BYTES,
+                   backups=LOG_BACKUPS).write_lines(lines)
+    except Exception as e:
+        # Tracing is forensic; a failed write must not fail the request.
+        print("Trace write failed:", e)
+
+
+# --------------- Analysis ---------------
+
+class LatencyStats:
+    """Count, max and bucketed durations; percentiles in constant memory."""
+
+    __slots__ = ("counts", "count", "total_ms", "max_ms")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def add(self, ms: float):
+        self.counts[bisect.bisect_left(BUCKETS, ms / 1000)] += 1
+        self.count += 1
+        self.total_ms += ms
+        if ms > self.max_ms:
+            self.max_ms = ms
+
+    def percentile(self, q: float) -> float:
+        """Estimated q-quantile in ms (within one ~19% bucket), capped at the observed max."""
+        return min(quantile(self.counts, q) * 1000, self.max_ms)
+
+
+def open_trace(path: str):
+    """Text lines of a trace file; `-` reads stdin and `.gz` files are decompressed."""
+    if path == "-":
+        return sys.stdin
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", errors="replace")
+    return open(path, "r", encoding="utf-8", errors="replace")
+
+
+def read_lines(paths):
+    """Yield the lines of each file in turn."""
+    for path in paths:
+        f = open_trace(path)
+        try:
+            yield from f
+        finally:
+            if f is not sys.stdin:
+                f.close()
+
+
+def parse_spans(lines):
+    """Span dicts from JSON lines; malformed lines yield None."""
+    for line in lines:
+        try:
+            span = json.loads(line)
+        except ValueError:
+            yield None
+            continue
+        yield span if isinstance(span, dict) else None
+
+
+def read_spans(paths):
+    """Yield span dicts from each file in turn, one line at a time."""
+    return parse_spans(read_lines(paths))
+
+
+class TokenStats:
+    """Prompt and completion tokens of Groq calls, and the prompt estimate where one was recorded."""
+
+    __slots__ = ("calls", "prompt", "completion", "estimated", "estimated_actual")
+
+    def __init__(self):
+        self.calls = self.prompt = self.completion = self.estimated = self.estimated_actual = 0
+
+    def add(self, span: dict):
+        prompt = int(span.get("prompt_tokens") or 0)
+        self.calls += 1
+        self.prompt += prompt
+        self.completion += int(span.get("completion_tokens") or 0)
+        if span.get("estimated_prompt_tokens"):
+            self.estimated += int(span["estimated_prompt_tokens"])
+            self.estimated_actual += prompt
+
+    def mean(self, field: str) -> float:
+        return getattr(self, field) / self.calls if self.calls else 0.0
+
+    def estimate_ratio(self):
+        """Estimated over reported prompt tokens, or None without estimates."""
+        return self.estimated / self.estimated_actual if self.estimated_actual else None
+
+
+class TraceReport:
+    """Latency percentiles per stage, per meta.method and per hour, the N slowest requests,
+    and Groq token usage per hour and per model.
+
+    Memory depends on the number of distinct stages, methods and hours and
+    on `top`, never on the number of spans read. Per-method, per-hour and
+    slowest figures use each request's "total" span.
+    """
+
+    def __init__(self, top: int = 20, route: str = None):
+        self.top = top
+        self.route = route
+        self.stages = {}
+        self.methods = {}
+        self.hours = {}
+        self.slowest = []   # min-heap of (duration_ms, trace_id, start, method, model)
+        self.tokens = {}    # ("hour" | "model", name) -> TokenStats of groq spans
+        self.spans = 0
+        self.skipped = 0
+
+    def add(self, span: dict):
+        try:
+            name = span["span"]
+            ms = float(span["duration_ms"])
+        except (KeyError, TypeError, ValueError):
+            self.skipped += 1
+            return
+        if self.route and span.get("route") != self.route:
+            return
+        self.spans += 1
+        stats = self.stages.get(name)
+        if stats is None:
+            stats = self.stages[name] = LatencyStats()
+        stats.add(ms)
+        if name == "groq" and span.get("prompt_tokens") is not None:
+            hour = datetime.fromtimestamp(int(span.get("start") or 0) // 3600 * 3600, timezone.utc)
+            self.tokens.setdefault(("hour", hour.strftime("%Y-%m-%d %H:00")), TokenStats()).add(span)
+            self.tokens.setdefault(("model", span.get("model") or "-"), TokenStats()).add(span)
+        if name != "total":
+            return
+        method = span.get("method") or "-"
+        stats = self.methods.get(method)
+        if stats is None:
+            stats = self.methods[method] = LatencyStats()
+        stats.add(ms)
+        start = span.get("start") or 0
+        hour = datetime.fromtimestamp(int(start) // 3600 * 3600, timezone.utc).strftime("%Y-%m-%d %H:00")
+        stats = self.hours.get(hour)
+        if stats is None:
+            stats = self.hours[hour] = LatencyStats()
+        stats.add(ms)
+        entry = (ms, str(span.get("trace_id")), start, method, span.get("model"))
+        if len(self.slowest) < self.top:
+            heapq.heappush(self.slowest, entry)
+        elif entry > self.slowest[0]:
+            heapq.heapreplace(self.slowest, entry)
+
+    def feed(self, spans):
+        for span in spans:
+            if span is None:
+                self.skipped += 1
+            else:
+                self.add(span)
+        return self
+
+    def slowest_first(self) -> list:
+        return sorted(self.slowest, reverse=True)
+
+    def breakdown(self, lines) -> dict:
+        """Second pass over the raw lines: each slowest trace's stages, {trace_id: {stage: ms}}.
+
+        Only lines of those traces are parsed; the rest are skipped after
+        a substring check on their trace_id.
+        """
+        wanted = {entry[1]: {} for entry in self.slowest}
+        for line in lines:
+            key = line.find('"trace_id"')
+            if key < 0:
+                continue
+            start = line.find('"', key + 10) + 1
+            if line[start:line.find('"', start)] not in wanted:
+                continue
+            try:
+                span = json.loads(line)
+            except ValueError:
+                continue
+            if span.get("span") != "total":
+                wanted[span["trace_id"]][span.get("span")] = span.get("duration_ms")
+        return wanted